@@ -0,0 +1,94 @@
+"""Controlador no bloqueante de la aguja del parqueo"""
+import tiempo
+
+# Fases del ciclo de la aguja
+REPOSO = 'reposo'
+ABRIENDO = 'abriendo'
+ABIERTA = 'abierta'
+CERRANDO = 'cerrando'
+
+# Duración de cada fase (ms)
+T_ABRIENDO_MS = 500
+T_ABIERTA_MS = 2500
+T_CERRANDO_MS = 500
+
+# Ciclos que pueden quedar en espera
+MAX_PENDIENTES = 8
+
+
+class ControladorAguja:
+    """Máquina de estados reposo -> abriendo -> abierta -> cerrando -> reposo
+
+    Cada llamada a actualizar() avanza la fase según tiempo.ticks_ms(), sin
+    dormir, para que el ciclo principal siga atendiendo botones y red.
+    """
+
+    def __init__(self, abrir, cerrar, t_abriendo=T_ABRIENDO_MS,
+                 t_abierta=T_ABIERTA_MS, t_cerrando=T_CERRANDO_MS,
+                 max_pendientes=MAX_PENDIENTES):
+        self._abrir = abrir
+        self._cerrar = cerrar
+        self.t_abriendo = t_abriendo
+        self.t_abierta = t_abierta
+        self.t_cerrando = t_cerrando
+        self.max_pendientes = max_pendientes
+        self.fase = REPOSO
+        self.pendientes = 0
+        self.manual = False
+        self._inicio = tiempo.ticks_ms()
+
+    @property
+    def abierta(self):
+        """True mientras la aguja está levantada o subiendo"""
+        return self.fase == ABRIENDO or self.fase == ABIERTA
+
+    def _cambiar(self, fase, ahora):
+        self.fase = fase
+        self._inicio = ahora
+
+    def solicitar_ciclo(self):
+        """Encola un ciclo abrir-esperar-cerrar. Retorna False si la cola está llena"""
+        if self.pendientes >= self.max_pendientes:
+            return False
+        self.pendientes += 1
+        return True
+
+    def abrir_manual(self, ahora=None):
+        """Abre la aguja y la mantiene abierta hasta cerrar_manual()"""
+        if ahora is None:
+            ahora = tiempo.ticks_ms()
+        self.manual = True
+        if not self.abierta:
+            self._abrir()
+            self._cambiar(ABRIENDO, ahora)
+
+    def cerrar_manual(self, ahora=None):
+        """Cierra la aguja aunque haya un ciclo en curso"""
+        if ahora is None:
+            ahora = tiempo.ticks_ms()
+        self.manual = False
+        if self.abierta:
+            self._cerrar()
+            self._cambiar(CERRANDO, ahora)
+
+    def actualizar(self, ahora=None):
+        """Avanza la máquina de estados; se llama en cada vuelta del ciclo principal"""
+        if ahora is None:
+            ahora = tiempo.ticks_ms()
+        transcurrido = tiempo.ticks_diff(ahora, self._inicio)
+
+        if self.fase == REPOSO:
+            if self.pendientes > 0 and not self.manual:
+                self.pendientes -= 1
+                self._abrir()
+                self._cambiar(ABRIENDO, ahora)
+        elif self.fase == ABRIENDO:
+            if transcurrido >= self.t_abriendo:
+                self._cambiar(ABIERTA, ahora)
+        elif self.fase == ABIERTA:
+            if not self.manual and transcurrido >= self.t_abierta:
+                self._cerrar()
+                self._cambiar(CERRANDO, ahora)
+        elif self.fase == CERRANDO:
+            if transcurrido >= self.t_cerrando:
+                self._cambiar(REPOSO, ahora)
@@ -0,0 +1,95 @@
+"""Compara las estadísticas recorriendo el historial contra los totales acumulados
+
+Registra muchas sesiones (por defecto 10^6, con un 1 % todavía dentro) y
+mide lo que cuesta refrescar las tarjetas y encontrar la sesión abierta al
+registrar una salida, como lo hacía la interfaz antes y con Estadisticas.
+Se ejecuta en CPython:
+
+    python benchmarks/bench_estadisticas.py [sesiones]
+"""
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from estadisticas import Estadisticas
+
+REPETICIONES = 5
+
+
+def cobrar(estancia_s, entrada):
+    return int(estancia_s // 10) * 1000
+
+
+def estadisticas_recorriendo(vehiculos, tipo_cambio):
+    """Cálculo anterior de calcular_estadisticas: tres pasadas por el historial"""
+    total = len(vehiculos)
+    tiempos = []
+    for v in vehiculos:
+        if v["salida"]:
+            tiempos.append((v["salida"] - v["entrada"]).total_seconds() / 60)
+    promedio = sum(tiempos) / len(tiempos) if tiempos else 0
+    ganancias = sum(v["costo"] for v in vehiculos)
+    actuales = sum(1 for v in vehiculos if v["salida"] is None)
+    return {
+        "total_vehiculos": str(total),
+        "promedio_estancia": f"{promedio:.1f} min",
+        "ganancias_colones": f"₡{ganancias:,}",
+        "ganancias_dolares": f"${ganancias / tipo_cambio:.2f}",
+        "vehiculos_actuales": str(actuales)
+    }
+
+
+def abierta_recorriendo(vehiculos):
+    """Búsqueda anterior de registrar_salida"""
+    for vehiculo in reversed(vehiculos):
+        if vehiculo["salida"] is None:
+            return vehiculo
+    return None
+
+
+def medir(funcion, repeticiones=REPETICIONES):
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        resultado = funcion()
+    return resultado, (time.perf_counter() - inicio) / repeticiones
+
+
+def main():
+    sesiones = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    random.seed(0)
+    inicio_jornada = datetime(2026, 1, 1)
+    estadisticas = Estadisticas()
+    vehiculos = []
+
+    # Las sesiones que siguen abiertas son de las primeras: el peor caso del recorrido
+    abiertas = max(1, sesiones // 100)
+    inicio = time.perf_counter()
+    for i in range(sesiones):
+        entrada = inicio_jornada + timedelta(seconds=i)
+        vehiculos.append(estadisticas.entrada(entrada))
+        if i >= abiertas:
+            salida = entrada + timedelta(seconds=random.randrange(60, 4 * 3600))
+            estadisticas.salida(salida, cobrar)
+    s_registro = time.perf_counter() - inicio
+
+    recorrido, s_recorrido = medir(lambda: estadisticas_recorriendo(vehiculos, 530.0))
+    acumulado, s_acumulado = medir(lambda: estadisticas.tarjetas(530.0))
+    assert recorrido == acumulado, (recorrido, acumulado)
+
+    abierta, s_busqueda = medir(lambda: abierta_recorriendo(vehiculos))
+    assert abierta is next(reversed(estadisticas.abiertas.values()))
+    _, s_indice = medir(lambda: next(reversed(estadisticas.abiertas.values())))
+
+    print(f"Sesiones: {sesiones} ({abiertas} abiertas)")
+    print(f"Registro con Estadisticas: {s_registro / sesiones * 1e6:.2f} us por sesión")
+    print(f"{'operación':<26}{'recorriendo':>14}{'acumulado':>14}")
+    print(f"{'refrescar tarjetas':<26}{s_recorrido * 1e3:>11.1f} ms{s_acumulado * 1e6:>11.1f} us")
+    print(f"{'sesión abierta (salida)':<26}{s_busqueda * 1e3:>11.1f} ms{s_indice * 1e6:>11.1f} us")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""Compara la respuesta de estado en JSON contra el registro binario
+
+Mide el tiempo de codificación y los bytes por consulta, tanto en el
+protocolo de una sola vez como en el modo con tramas. Se ejecuta en CPython:
+
+    python benchmarks/bench_estado.py [iteraciones]
+"""
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from protocolo import (TAM_ESTADO, codificar_trama, codificar_trama_binaria,
+                       desempaquetar_estado, empaquetar_estado)
+
+
+def estado_json(secuencia):
+    return json.dumps({
+        'espacios': 2,
+        'aguja': False,
+        'fase_aguja': 'reposo',
+        'cola_aguja': 0,
+        'botones_descartados': 0,
+        'vehiculos': 1,
+        'ldr1': 25000 + (secuencia & 0xFF),
+        'ldr2': 28000,
+        'led1': True,
+        'led2': True,
+        'led3': False
+    }).encode()
+
+
+def medir(funcion, iteraciones):
+    inicio = time.perf_counter()
+    for i in range(iteraciones):
+        funcion(i)
+    return (time.perf_counter() - inicio) / iteraciones * 1e6
+
+
+def main():
+    iteraciones = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    buffer = bytearray(TAM_ESTADO)
+
+    def estado_binario(secuencia):
+        return empaquetar_estado(buffer, False, True, True, False, 2, 1,
+                                 25000 + (secuencia & 0xFF), 28000, secuencia)
+
+    us_json = medir(estado_json, iteraciones)
+    us_bin = medir(estado_binario, iteraciones)
+
+    bytes_json = len(estado_json(0))
+    bytes_bin = len(estado_binario(0))
+    trama_json = len(codificar_trama({'id': 1, 'resultado': json.loads(estado_json(0))}))
+    trama_bin = len(codificar_trama_binaria(1, estado_binario(0)))
+
+    assert desempaquetar_estado(estado_binario(7))['secuencia'] == 7
+
+    print(f"Iteraciones: {iteraciones}")
+    print(f"{'formato':<10}{'us/consulta':>14}{'bytes':>8}{'bytes trama':>14}")
+    print(f"{'json':<10}{us_json:>14.2f}{bytes_json:>8}{trama_json:>14}")
+    print(f"{'binario':<10}{us_bin:>14.2f}{bytes_bin:>8}{trama_bin:>14}")
+    print(f"Ahorro: {us_json / us_bin:.1f}x tiempo, {bytes_json / bytes_bin:.1f}x bytes")
+
+
+if __name__ == '__main__':
+    main()
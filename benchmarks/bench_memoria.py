@@ -0,0 +1,114 @@
+"""Verifica que atender las peticiones del camino rápido no haga crecer el heap
+
+Arranca el firmware (main.py; en CPython sobre hal_simulado) y levanta un
+ServidorComandos en localhost con main.manejar_rapido, el mismo camino del
+Pico: estado binario, led y aguja pasan por metricas, tabla_espacios,
+fotoceldas y el diario. Un cliente en el mismo proceso, sin hilos, envía
+las peticiones. Después de un calentamiento compara la memoria antes y
+después de N peticiones:
+
+    python benchmarks/bench_memoria.py [peticiones] [--json]
+
+Con --json las peticiones siguen el camino normal (sin PeticionRapida) para
+comparar. En CPython se mide con tracemalloc (crecimiento neto y pico
+transitorio); en MicroPython con gc.mem_free() y el recolector apagado,
+que cuenta cada byte asignado.
+"""
+import gc
+import os
+import socket
+import sys
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+import bitacora
+import main as firmware
+from conexiones import ServidorComandos
+from protocolo import TAM_CABECERA, TAM_ESTADO
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+PUERTO = 18090
+# Suficiente para que los contadores del firmware (p. ej. las escrituras del
+# diario) pasen de 256: en CPython los enteros chicos no ocupan heap
+CALENTAMIENTO = 10000
+# Mezcla de peticiones del camino rápido: (petición, respuesta binaria)
+PETICIONES = (
+    (b'{"id": 7, "accion": "estado", "formato": "bin"}\n', True),
+    (b'{"id": 8, "accion": "led", "espacio": 2, "estado": 0}\n', False),
+    (b'{"id": 9, "accion": "estado", "formato": "bin"}\n', True),
+    (b'{"id": 10, "accion": "led", "espacio": 2, "estado": 1}\n', False),
+    (b'{"id": 11, "accion": "aguja", "estado": 1}\n', False),
+    (b'{"id": 12, "accion": "aguja", "estado": 0}\n', False),
+)
+
+
+def main():
+    argumentos = [a for a in sys.argv[1:] if not a.startswith('--')]
+    peticiones = int(argumentos[0]) if argumentos else 10000
+    camino_json = '--json' in sys.argv
+
+    bitacora.nivel_consola = bitacora.ERROR
+    firmware.arrancar()
+    servidor = ServidorComandos(firmware.atender_comando, puerto=PUERTO,
+                                rapido=None if camino_json else firmware.manejar_rapido).iniciar()
+    cliente = socket.socket()
+    cliente.connect(socket.getaddrinfo('127.0.0.1', PUERTO)[0][-1])
+    cliente.setblocking(False)
+    recibir = getattr(cliente, 'recv_into', None) or cliente.readinto
+    respuesta = bytearray(256)
+    vista = memoryview(respuesta)
+
+    def consultar(cantidad):
+        for i in range(cantidad):
+            peticion, binaria = PETICIONES[i % len(PETICIONES)]
+            cliente.send(peticion)
+            # Las respuestas JSON terminan en salto de línea (el largo cambia con --json)
+            recibidos = 0
+            while (recibidos < TAM_CABECERA + TAM_ESTADO if binaria
+                   else not recibidos or respuesta[recibidos - 1] != 0x0A):
+                servidor.atender(10)
+                try:
+                    recibidos += recibir(vista[recibidos:]) or 0
+                except OSError:
+                    pass
+    if tracemalloc is not None:
+        tracemalloc.start()
+    consultar(CALENTAMIENTO)
+    assert respuesta[0] == ord('{'), 'respuesta inesperada'
+
+    gc.collect()
+    if tracemalloc is not None:
+        inicial = tracemalloc.take_snapshot()
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        consultar(peticiones)
+        gc.collect()
+        pico = tracemalloc.get_traced_memory()[1] - base
+        final = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+        # Solo cuentan las asignaciones del código del repositorio (no de esta medición)
+        crecimiento = sum(d.size_diff for d in final.compare_to(inicial, 'filename')
+                          if d.traceback[0].filename.startswith(RAIZ)
+                          and d.traceback[0].filename != os.path.abspath(__file__))
+        print(f"Peticiones: {peticiones} ({'json' if camino_json else 'rápido'})")
+        print(f"Crecimiento neto: {crecimiento} bytes, pico transitorio: {pico} bytes")
+    else:
+        gc.disable()
+        antes = gc.mem_free()
+        consultar(peticiones)
+        crecimiento = antes - gc.mem_free()
+        gc.enable()
+        print(f"Peticiones: {peticiones}, bytes asignados: {crecimiento}")
+
+    cliente.close()
+    assert crecimiento <= 0, f'el heap creció {crecimiento} bytes'
+    print('OK: sin crecimiento del heap')
+
+
+if __name__ == '__main__':
+    main()
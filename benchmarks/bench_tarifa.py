@@ -0,0 +1,47 @@
+"""Compara el cobro sesión por sesión contra costo_lote en muchas sesiones
+
+Simula un historial de sesiones y lo recalcula con una tarifa nueva, como
+al cambiar las reglas de cobro. Con numpy instalado costo_lote es vectorial.
+Se ejecuta en CPython:
+
+    python benchmarks/bench_tarifa.py [sesiones]
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import tarifa
+from tarifa import Tarifa
+
+
+def main():
+    sesiones = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    random.seed(0)
+    estancias = [random.randrange(0, 3 * tarifa.SEGUNDOS_DIA) for _ in range(sesiones)]
+    entradas = [random.randrange(1700000000, 1800000000) for _ in range(sesiones)]
+
+    nueva = Tarifa(tarifa=500, periodo_s=900, gracia_s=600, tope_diario=20000,
+                   franjas=((7, 18, 800), (22, 6, 300)), zona_s=-6 * 3600)
+
+    inicio = time.perf_counter()
+    uno_a_uno = [nueva.costo(e, t) for e, t in zip(estancias, entradas)]
+    s_uno = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    lote = nueva.costo_lote(estancias, entradas)
+    s_lote = time.perf_counter() - inicio
+
+    assert [int(c) for c in lote] == uno_a_uno
+
+    print(f"Sesiones: {sesiones} (numpy: {'sí' if tarifa.np is not None else 'no'})")
+    print(f"{'modo':<12}{'s total':>10}{'us/sesión':>12}")
+    print(f"{'uno a uno':<12}{s_uno:>10.3f}{s_uno / sesiones * 1e6:>12.2f}")
+    print(f"{'lote':<12}{s_lote:>10.3f}{s_lote / sesiones * 1e6:>12.2f}")
+    print(f"Recaudación recalculada: ₡{sum(uno_a_uno):,}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,347 @@
+"""Generador de carga para el servidor de comandos del Pico
+
+Abre N clientes simultáneos con conexiones de tramas (ver protocolo.py) y
+cada uno envía peticiones en ciclo cerrado: manda una, espera su respuesta
+y manda la siguiente. La mezcla de comandos se elige al azar con una
+semilla fija, así dos corridas envían la misma secuencia:
+
+    python benchmarks/carga.py --local
+    python benchmarks/carga.py --host 192.168.4.2 --clientes 4 --duracion 30
+    python benchmarks/carga.py --local --mezcla estado=50,estado_bin=50 --salida base.json
+    python benchmarks/carga.py --local --comparar base.json
+
+Con --local levanta en otro proceso un servidor que corre el firmware
+(main.py sobre hal_simulado) a 50 ciclos por segundo, con los mismos
+límites de clientes y tiempos que el Pico. El resultado es un JSON con el
+commit, la configuración, peticiones por segundo, latencias p50/p95/p99
+(total y por comando), timeouts, errores de conexión y respuestas de error.
+"""
+import argparse
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from protocolo import LectorTramas, codificar_trama, decodificar_trama
+
+VERSION_RESULTADO = 1
+PUERTO_LOCAL = 18091
+MEZCLA = 'estado=40,estado_bin=30,led=15,aguja=10,registro=5'
+COMANDOS = ('estado', 'estado_bin', 'led', 'aguja', 'registro')
+NUM_ESPACIOS = 3
+PAUSA_RECONEXION_S = 0.2
+
+
+def leer_mezcla(texto):
+    """Convierte "estado=40,led=10" en lista de (comando, peso)"""
+    mezcla = []
+    for parte in texto.split(','):
+        nombre, _, peso = parte.partition('=')
+        nombre = nombre.strip()
+        if nombre not in COMANDOS:
+            raise ValueError(f"Comando desconocido en la mezcla: {nombre}")
+        mezcla.append((nombre, int(peso or 1)))
+    return mezcla
+
+
+class Cliente(threading.Thread):
+    """Una consola de operador que envía peticiones sin pausa"""
+
+    def __init__(self, numero, opciones, mezcla, inicio, fin_calentamiento, fin):
+        super().__init__(daemon=True)
+        self.opciones = opciones
+        self.azar = random.Random(opciones.semilla * 1000 + numero)
+        self.nombres = [n for n, _ in mezcla]
+        self.pesos = [p for _, p in mezcla]
+        self.inicio = inicio
+        self.fin_calentamiento = fin_calentamiento
+        self.fin = fin
+        self.latencias = {n: [] for n in self.nombres}
+        self.timeouts = 0
+        self.errores_conexion = 0
+        self.errores_respuesta = 0
+        self.conexiones = 0
+        self._sock = None
+        self._lector = None
+        self._id = 0
+        self._vehiculos = []
+        self._aguja = False
+
+    def peticion(self, nombre):
+        """Dict del comando a enviar según su nombre en la mezcla"""
+        if nombre == 'estado':
+            return {'accion': 'estado'}
+        if nombre == 'estado_bin':
+            return {'accion': 'estado', 'formato': 'bin'}
+        if nombre == 'led':
+            return {'accion': 'led', 'espacio': self.azar.randint(1, NUM_ESPACIOS),
+                    'estado': self.azar.random() < 0.5}
+        if nombre == 'aguja':
+            self._aguja = not self._aguja
+            return {'accion': 'aguja', 'estado': self._aguja}
+        # registro: alterna entradas y salidas de los vehículos propios
+        if self._vehiculos:
+            return {'accion': 'registro', 'tipo': 'salida',
+                    'vehiculo': self._vehiculos.pop(0)}
+        return {'accion': 'registro', 'tipo': 'entrada'}
+
+    def conectar(self):
+        self._sock = socket.create_connection((self.opciones.host, self.opciones.puerto),
+                                              timeout=self.opciones.timeout)
+        self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._lector = LectorTramas()
+        self.conexiones += 1
+
+    def cerrar(self):
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+
+    def respuesta(self, id_peticion):
+        """Lee tramas hasta encontrar la respuesta a id_peticion"""
+        while True:
+            trama = self._lector.siguiente()
+            while trama is not None:
+                objeto = decodificar_trama(trama)
+                if objeto.get('id') == id_peticion:
+                    return objeto
+                trama = self._lector.siguiente()
+            datos = self._sock.recv(4096)
+            if not datos:
+                raise ConnectionError('El servidor cerró la conexión')
+            self._lector.agregar(datos)
+
+    def run(self):
+        while time.perf_counter() < self.fin:
+            if self._sock is None:
+                try:
+                    self.conectar()
+                except OSError:
+                    self.errores_conexion += 1
+                    self.cerrar()
+                    time.sleep(PAUSA_RECONEXION_S)
+                    continue
+            nombre = self.azar.choices(self.nombres, self.pesos)[0]
+            comando = self.peticion(nombre)
+            self._id += 1
+            comando['id'] = self._id
+            enviado = time.perf_counter()
+            try:
+                self._sock.sendall(codificar_trama(comando))
+                objeto = self.respuesta(self._id)
+            except socket.timeout:
+                self.timeouts += 1
+                self.cerrar()
+                continue
+            except (OSError, ValueError):
+                self.errores_conexion += 1
+                self.cerrar()
+                time.sleep(PAUSA_RECONEXION_S)
+                continue
+            recibido = time.perf_counter()
+
+            if 'error' in objeto:
+                self.errores_respuesta += 1
+            elif comando.get('tipo') == 'entrada':
+                self._vehiculos.append(objeto['resultado']['vehiculo'])
+            if enviado >= self.fin_calentamiento and recibido <= self.fin:
+                self.latencias[nombre].append(recibido - enviado)
+            if self.opciones.pausa_ms:
+                time.sleep(self.opciones.pausa_ms / 1000)
+        self.cerrar()
+
+
+def percentil(ordenadas, p):
+    """Percentil p (0-100) de una lista ya ordenada, por rango más cercano"""
+    if not ordenadas:
+        return 0
+    indice = max(0, min(len(ordenadas) - 1, (len(ordenadas) * p + 99) // 100 - 1))
+    return ordenadas[indice]
+
+
+def resumir(latencias, segundos):
+    """Conteo, peticiones por segundo y percentiles en ms"""
+    ordenadas = sorted(latencias)
+    return {
+        'n': len(ordenadas),
+        'rps': round(len(ordenadas) / segundos, 1),
+        'prom_ms': round(sum(ordenadas) / len(ordenadas) * 1000, 3) if ordenadas else 0,
+        'p50_ms': round(percentil(ordenadas, 50) * 1000, 3),
+        'p95_ms': round(percentil(ordenadas, 95) * 1000, 3),
+        'p99_ms': round(percentil(ordenadas, 99) * 1000, 3),
+        'max_ms': round(ordenadas[-1] * 1000, 3) if ordenadas else 0
+    }
+
+
+def commit_actual():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=RAIZ,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def ejecutar(opciones):
+    """Corre la carga y retorna el resultado como dict"""
+    mezcla = leer_mezcla(opciones.mezcla)
+    inicio = time.perf_counter()
+    fin_calentamiento = inicio + opciones.calentamiento
+    fin = fin_calentamiento + opciones.duracion
+    clientes = [Cliente(i, opciones, mezcla, inicio, fin_calentamiento, fin)
+                for i in range(opciones.clientes)]
+    for cliente in clientes:
+        cliente.start()
+    for cliente in clientes:
+        cliente.join(opciones.duracion + opciones.calentamiento + opciones.timeout + 5)
+
+    todas = []
+    por_comando = {}
+    for nombre, _ in mezcla:
+        latencias = [l for c in clientes for l in c.latencias[nombre]]
+        todas.extend(latencias)
+        por_comando[nombre] = resumir(latencias, opciones.duracion)
+    return {
+        'version': VERSION_RESULTADO,
+        'commit': commit_actual(),
+        'fecha': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'servidor': ('local' + (' doble núcleo' if opciones.doble_nucleo else '')
+                     if opciones.local else f'{opciones.host}:{opciones.puerto}'),
+        'config': {
+            'clientes': opciones.clientes,
+            'duracion_s': opciones.duracion,
+            'calentamiento_s': opciones.calentamiento,
+            'mezcla': opciones.mezcla,
+            'semilla': opciones.semilla,
+            'timeout_s': opciones.timeout,
+            'pausa_ms': opciones.pausa_ms
+        },
+        'total': resumir(todas, opciones.duracion),
+        'por_comando': por_comando,
+        'timeouts': sum(c.timeouts for c in clientes),
+        'errores_conexion': sum(c.errores_conexion for c in clientes),
+        'errores_respuesta': sum(c.errores_respuesta for c in clientes),
+        'conexiones': sum(c.conexiones for c in clientes)
+    }
+
+
+def comparar(base, actual):
+    """Muestra la variación de rendimiento y latencia contra un resultado anterior"""
+    print(f"Comparación {base.get('commit')} -> {actual.get('commit')}", file=sys.stderr)
+    if base.get('config') != actual.get('config'):
+        print('  Aviso: la configuración de las corridas es distinta', file=sys.stderr)
+    for clave in ('rps', 'p50_ms', 'p95_ms', 'p99_ms'):
+        antes = base['total'][clave]
+        despues = actual['total'][clave]
+        cambio = (despues - antes) / antes * 100 if antes else 0
+        print(f"  {clave:<8}{antes:>12}{despues:>12}{cambio:>+9.1f}%", file=sys.stderr)
+
+
+def servir(puerto, doble_nucleo=False):
+    """Servidor de prueba: el firmware en el simulador al ritmo del tiempo real
+
+    Cada PERIODO_CICLO_MS reales se ejecuta un paso() (que avanza el reloj
+    virtual lo mismo) y entre pasos se atiende la red, como en el Pico. Con
+    doble_nucleo el servidor corre en un hilo (main.DOBLE_NUCLEO).
+    """
+    import bitacora
+    bitacora.nivel_consola = bitacora.ERROR
+    import main as firmware
+    from conexiones import ServidorComandos
+
+    firmware.arrancar()
+    if doble_nucleo:
+        firmware.DOBLE_NUCLEO = True
+        firmware.iniciar_nucleo_red(puerto)
+        while not firmware.puente.escuchando:
+            time.sleep(0.01)
+    else:
+        firmware.servidor_comandos = ServidorComandos(
+            firmware.atender_comando, puerto=puerto, instantanea=firmware.estado_compacto,
+            rapido=firmware.manejar_rapido).iniciar()
+    print('listo', flush=True)
+
+    periodo = firmware.PERIODO_CICLO_MS / 1000
+    siguiente = time.perf_counter()
+    while True:
+        firmware.paso()
+        siguiente += periodo
+        restante = siguiente - time.perf_counter()
+        while restante > 0:
+            if firmware.servidor_comandos is None:
+                time.sleep(restante)
+            else:
+                firmware.servidor_comandos.atender(max(1, int(restante * 1000)))
+            restante = siguiente - time.perf_counter()
+
+
+def levantar_local(puerto, doble_nucleo=False):
+    """Inicia servir() en un proceso aparte y espera a que escuche"""
+    argumentos = [sys.executable, os.path.abspath(__file__), '--servir', '--puerto', str(puerto)]
+    if doble_nucleo:
+        argumentos.append('--doble-nucleo')
+    proceso = subprocess.Popen(argumentos, stdout=subprocess.PIPE, text=True)
+    if proceso.stdout.readline().strip() != 'listo':
+        proceso.kill()
+        raise RuntimeError('No se pudo iniciar el servidor local')
+    return proceso
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Carga para el servidor de comandos')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--puerto', type=int, default=None,
+                        help=f'8080, o {PUERTO_LOCAL} con --local')
+    parser.add_argument('--clientes', type=int, default=4)
+    parser.add_argument('--duracion', type=float, default=10, help='segundos medidos')
+    parser.add_argument('--calentamiento', type=float, default=1,
+                        help='segundos iniciales que no se miden')
+    parser.add_argument('--mezcla', default=MEZCLA, help='comando=peso,...')
+    parser.add_argument('--semilla', type=int, default=1)
+    parser.add_argument('--timeout', type=float, default=2, help='segundos por respuesta')
+    parser.add_argument('--pausa-ms', type=float, default=0,
+                        help='pausa de cada cliente entre peticiones')
+    parser.add_argument('--local', action='store_true',
+                        help='levantar el firmware simulado como servidor')
+    parser.add_argument('--doble-nucleo', action='store_true',
+                        help='con --local, servidor en un hilo aparte del control')
+    parser.add_argument('--salida', help='guardar el JSON en este archivo')
+    parser.add_argument('--comparar', help='JSON de una corrida anterior')
+    parser.add_argument('--servir', action='store_true', help=argparse.SUPPRESS)
+    opciones = parser.parse_args()
+
+    if opciones.puerto is None:
+        opciones.puerto = PUERTO_LOCAL if opciones.local or opciones.servir else 8080
+    if opciones.servir:
+        servir(opciones.puerto, opciones.doble_nucleo)
+        return
+
+    proceso = None
+    if opciones.local:
+        opciones.host = '127.0.0.1'
+        proceso = levantar_local(opciones.puerto, opciones.doble_nucleo)
+    try:
+        resultado = ejecutar(opciones)
+    finally:
+        if proceso is not None:
+            proceso.terminate()
+            proceso.wait()
+
+    texto = json.dumps(resultado, indent=2, ensure_ascii=False)
+    print(texto)
+    if opciones.salida:
+        with open(opciones.salida, 'w') as f:
+            f.write(texto + '\n')
+    if opciones.comparar:
+        with open(opciones.comparar) as f:
+            comparar(json.load(f), resultado)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""Corre el firmware completo en el simulador y mide el ciclo principal
+
+main.py se ejecuta en CPython sobre hal_simulado: los botones se presionan
+por software y el reloj es virtual. Cada minuto virtual entra un vehículo y
+sale el más antiguo. Muestra cuánto más rápido que el tiempo real corre y,
+con --perfil, las funciones más costosas (cProfile):
+
+    python benchmarks/sim_ciclo.py [minutos] [--perfil]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import bitacora
+import hal_simulado
+import main as firmware
+
+CICLOS_POR_MINUTO = 60000 // firmware.PERIODO_CICLO_MS
+PIN_ENTRADA = 17
+PIN_SALIDA = 16
+
+
+def simular(minutos):
+    for minuto in range(minutos):
+        hal_simulado.presionar(PIN_ENTRADA)
+        for _ in range(CICLOS_POR_MINUTO // 2):
+            firmware.paso()
+        if firmware.vehiculos.ocupacion >= firmware.NUM_ESPACIOS:
+            # Cobrar y dejar salir al más antiguo (dos pulsaciones)
+            hal_simulado.presionar(PIN_SALIDA)
+            for _ in range(10):
+                firmware.paso()
+            hal_simulado.presionar(PIN_SALIDA)
+        for _ in range(CICLOS_POR_MINUTO // 2):
+            firmware.paso()
+
+
+def main():
+    argumentos = [a for a in sys.argv[1:] if not a.startswith('--')]
+    minutos = int(argumentos[0]) if argumentos else 60
+    bitacora.nivel_consola = bitacora.ERROR
+
+    firmware.arrancar()
+    inicio = time.perf_counter()
+    if '--perfil' in sys.argv:
+        import cProfile
+        import pstats
+        perfil = cProfile.Profile()
+        perfil.runcall(simular, minutos)
+        pstats.Stats(perfil).sort_stats('tottime').print_stats(12)
+    else:
+        simular(minutos)
+    real = time.perf_counter() - inicio
+
+    ciclos = minutos * CICLOS_POR_MINUTO
+    ciclo = firmware.manejar_comandos({'accion': 'metricas'})['ciclo_us']
+    print(f"{minutos} min virtuales ({ciclos} ciclos) en {real:.2f} s: "
+          f"{minutos * 60 / real:.0f}x tiempo real, {real / ciclos * 1e6:.1f} us/ciclo")
+    print(f"Ciclo virtual: p50={ciclo['p50']} us, max={ciclo['max']} us")
+    print(f"Vehículos: {firmware.vehiculos.ocupacion}, "
+          f"recaudado: ₡{firmware.diario.estado['recaudado']:,}")
+
+
+if __name__ == '__main__':
+    main()
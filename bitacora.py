@@ -0,0 +1,132 @@
+"""Bitácora con niveles, buffer circular en RAM y límite de mensajes repetidos
+
+Los mensajes se pasan como plantilla y argumentos (estilo %), así el texto
+solo se arma si el nivel está habilitado:
+
+    bitacora.debug("LDR1: %d", valor)
+
+Cada registro queda en un buffer circular que la acción "logs" devuelve.
+Un mismo mensaje (plantilla y argumentos) repetido dentro de
+INTERVALO_REPETICION_MS se cuenta en lugar de guardarse e imprimirse otra vez.
+"""
+import tiempo
+
+try:
+    import _thread
+    # Con doble núcleo (nucleos.py) ambos núcleos registran mensajes
+    _lock = _thread.allocate_lock()
+except ImportError:
+    _lock = None
+
+DEBUG = 10
+INFO = 20
+AVISO = 30
+ERROR = 40
+NOMBRES = {DEBUG: 'DEBUG', INFO: 'INFO', AVISO: 'AVISO', ERROR: 'ERROR'}
+
+TAM_BUFFER = 32
+INTERVALO_REPETICION_MS = 5000
+MAX_MENSAJES_RECORDADOS = 16
+
+# Nivel mínimo que se guarda y nivel mínimo que además se imprime por serial
+nivel = INFO
+nivel_consola = INFO
+
+_registros = [None] * TAM_BUFFER
+_pos = 0
+_total = 0
+_repetidos = {}
+suprimidos = 0
+
+
+def debug(mensaje, *args):
+    """Registra un mensaje de depuración"""
+    if nivel <= DEBUG:
+        _registrar(DEBUG, mensaje, args)
+
+
+def info(mensaje, *args):
+    """Registra un mensaje informativo"""
+    if nivel <= INFO:
+        _registrar(INFO, mensaje, args)
+
+
+def aviso(mensaje, *args):
+    """Registra una advertencia"""
+    if nivel <= AVISO:
+        _registrar(AVISO, mensaje, args)
+
+
+def error(mensaje, *args):
+    """Registra un error"""
+    if nivel <= ERROR:
+        _registrar(ERROR, mensaje, args)
+
+
+def _registrar(nivel_msg, mensaje, args):
+    if _lock is None:
+        _guardar(nivel_msg, mensaje, args)
+        return
+    _lock.acquire()
+    try:
+        _guardar(nivel_msg, mensaje, args)
+    finally:
+        _lock.release()
+
+
+def _guardar(nivel_msg, mensaje, args):
+    global _pos, _total, suprimidos
+    ahora = tiempo.ticks_ms()
+
+    # Límite de repeticiones por mensaje
+    clave = (mensaje, args) if args else mensaje
+    previo = _repetidos.get(clave)
+    repetidos = 0
+    if previo is not None:
+        instante, repetidos = previo
+        if tiempo.ticks_diff(ahora, instante) < INTERVALO_REPETICION_MS:
+            _repetidos[clave] = (instante, repetidos + 1)
+            suprimidos += 1
+            return
+    elif len(_repetidos) >= MAX_MENSAJES_RECORDADOS:
+        _repetidos.clear()
+    _repetidos[clave] = (ahora, 0)
+
+    texto = mensaje % args if args else mensaje
+    if repetidos:
+        texto = f"{texto} (+{repetidos} repetidos)"
+
+    _registros[_pos] = (_total, ahora, nivel_msg, texto)
+    _pos = (_pos + 1) % TAM_BUFFER
+    _total += 1
+
+    if nivel_msg >= nivel_consola:
+        print(texto)
+
+
+def registros(desde=0, nivel_min=DEBUG):
+    """Retorna los registros guardados con número >= desde, del más antiguo al más nuevo"""
+    resultado = []
+    for i in range(TAM_BUFFER):
+        registro = _registros[(_pos + i) % TAM_BUFFER]
+        if registro is None:
+            continue
+        numero, instante, nivel_msg, texto = registro
+        if numero >= desde and nivel_msg >= nivel_min:
+            resultado.append({
+                'n': numero,
+                't': instante,
+                'nivel': NOMBRES[nivel_msg],
+                'msg': texto
+            })
+    return resultado
+
+
+def limpiar():
+    """Vacía el buffer de registros"""
+    global _pos, suprimidos
+    for i in range(TAM_BUFFER):
+        _registros[i] = None
+    _repetidos.clear()
+    _pos = 0
+    suprimidos = 0
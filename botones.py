@@ -0,0 +1,75 @@
+"""Captura de botones por interrupción con cola circular de flancos"""
+from array import array
+import tiempo
+
+TAM_COLA = 64
+DEBOUNCE_MS = 50
+
+
+class CapturaBotones:
+    """Registra cada flanco de los pines en una cola preasignada
+
+    La interrupción solo guarda el instante, el pin y su nivel; el antirrebote
+    se hace al drenar la cola comparando marcas de tiempo. Una pulsación se
+    acepta cuando el pin baja después de haber estado estable al menos
+    debounce_ms, así que los rebotes al presionar y al soltar se descartan.
+    """
+
+    def __init__(self, pines, tam_cola=TAM_COLA, debounce_ms=DEBOUNCE_MS):
+        self.debounce_ms = debounce_ms
+        self.descartados = 0
+        self.rebotes = 0
+        self._tam = tam_cola
+        self._tiempos = array('i', [0] * tam_cola)
+        self._origen = bytearray(tam_cola)
+        self._nivel = bytearray(tam_cola)
+        self._escritura = 0
+        self._lectura = 0
+        inicio = tiempo.ticks_add(tiempo.ticks_ms(), -debounce_ms)
+        self._ultimo = array('i', [inicio] * len(pines))
+        for indice, pin in enumerate(pines):
+            pin.irq(trigger=pin.IRQ_FALLING | pin.IRQ_RISING,
+                    handler=self._manejador(indice))
+
+    def _manejador(self, indice):
+        def manejador(pin):
+            self._registrar(indice, pin.value())
+        return manejador
+
+    def _registrar(self, indice, nivel):
+        # Corre en contexto de interrupción: no debe reservar memoria
+        siguiente = (self._escritura + 1) % self._tam
+        if siguiente == self._lectura:
+            self.descartados += 1
+            return
+        pos = self._escritura
+        self._tiempos[pos] = tiempo.ticks_ms()
+        self._origen[pos] = indice
+        self._nivel[pos] = nivel
+        self._escritura = siguiente
+
+    def pendientes(self):
+        """Cantidad de flancos sin procesar"""
+        return (self._escritura - self._lectura) % self._tam
+
+    def vaciar(self):
+        """Descarta los flancos acumulados"""
+        self._lectura = self._escritura
+
+    def siguiente(self):
+        """Retorna el índice del siguiente botón presionado o -1 si no hay"""
+        while self._lectura != self._escritura:
+            pos = self._lectura
+            indice = self._origen[pos]
+            instante = self._tiempos[pos]
+            nivel = self._nivel[pos]
+            self._lectura = (pos + 1) % self._tam
+
+            estable = tiempo.ticks_diff(instante, self._ultimo[indice]) >= self.debounce_ms
+            self._ultimo[indice] = instante
+            # Botón presionado = 0 (conectado a GND con PULL_UP)
+            if nivel == 0:
+                if estable:
+                    return indice
+                self.rebotes += 1
+        return -1
@@ -0,0 +1,323 @@
+"""Cliente de comandos en segundo plano para la interfaz
+
+Un hilo propio mantiene una conexión con tramas (ver protocolo.py) y envía
+en orden los comandos de una cola. enviar() no bloquea: retorna un Futuro
+cuyo resultado se entrega con la función entregar, que en la interfaz lo
+pasa al hilo de Tk con root.after:
+
+    cliente = ClienteComandos(ip, 8080, entregar=lambda f, *a: root.after(0, f, *a))
+    cliente.enviar({"accion": "aguja", "estado": True}).al_terminar(mostrar)
+
+Si la conexión falla se reintenta con espera exponencial; mientras dura la
+espera los comandos fallan en el acto en lugar de quedar colgados.
+
+Sondeo consulta el estado desde un solo hilo con intervalo adaptable.
+"""
+from collections import deque
+import queue
+import select
+import socket
+import threading
+import time
+from protocolo import LectorTramas, codificar_trama, decodificar_trama
+
+TIMEOUT_S = 3
+TAM_COLA = 32
+ESPERA_INICIAL_S = 0.5
+ESPERA_MAXIMA_S = 30
+
+
+class ErrorComando(Exception):
+    """El Pico respondió la petición con un error"""
+
+
+class Futuro:
+    """Resultado de un comando que se completa desde el hilo del cliente"""
+
+    def __init__(self, entregar):
+        self.resultado = None
+        self.error = None
+        self._entregar = entregar
+        self._evento = threading.Event()
+        self._lock = threading.Lock()
+        self._funciones = []
+
+    def listo(self):
+        """True si ya hay resultado o error"""
+        return self._evento.is_set()
+
+    def al_terminar(self, funcion):
+        """Llama funcion(futuro) al completarse (con entregar, en el hilo de Tk)"""
+        with self._lock:
+            if not self._evento.is_set():
+                self._funciones.append(funcion)
+                return self
+        self._entregar(funcion, self)
+        return self
+
+    def esperar(self, timeout=None):
+        """Bloquea hasta el resultado; lanza el error si lo hubo (no usar en el hilo de Tk)"""
+        if not self._evento.wait(timeout):
+            raise TimeoutError('Comando sin respuesta')
+        if self.error is not None:
+            raise self.error
+        return self.resultado
+
+    def _completar(self, resultado=None, error=None):
+        with self._lock:
+            self.resultado = resultado
+            self.error = error
+            self._evento.set()
+            funciones = self._funciones
+            self._funciones = []
+        for funcion in funciones:
+            self._entregar(funcion, self)
+
+
+def _llamar(funcion, *args):
+    funcion(*args)
+
+
+class ClienteComandos:
+    """Conexión persistente con el Pico atendida por un hilo en segundo plano"""
+
+    def __init__(self, host, puerto, entregar=_llamar, timeout_s=TIMEOUT_S,
+                 tam_cola=TAM_COLA, espera_inicial_s=ESPERA_INICIAL_S,
+                 espera_maxima_s=ESPERA_MAXIMA_S):
+        self.host = host
+        self.puerto = puerto
+        self.entregar = entregar
+        self.timeout_s = timeout_s
+        self.espera_inicial_s = espera_inicial_s
+        self.espera_maxima_s = espera_maxima_s
+        self.conectado = False
+        self.reconexiones = 0
+        self._cola = queue.Queue(tam_cola)
+        self._sock = None
+        self._lector = None
+        self._siguiente_id = 0
+        self._espera = espera_inicial_s
+        self._reintento = 0
+        self._hubo_conexion = False
+        self._activo = True
+        self._hilo = threading.Thread(target=self._ciclo, daemon=True)
+        self._hilo.start()
+
+    def enviar(self, comando):
+        """Encola un comando (dict sin id) y retorna su Futuro"""
+        futuro = Futuro(self.entregar)
+        try:
+            self._cola.put_nowait((comando, futuro))
+        except queue.Full:
+            futuro._completar(error=ConnectionError('Cola de comandos llena'))
+        return futuro
+
+    def cerrar(self):
+        """Detiene el hilo y cierra la conexión"""
+        self._activo = False
+        self._cola.put((None, None))
+
+    def _ciclo(self):
+        while self._activo:
+            comando, futuro = self._cola.get()
+            if futuro is None:
+                break
+            try:
+                futuro._completar(self._ejecutar(comando))
+            except Exception as e:
+                futuro._completar(error=e)
+        self._desconectar()
+
+    def _ejecutar(self, comando):
+        # Una conexión guardada puede haberse caído: si el envío falla se
+        # reintenta una vez con una nueva. Si la petición ya salió no se
+        # repite (una entrada o un lote se aplicarían dos veces)
+        for intento in range(2):
+            nueva = self._sock is None
+            self._conectar()
+            try:
+                id_peticion = self._escribir(comando)
+            except OSError:
+                self._desconectar()
+                if nueva or intento:
+                    self._fallo()
+                    raise
+                continue
+            try:
+                respuesta = self._leer(id_peticion)
+                break
+            except (OSError, ValueError):
+                self._desconectar()
+                self._fallo()
+                raise
+        if 'error' in respuesta:
+            raise ErrorComando(respuesta['error'])
+        return respuesta.get('resultado')
+
+    def _conectar(self):
+        if self._sock is not None:
+            if not self._cerrada():
+                return
+            # El Pico cerró la conexión guardada (p. ej. por inactividad)
+            self._desconectar()
+        restante = self._reintento - time.monotonic()
+        if restante > 0:
+            raise ConnectionError(f'Sin conexión con {self.host} (reintento en {restante:.1f} s)')
+        try:
+            self._sock = socket.create_connection((self.host, self.puerto), timeout=self.timeout_s)
+        except OSError:
+            self._fallo()
+            raise
+        if self._hubo_conexion:
+            self.reconexiones += 1
+        self._hubo_conexion = True
+        self._lector = LectorTramas()
+        self.conectado = True
+        self._espera = self.espera_inicial_s
+
+    def _cerrada(self):
+        # Sin bloquear: una conexión cerrada por el otro lado se lee como vacía
+        try:
+            legible, _, _ = select.select([self._sock], [], [], 0)
+            return bool(legible) and not self._sock.recv(1, socket.MSG_PEEK)
+        except OSError:
+            return True
+
+    def _fallo(self):
+        # Espera exponencial antes del siguiente intento de conexión
+        self.conectado = False
+        self._reintento = time.monotonic() + self._espera
+        self._espera = min(self._espera * 2, self.espera_maxima_s)
+
+    def _desconectar(self):
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            except OSError:
+                pass
+        self._sock = None
+        self._lector = None
+
+    def _escribir(self, comando):
+        self._siguiente_id += 1
+        self._sock.sendall(codificar_trama(dict(comando, id=self._siguiente_id)))
+        return self._siguiente_id
+
+    def _leer(self, id_peticion):
+        while True:
+            trama = self._lector.siguiente()
+            if trama is None:
+                datos = self._sock.recv(1024)
+                if not datos:
+                    raise ConnectionError('Conexión cerrada por el Pico')
+                self._lector.agregar(datos)
+                continue
+            respuesta = decodificar_trama(trama)
+            # Respuestas atrasadas de peticiones que expiraron se descartan
+            if respuesta.get('id') == id_peticion:
+                return respuesta
+
+
+# Sondeo adaptable del estado
+INTERVALO_ACTIVO_S = 1
+INTERVALO_INACTIVO_S = 5
+ESPERA_FALLO_S = 2
+INTERVALO_MAXIMO_S = 60
+# Segundos que el parqueo se considera activo después de un cambio
+ACTIVIDAD_S = 30
+# Consultas recientes con las que se calcula la tasa de éxito
+VENTANA_EXITO = 20
+# Campos del estado cuyo cambio indica movimiento (las fotoceldas fluctúan)
+CLAVES_ACTIVIDAD = ('espacios', 'aguja', 'vehiculos', 'led1', 'led2', 'led3')
+
+
+class Sondeo:
+    """Consulta periódica del estado desde un único hilo que nunca se solapa
+
+    consultar() retorna el estado o lanza una excepción; al_estado(estado) y
+    al_medir(sondeo) se llaman desde el hilo del sondeo. Consulta cada
+    intervalo_activo_s mientras el parqueo tiene movimiento, cada
+    intervalo_inactivo_s si está quieto, y con espera exponencial hasta
+    intervalo_maximo_s mientras falla. pedir() adelanta la siguiente consulta;
+    las demandas que llegan con una consulta en curso se combinan en una sola.
+    Mientras pausado() sea True (p. ej. con suscripción) no consulta.
+    """
+
+    def __init__(self, consultar, al_estado, al_medir=None, pausado=None,
+                 intervalo_activo_s=INTERVALO_ACTIVO_S,
+                 intervalo_inactivo_s=INTERVALO_INACTIVO_S,
+                 intervalo_maximo_s=INTERVALO_MAXIMO_S):
+        self.consultar = consultar
+        self.al_estado = al_estado
+        self.al_medir = al_medir
+        self.pausado = pausado
+        self.intervalo_activo_s = intervalo_activo_s
+        self.intervalo_inactivo_s = intervalo_inactivo_s
+        self.intervalo_maximo_s = intervalo_maximo_s
+        self.consultas = 0
+        self.fallos_seguidos = 0
+        self.rtt_ms = None
+        self.intervalo_s = 0
+        self._resultados = deque(maxlen=VENTANA_EXITO)
+        self._ultima_clave = None
+        self._ultimo_cambio = 0
+        self._demanda = threading.Event()
+        self._activo = True
+        self._hilo = threading.Thread(target=self._ciclo, daemon=True)
+        self._hilo.start()
+
+    @property
+    def exito(self):
+        """Fracción de consultas recientes que tuvieron respuesta (None sin consultas)"""
+        if not self._resultados:
+            return None
+        return sum(self._resultados) / len(self._resultados)
+
+    def pedir(self):
+        """Pide una consulta cuanto antes"""
+        self._demanda.set()
+
+    def detener(self):
+        """Termina el hilo del sondeo"""
+        self._activo = False
+        self._demanda.set()
+
+    def _ciclo(self):
+        while True:
+            self._demanda.wait(self.intervalo_s)
+            self._demanda.clear()
+            if not self._activo:
+                return
+            if self.pausado is not None and self.pausado():
+                self.intervalo_s = self.intervalo_inactivo_s
+            else:
+                self.intervalo_s = self._consultar()
+            if self.al_medir is not None:
+                self.al_medir(self)
+
+    def _consultar(self):
+        """Hace una consulta y retorna la espera hasta la siguiente"""
+        self.consultas += 1
+        inicio = time.monotonic()
+        try:
+            estado = self.consultar()
+        except Exception:
+            self._resultados.append(False)
+            self.fallos_seguidos += 1
+            return min(ESPERA_FALLO_S * 2 ** (self.fallos_seguidos - 1),
+                       self.intervalo_maximo_s)
+        ahora = time.monotonic()
+        rtt_ms = (ahora - inicio) * 1000
+        # Promedio móvil exponencial para que un pico aislado no salte en el footer
+        self.rtt_ms = rtt_ms if self.rtt_ms is None else self.rtt_ms * 0.8 + rtt_ms * 0.2
+        self._resultados.append(True)
+        self.fallos_seguidos = 0
+
+        clave = tuple(estado.get(c) for c in CLAVES_ACTIVIDAD)
+        if clave != self._ultima_clave or estado.get('aguja'):
+            self._ultimo_cambio = ahora
+        self._ultima_clave = clave
+        self.al_estado(estado)
+        if ahora - self._ultimo_cambio < ACTIVIDAD_S:
+            return self.intervalo_activo_s
+        return self.intervalo_inactivo_s
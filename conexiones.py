@@ -0,0 +1,411 @@
+"""Servidor de comandos con varios clientes simultáneos (select.poll)"""
+import errno
+import socket
+import select
+import json
+import sys
+import tiempo
+import bitacora
+import metricas
+from protocolo import (BufferTramas, PeticionRapida, CLAVE_ID, codificar_trama,
+                       codificar_trama_binaria, decodificar_peticion)
+
+# Configuración del servidor
+PUERTO = 8080
+MAX_CLIENTES = 4
+TIMEOUT_CLIENTE_MS = 5000
+TIMEOUT_PERSISTENTE_MS = 60000
+TAM_MAX_PETICION = 1024
+TAM_LECTURA = 256
+TAM_MAX_SALIDA = 2048
+LATIDO_MS = 10000
+
+# En CPython poll() devuelve descriptores; en MicroPython devuelve el socket
+_POLL_DEVUELVE_FD = sys.implementation.name != 'micropython'
+# Operación que bloquearía en un socket no bloqueante (11 en Linux y el Pico, 35 en macOS)
+_EAGAIN = errno.EAGAIN
+
+# Recepción directa en un buffer preasignado: recv_into en CPython, readinto
+# en MicroPython (retorna None si no hay datos)
+if _POLL_DEVUELVE_FD:
+    def _recibir_en(conn, buffer):
+        return conn.recv_into(buffer)
+else:
+    def _recibir_en(conn, buffer):
+        return conn.readinto(buffer)
+
+
+def _clave(sock):
+    return sock.fileno() if _POLL_DEVUELVE_FD else sock
+
+
+def _trama_resultado(id_peticion, resultado):
+    if isinstance(resultado, (bytes, bytearray)):
+        return codificar_trama_binaria(id_peticion, resultado)
+    return codificar_trama({'id': id_peticion, 'resultado': resultado})
+
+
+def codificar_respuesta(respuesta):
+    """Convierte el resultado de un comando en bytes para el cliente"""
+    if isinstance(respuesta, (bytes, bytearray)):
+        return bytes(respuesta)
+    if isinstance(respuesta, str):
+        return respuesta.encode()
+    return json.dumps(respuesta).encode()
+
+
+class Diferida:
+    """Respuesta que llega después: el manejador la retorna y luego se entrega
+    con ServidorComandos.completar(numero, ...) (ver nucleos.py)"""
+
+    def __init__(self, numero):
+        self.numero = numero
+
+
+class _Cliente:
+    """Estado de una conexión abierta"""
+
+    def __init__(self, conn, addr, ahora):
+        self.conn = conn
+        self.addr = addr
+        self.entrada = BufferTramas(TAM_MAX_PETICION)
+        self.tramas = False
+        self.salida = b''
+        self.ultimo = ahora
+        self.cerrar_al_enviar = False
+        self.suscrito = False
+        self.ultimo_envio = ahora
+        # Inicio de la petición en curso (aceptación o primera lectura), en µs
+        self.inicio_us = tiempo.ticks_us()
+
+
+class ServidorComandos:
+    """Atiende varios clientes a la vez sin bloquear el ciclo principal
+
+    manejador(comando) recibe el dict del comando y retorna la respuesta
+    (dict, str o bytes). Las lecturas parciales se acumulan por conexión
+    hasta completar el JSON. Una conexión pasa a modo tramas (ver
+    protocolo.py) en cuanto recibe un salto de línea; en ese modo queda
+    abierta y cada respuesta lleva el id de su petición.
+
+    instantanea() retorna el estado resumido que se empuja a las conexiones
+    suscritas con la acción "suscribir": publicar() envía solo los campos
+    que cambiaron y un latido cada latido_ms si no hubo cambios.
+
+    Si manejador retorna una Diferida la petición queda pendiente y la
+    respuesta se envía al llamar completar() con su número.
+
+    rapido(peticion) recibe las tramas que PeticionRapida entiende sin
+    decodificar el JSON y retorna la trama de respuesta ya armada (un buffer
+    reutilizable), o None para seguir el camino normal con manejador.
+    """
+
+    def __init__(self, manejador, puerto=PUERTO, max_clientes=MAX_CLIENTES,
+                 timeout_ms=TIMEOUT_CLIENTE_MS,
+                 timeout_persistente_ms=TIMEOUT_PERSISTENTE_MS,
+                 instantanea=None, latido_ms=LATIDO_MS, rapido=None):
+        self.manejador = manejador
+        self.rapido = rapido
+        self._peticion = PeticionRapida()
+        self.instantanea = instantanea
+        self.latido_ms = latido_ms
+        self.puerto = puerto
+        self.max_clientes = max_clientes
+        self.timeout_ms = timeout_ms
+        self.timeout_persistente_ms = timeout_persistente_ms
+        self.rechazados = 0
+        self._sock = None
+        self._poll = select.poll()
+        self._clientes = {}
+        self._suscriptores = []
+        self._publicado = None
+        self._diferidas = {}
+
+    @property
+    def clientes(self):
+        """Cantidad de conexiones abiertas"""
+        return len(self._clientes)
+
+    @property
+    def suscriptores(self):
+        """Cantidad de conexiones suscritas a cambios de estado"""
+        return len(self._suscriptores)
+
+    def publicar(self):
+        """Envía a los suscriptores los campos del estado que cambiaron"""
+        if not self._suscriptores:
+            return
+        actual = self.instantanea()
+        cambios = {}
+        for clave in actual:
+            if self._publicado.get(clave) != actual[clave]:
+                cambios[clave] = actual[clave]
+        self._publicado = actual
+
+        ahora = tiempo.ticks_ms()
+        trama_cambios = codificar_trama({'evento': 'delta', 'datos': cambios}) if cambios else None
+        for cliente in list(self._suscriptores):
+            if trama_cambios is not None:
+                self._enviar(cliente, trama_cambios)
+            elif tiempo.ticks_diff(ahora, cliente.ultimo_envio) >= self.latido_ms:
+                self._enviar(cliente, codificar_trama({'evento': 'latido'}))
+
+    def _suscribir(self, cliente, id_peticion):
+        if self.instantanea is None:
+            raise ValueError('Suscripción no disponible')
+        # Entregar cambios pendientes a los demás antes de tomar la instantánea
+        self.publicar()
+        self._publicado = self.instantanea()
+        if not cliente.suscrito:
+            cliente.suscrito = True
+            self._suscriptores.append(cliente)
+        self._enviar(cliente, codificar_trama({'id': id_peticion, 'resultado': self._publicado}))
+
+    def iniciar(self):
+        """Abre el socket de escucha"""
+        addr = socket.getaddrinfo('0.0.0.0', self.puerto)[0][-1]
+        s = socket.socket()
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        s.bind(addr)
+        s.listen(self.max_clientes)
+        s.setblocking(False)
+        self._sock = s
+        self._poll.register(s, select.POLLIN)
+        bitacora.info('Servidor escuchando en puerto %d', self.puerto)
+        return self
+
+    def atender(self, timeout_ms=0):
+        """Atiende todos los clientes listos; espera como máximo timeout_ms"""
+        for obj, evento in self._poll.poll(timeout_ms):
+            if obj == _clave(self._sock):
+                self._aceptar()
+                continue
+            cliente = self._clientes.get(obj)
+            if cliente is None:
+                continue
+            if evento & (select.POLLHUP | select.POLLERR):
+                self._cerrar(cliente)
+                continue
+            if evento & select.POLLIN:
+                try:
+                    self._leer(cliente)
+                except Exception as e:
+                    # Una petición inesperada solo corta a su cliente, nunca el ciclo
+                    bitacora.error("Error: %s", e)
+                    self._cerrar(cliente)
+            if evento & select.POLLOUT and cliente.conn is not None:
+                self._escribir(cliente)
+        self._expirar()
+
+    def _aceptar(self):
+        try:
+            conn, addr = self._sock.accept()
+        except OSError:
+            return
+        if len(self._clientes) >= self.max_clientes:
+            self.rechazados += 1
+            conn.close()
+            return
+        bitacora.debug('Conexión desde: %s', addr)
+        conn.setblocking(False)
+        self._clientes[_clave(conn)] = _Cliente(conn, addr, tiempo.ticks_ms())
+        self._poll.register(conn, select.POLLIN)
+
+    def _leer(self, cliente):
+        entrada = cliente.entrada
+        libre = entrada.libre()
+        if libre is None:
+            # El buffer se llenó sin completar una petición
+            metricas.contar_error_parseo()
+            bitacora.error('Error: petición demasiado grande')
+            self._cerrar(cliente)
+            return
+        try:
+            cantidad = _recibir_en(cliente.conn, libre)
+        except OSError as e:
+            if e.args[0] != _EAGAIN:
+                self._cerrar(cliente)
+            return
+        if cantidad is None:
+            return
+        if not cantidad:
+            self._cerrar(cliente)
+            return
+        metricas.bytes_recibidos.agregar(cantidad)
+        if cliente.tramas and not entrada.pendientes():
+            cliente.inicio_us = tiempo.ticks_us()
+        cliente.ultimo = tiempo.ticks_ms()
+        entrada.avanzar(cantidad)
+        self._procesar(cliente)
+
+    def _procesar(self, cliente):
+        entrada = cliente.entrada
+        if not cliente.tramas:
+            if entrada.buscar() < 0:
+                self._procesar_unica(cliente)
+                return
+            cliente.tramas = True
+        while cliente.conn is not None:
+            fin = entrada.buscar()
+            if fin < 0:
+                return
+            if not entrada.vacio(fin):
+                self._procesar_trama(cliente, entrada.inicio, fin)
+            entrada.consumir()
+
+    def _procesar_unica(self, cliente):
+        """Protocolo original: un JSON por conexión, sin id ni salto de línea"""
+        try:
+            comando = json.loads(cliente.entrada.contenido().decode())
+        except ValueError:
+            # JSON incompleto: esperar más datos
+            return
+        if isinstance(comando, dict) and 'id' in comando:
+            # Cliente con tramas: esperar el salto de línea
+            return
+        cliente.entrada.vaciar()
+        try:
+            respuesta = self.manejador(comando)
+        except Exception as e:
+            bitacora.error("Error: %s", e)
+            self._cerrar(cliente)
+            return
+        if isinstance(respuesta, Diferida):
+            self._diferidas[respuesta.numero] = (cliente, None)
+            return
+        self._responder(cliente, codificar_respuesta(respuesta), True)
+
+    def _procesar_trama(self, cliente, inicio, fin):
+        datos = cliente.entrada.datos
+        peticion = self._peticion
+        if self.rapido is not None and peticion.analizar(datos, inicio, fin):
+            try:
+                respuesta = self.rapido(peticion)
+            except Exception as e:
+                bitacora.error("Error: %s", e)
+                respuesta = codificar_trama({'id': peticion.entero(CLAVE_ID, None), 'error': str(e)})
+            if respuesta is not None:
+                self._responder(cliente, respuesta)
+                return
+
+        id_peticion = None
+        try:
+            comando = decodificar_peticion(datos[inicio:fin])
+        except Exception as e:
+            # ValueError del JSON o cualquier otro error con bytes arbitrarios
+            metricas.contar_error_parseo()
+            bitacora.error("Error: %s", e)
+            self._responder(cliente, codificar_trama({'id': None, 'error': str(e)}))
+            return
+        try:
+            id_peticion = comando.get('id')
+            if comando.get('accion') == 'suscribir':
+                self._suscribir(cliente, id_peticion)
+                return
+            resultado = self.manejador(comando)
+            if isinstance(resultado, Diferida):
+                self._diferidas[resultado.numero] = (cliente, id_peticion)
+                return
+            trama = _trama_resultado(id_peticion, resultado)
+        except Exception as e:
+            bitacora.error("Error: %s", e)
+            trama = codificar_trama({'id': id_peticion, 'error': str(e)})
+        self._responder(cliente, trama)
+
+    def completar(self, numero, resultado, error=None):
+        """Entrega la respuesta de una petición Diferida; error es la excepción si falló"""
+        pendiente = self._diferidas.pop(numero, None)
+        if pendiente is None:
+            return
+        cliente, id_peticion = pendiente
+        if cliente.conn is None:
+            return
+        if not cliente.tramas:
+            if error is not None:
+                bitacora.error("Error: %s", error)
+                self._cerrar(cliente)
+            else:
+                self._responder(cliente, codificar_respuesta(resultado), True)
+            return
+        try:
+            if error is not None:
+                raise error
+            trama = _trama_resultado(id_peticion, resultado)
+        except Exception as e:
+            bitacora.error("Error: %s", e)
+            trama = codificar_trama({'id': id_peticion, 'error': str(e)})
+        self._responder(cliente, trama)
+
+    def _responder(self, cliente, datos, cerrar=False):
+        # Respuesta a una petición: se mide desde que empezó a llegar
+        metricas.latencia.agregar(tiempo.ticks_diff(tiempo.ticks_us(), cliente.inicio_us))
+        self._enviar(cliente, datos, cerrar)
+
+    def _enviar(self, cliente, datos, cerrar=False):
+        if len(cliente.salida) + len(datos) > TAM_MAX_SALIDA:
+            # Cliente que no lee: se descarta antes de agotar la memoria
+            bitacora.aviso('Cliente lento, cerrando conexión')
+            self._cerrar(cliente)
+            return
+        metricas.bytes_enviados.agregar(len(datos))
+        cliente.ultimo_envio = tiempo.ticks_ms()
+        cliente.cerrar_al_enviar = cerrar
+        if cliente.salida:
+            cliente.salida += datos
+            self._escribir(cliente)
+            return
+
+        # Sin nada en cola se envía directo: datos puede ser un buffer reutilizable
+        try:
+            enviados = cliente.conn.send(datos) or 0
+        except OSError as e:
+            if e.args[0] != _EAGAIN:
+                self._cerrar(cliente)
+                return
+            enviados = 0
+        if enviados < len(datos):
+            cliente.salida = bytes(datos[enviados:])
+            self._poll.modify(cliente.conn, select.POLLIN | select.POLLOUT)
+        elif cerrar:
+            self._cerrar(cliente)
+
+    def _escribir(self, cliente):
+        try:
+            enviados = cliente.conn.send(cliente.salida)
+        except OSError as e:
+            if e.args[0] != _EAGAIN:
+                self._cerrar(cliente)
+            return
+        cliente.salida = cliente.salida[enviados or 0:]
+        if cliente.salida:
+            self._poll.modify(cliente.conn, select.POLLIN | select.POLLOUT)
+        elif cliente.cerrar_al_enviar:
+            self._cerrar(cliente)
+        else:
+            self._poll.modify(cliente.conn, select.POLLIN)
+
+    def _expirar(self):
+        if not self._clientes:
+            return
+        ahora = tiempo.ticks_ms()
+        for cliente in list(self._clientes.values()):
+            if cliente.suscrito:
+                continue
+            limite = self.timeout_persistente_ms if cliente.tramas else self.timeout_ms
+            if tiempo.ticks_diff(ahora, cliente.ultimo) > limite:
+                bitacora.debug('Conexión inactiva cerrada: %s', cliente.addr)
+                self._cerrar(cliente)
+
+    def _cerrar(self, cliente):
+        conn = cliente.conn
+        if conn is None:
+            return
+        self._clientes.pop(_clave(conn), None)
+        if cliente.suscrito:
+            self._suscriptores.remove(cliente)
+        try:
+            self._poll.unregister(conn)
+        except (OSError, KeyError, ValueError):
+            pass
+        conn.close()
+        cliente.conn = None
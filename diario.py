@@ -0,0 +1,287 @@
+"""Diario binario de solo anexado en flash con puntos de control
+
+Cada evento (entrada, salida, pago, cambio de espacio) se guarda como un
+registro de TAM_REGISTRO bytes con suma de verificación. Los registros se
+acumulan en RAM y se escriben en lotes para no desgastar la flash. Los
+archivos se rotan por segmentos: al llenarse uno se escribe un punto de
+control con el estado completo y se borran los segmentos anteriores.
+
+Al arrancar, recuperar() carga el último punto de control y reaplica la cola
+de registros; luego escribe un punto de control nuevo y abre un segmento
+vacío, así la recuperación nunca lee más de un segmento. Funciona igual en
+CPython usando un directorio temporal.
+"""
+import os
+import json
+import struct
+import tiempo
+import bitacora
+
+# Tipos de evento
+ENTRADA = 1
+SALIDA = 2
+PAGO = 3
+ESPACIO = 4
+
+# tipo, espacio, vehículo, valor, instante (s), suma de verificación
+FORMATO_REGISTRO = '<BhIiIB'
+TAM_REGISTRO = struct.calcsize(FORMATO_REGISTRO)
+
+TAM_SEGMENTO = 4096
+TAM_LOTE = 8
+MAX_ESPERA_MS = 2000
+PUNTO_CONTROL = 'punto.json'
+PREFIJO_SEGMENTO = 'diario_'
+EXTENSION_SEGMENTO = '.bin'
+
+
+def estado_inicial(num_espacios):
+    """Estado vacío: todos los espacios libres y ningún vehículo"""
+    return {
+        'vehiculos': {},
+        'libres': [1] * num_espacios,
+        'siguiente_id': 0,
+        'ultimo_costo': 0,
+        'recaudado': 0
+    }
+
+
+def aplicar(estado, tipo, vehiculo, espacio, valor, instante):
+    """Aplica un evento al estado"""
+    if tipo == ENTRADA:
+        estado['vehiculos'][vehiculo] = (instante, espacio)
+        if vehiculo >= estado['siguiente_id']:
+            estado['siguiente_id'] = vehiculo + 1
+    elif tipo == SALIDA:
+        estado['vehiculos'].pop(vehiculo, None)
+    elif tipo == PAGO:
+        estado['ultimo_costo'] = valor
+        estado['recaudado'] += valor
+    elif tipo == ESPACIO:
+        if 0 <= espacio < len(estado['libres']):
+            estado['libres'][espacio] = 1 if valor else 0
+
+
+def _suma(buffer, inicio):
+    total = 0
+    for i in range(inicio, inicio + TAM_REGISTRO - 1):
+        total += buffer[i]
+    return (total & 0xFF) ^ 0xA5
+
+
+def _existe(ruta):
+    try:
+        os.stat(ruta)
+        return True
+    except OSError:
+        return False
+
+
+class Diario:
+    """Diario de eventos del parqueo en el sistema de archivos"""
+
+    def __init__(self, directorio, num_espacios, tam_segmento=TAM_SEGMENTO,
+                 tam_lote=TAM_LOTE, max_espera_ms=MAX_ESPERA_MS):
+        self.directorio = directorio
+        self.num_espacios = num_espacios
+        self.tam_segmento = tam_segmento
+        self.tam_lote = tam_lote
+        self.max_espera_ms = max_espera_ms
+        self.estado = estado_inicial(num_espacios)
+        self.segmento = 0
+        self.escrituras = 0
+        self.errores = 0
+        self._punto_pendiente = False
+        self._buffer = bytearray(tam_lote * TAM_REGISTRO)
+        self._largo = 0
+        self._primero_ms = 0
+        self._transaccion = None
+
+    @property
+    def pendientes(self):
+        """Registros en RAM que aún no se escriben"""
+        return self._largo // TAM_REGISTRO
+
+    def _ruta(self, nombre):
+        return f"{self.directorio}/{nombre}"
+
+    def _ruta_segmento(self, numero):
+        return self._ruta(f"{PREFIJO_SEGMENTO}{numero:06d}{EXTENSION_SEGMENTO}")
+
+    def _segmentos(self):
+        numeros = []
+        for nombre in os.listdir(self.directorio):
+            if nombre.startswith(PREFIJO_SEGMENTO) and nombre.endswith(EXTENSION_SEGMENTO):
+                numeros.append(int(nombre[len(PREFIJO_SEGMENTO):-len(EXTENSION_SEGMENTO)]))
+        numeros.sort()
+        return numeros
+
+    # Recuperación
+
+    def recuperar(self):
+        """Reconstruye el estado desde el punto de control y la cola del diario"""
+        try:
+            os.mkdir(self.directorio)
+        except OSError:
+            pass
+
+        estado = estado_inicial(self.num_espacios)
+        desde = 0
+        ruta = self._ruta(PUNTO_CONTROL)
+        if _existe(ruta):
+            with open(ruta) as f:
+                punto = json.load(f)
+            desde = punto['segmento']
+            estado['libres'] = punto['libres']
+            estado['siguiente_id'] = punto['siguiente_id']
+            estado['ultimo_costo'] = punto['ultimo_costo']
+            estado['recaudado'] = punto['recaudado']
+            for vehiculo, instante, espacio in punto['vehiculos']:
+                estado['vehiculos'][vehiculo] = (instante, espacio)
+
+        ultimo = desde
+        for numero in self._segmentos():
+            if numero >= desde:
+                self._reaplicar(self._ruta_segmento(numero), estado)
+                ultimo = numero
+        self._ajustar_espacios(estado)
+
+        # Un segmento nuevo evita anexar detrás de un registro cortado
+        self.estado = estado
+        self._largo = 0
+        self._punto_control(ultimo + 1)
+        return estado
+
+    def _ajustar_espacios(self, estado):
+        """Adapta un estado guardado con otra cantidad de espacios a num_espacios
+
+        Los espacios nuevos quedan libres; los que sobran se descartan junto
+        con los vehículos asignados a ellos.
+        """
+        libres = estado['libres'][:self.num_espacios]
+        libres.extend([1] * (self.num_espacios - len(libres)))
+        estado['libres'] = libres
+        for vehiculo, (instante, espacio) in list(estado['vehiculos'].items()):
+            if espacio >= self.num_espacios:
+                del estado['vehiculos'][vehiculo]
+
+    def _reaplicar(self, ruta, estado):
+        with open(ruta, 'rb') as f:
+            datos = f.read()
+        for inicio in range(0, len(datos) - TAM_REGISTRO + 1, TAM_REGISTRO):
+            tipo, espacio, vehiculo, valor, instante, suma = \
+                struct.unpack_from(FORMATO_REGISTRO, datos, inicio)
+            if suma != _suma(datos, inicio):
+                # Registro cortado por un corte de energía: fin de la cola
+                return
+            aplicar(estado, tipo, vehiculo, espacio, valor, instante)
+
+    # Escritura
+
+    def anotar(self, tipo, vehiculo=0, espacio=-1, valor=0, instante=None):
+        """Agrega un evento al lote en RAM y lo aplica al estado"""
+        if instante is None:
+            instante = int(tiempo.segundos())
+        if self._largo + TAM_REGISTRO > len(self._buffer):
+            if self._transaccion is None:
+                self.vaciar()
+            else:
+                # Una transacción no se escribe a medias: el lote crece
+                self._buffer.extend(bytearray(TAM_REGISTRO))
+        if self._largo == 0:
+            self._primero_ms = tiempo.ticks_ms()
+        inicio = self._largo
+        struct.pack_into(FORMATO_REGISTRO, self._buffer, inicio,
+                         tipo, espacio, vehiculo, valor, instante, 0)
+        self._buffer[inicio + TAM_REGISTRO - 1] = _suma(self._buffer, inicio)
+        self._largo += TAM_REGISTRO
+        aplicar(self.estado, tipo, vehiculo, espacio, valor, instante)
+
+    def anotar_entrada(self, vehiculo, espacio, instante=None):
+        """Registra el ingreso de un vehículo (o corrige su instante si ya estaba)"""
+        self.anotar(ENTRADA, vehiculo, espacio, instante=instante)
+
+    def anotar_salida(self, vehiculo, espacio):
+        """Registra la salida de un vehículo"""
+        self.anotar(SALIDA, vehiculo, espacio)
+
+    def anotar_pago(self, vehiculo, costo):
+        """Registra un cobro"""
+        self.anotar(PAGO, vehiculo, valor=costo)
+
+    def anotar_espacio(self, espacio, libre):
+        """Registra que un espacio quedó libre u ocupado"""
+        self.anotar(ESPACIO, espacio=espacio, valor=1 if libre else 0)
+
+    def actualizar(self):
+        """Escribe el lote pendiente si lleva más de max_espera_ms en RAM"""
+        if (self._largo and self._transaccion is None and
+                tiempo.ticks_diff(tiempo.ticks_ms(), self._primero_ms) >= self.max_espera_ms):
+            self.vaciar()
+
+    def vaciar(self):
+        """Escribe en flash los registros pendientes
+
+        Si la flash falla el lote se descarta (el estado en RAM lo conserva)
+        y la siguiente escritura que funcione guarda un punto de control.
+        """
+        if not self._largo:
+            return
+        ruta = self._ruta_segmento(self.segmento)
+        try:
+            with open(ruta, 'ab') as f:
+                f.write(memoryview(self._buffer)[:self._largo])
+            self.escrituras += 1
+            if self._punto_pendiente or os.stat(ruta)[6] >= self.tam_segmento:
+                self._punto_control(self.segmento + 1)
+                self._punto_pendiente = False
+        except OSError as e:
+            self.errores += 1
+            self._punto_pendiente = True
+            bitacora.error("Error al escribir el diario: %s", e)
+        self._largo = 0
+        if len(self._buffer) > self.tam_lote * TAM_REGISTRO:
+            self._buffer = bytearray(self.tam_lote * TAM_REGISTRO)
+
+    def _punto_control(self, siguiente):
+        """Guarda el estado completo y empieza el segmento siguiente"""
+        estado = self.estado
+        punto = {
+            'segmento': siguiente,
+            'libres': list(estado['libres']),
+            'siguiente_id': estado['siguiente_id'],
+            'ultimo_costo': estado['ultimo_costo'],
+            'recaudado': estado['recaudado'],
+            'vehiculos': [[v, i, e] for v, (i, e) in estado['vehiculos'].items()]
+        }
+        temporal = self._ruta(PUNTO_CONTROL + '.tmp')
+        # En binario: abrir en modo texto retiene memoria en cada punto de control
+        with open(temporal, 'wb') as f:
+            f.write(json.dumps(punto).encode())
+        os.rename(temporal, self._ruta(PUNTO_CONTROL))
+        self.segmento = siguiente
+        for numero in self._segmentos():
+            if numero < siguiente:
+                os.remove(self._ruta_segmento(numero))
+
+    # Transacciones (lotes atómicos)
+
+    def iniciar_transaccion(self):
+        """Marca el inicio de cambios que pueden deshacerse con cancelar()"""
+        estado = self.estado
+        self._transaccion = (self._largo, {
+            'vehiculos': dict(estado['vehiculos']),
+            'libres': list(estado['libres']),
+            'siguiente_id': estado['siguiente_id'],
+            'ultimo_costo': estado['ultimo_costo'],
+            'recaudado': estado['recaudado']
+        })
+
+    def confirmar(self):
+        """Acepta los cambios de la transacción"""
+        self._transaccion = None
+
+    def cancelar(self):
+        """Descarta los registros anotados desde iniciar_transaccion()"""
+        self._largo, self.estado = self._transaccion
+        self._transaccion = None
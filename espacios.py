@@ -0,0 +1,100 @@
+"""Tabla de ocupación de N espacios con asignación y liberación O(1)"""
+from array import array
+
+
+class TablaEspacios:
+    """Estado de cada espacio en un bytearray más dos pilas de índices
+
+    libre[i] vale 1 si el espacio i está libre (LED encendido). Los espacios
+    libres y ocupados viven en dos pilas preasignadas; _pos[i] guarda la
+    posición del espacio i en su pila, así ocupar, liberar o fijar un espacio
+    concreto cuesta O(1) y los conteos quedan siempre al día.
+
+    al_cambiar(indice, libre) se llama cada vez que un espacio cambia.
+    """
+
+    def __init__(self, cantidad, al_cambiar=None):
+        self.cantidad = cantidad
+        self.al_cambiar = al_cambiar
+        self.libre = bytearray(cantidad)
+        self._libres = array('H', [0] * cantidad)
+        self._ocupados = array('H', [0] * cantidad)
+        self._pos = array('H', [0] * cantidad)
+        self._n_libres = 0
+        self._n_ocupados = 0
+        self.restaurar(b'\x01' * cantidad)
+
+    @property
+    def disponibles(self):
+        """Cantidad de espacios libres"""
+        return self._n_libres
+
+    @property
+    def ocupados(self):
+        """Cantidad de espacios ocupados"""
+        return self._n_ocupados
+
+    def es_libre(self, indice):
+        """True si el espacio existe y está libre"""
+        return 0 <= indice < self.cantidad and self.libre[indice] == 1
+
+    def ocupar(self):
+        """Ocupa un espacio libre y retorna su índice, o -1 si no hay"""
+        if not self._n_libres:
+            return -1
+        indice = self._libres[self._n_libres - 1]
+        self.fijar(indice, False)
+        return indice
+
+    def liberar_alguno(self):
+        """Libera el espacio ocupado más reciente y retorna su índice, o -1"""
+        if not self._n_ocupados:
+            return -1
+        indice = self._ocupados[self._n_ocupados - 1]
+        self.fijar(indice, True)
+        return indice
+
+    def fijar(self, indice, libre):
+        """Marca el espacio indice como libre u ocupado; retorna True si cambió"""
+        if not 0 <= indice < self.cantidad:
+            raise ValueError(f"Espacio inexistente: {indice + 1}")
+        libre = 1 if libre else 0
+        if self.libre[indice] == libre:
+            return False
+        if libre:
+            self._n_ocupados = self._quitar(self._ocupados, self._n_ocupados, indice)
+            self._n_libres = self._agregar(self._libres, self._n_libres, indice)
+        else:
+            self._n_libres = self._quitar(self._libres, self._n_libres, indice)
+            self._n_ocupados = self._agregar(self._ocupados, self._n_ocupados, indice)
+        self.libre[indice] = libre
+        if self.al_cambiar is not None:
+            self.al_cambiar(indice, libre)
+        return True
+
+    def restaurar(self, libres):
+        """Reconstruye la tabla desde una copia de libre (O(N))"""
+        self._n_libres = 0
+        self._n_ocupados = 0
+        for indice in range(self.cantidad):
+            libre = 1 if libres[indice] else 0
+            self.libre[indice] = libre
+            if libre:
+                self._n_libres = self._agregar(self._libres, self._n_libres, indice)
+            else:
+                self._n_ocupados = self._agregar(self._ocupados, self._n_ocupados, indice)
+            if self.al_cambiar is not None:
+                self.al_cambiar(indice, libre)
+
+    def _agregar(self, pila, cantidad, indice):
+        pila[cantidad] = indice
+        self._pos[indice] = cantidad
+        return cantidad + 1
+
+    def _quitar(self, pila, cantidad, indice):
+        # Mueve el último de la pila al hueco del que sale
+        hueco = self._pos[indice]
+        ultimo = pila[cantidad - 1]
+        pila[hueco] = ultimo
+        self._pos[ultimo] = hueco
+        return cantidad - 1
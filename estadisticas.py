@@ -0,0 +1,81 @@
+"""Estadísticas de la consola con totales acumulados
+
+Cada entrada y salida actualiza los totales en O(1), así las tarjetas no
+recorren el historial de sesiones por larga que sea la jornada:
+
+    estadisticas = Estadisticas()
+    vehiculo = estadisticas.entrada(datetime.now())
+    estadisticas.salida(datetime.now(), cobrar)  # la última sesión abierta
+    estadisticas.tarjetas(tipo_cambio)           # textos de las tarjetas
+
+Las sesiones abiertas se indexan por id en un dict, que conserva el orden
+de llegada: la salida sin id cierra la más reciente, igual que antes.
+"""
+
+
+class Estadisticas:
+    """Totales de sesiones (cantidad, estancia, ganancias) y sesiones abiertas"""
+
+    def __init__(self):
+        self.total = 0
+        self.cerradas = 0
+        self.estancia_s = 0.0
+        self.ganancias = 0
+        self.abiertas = {}
+
+    @property
+    def actuales(self):
+        """Vehículos dentro del parqueo"""
+        return len(self.abiertas)
+
+    @property
+    def promedio_min(self):
+        """Estancia promedio de las sesiones cerradas, en minutos"""
+        if not self.cerradas:
+            return 0
+        return self.estancia_s / self.cerradas / 60
+
+    def entrada(self, momento):
+        """Abre una sesión y retorna su registro {id, entrada, salida, costo, pico_id}"""
+        vehiculo = {
+            "id": self.total,
+            "entrada": momento,
+            "salida": None,
+            "costo": 0,
+            "pico_id": None
+        }
+        self.abiertas[vehiculo["id"]] = vehiculo
+        self.total += 1
+        return vehiculo
+
+    def salida(self, momento, cobrar, vehiculo_id=None):
+        """Cierra la sesión vehiculo_id (o la última abierta); None si no hay
+
+        El costo es cobrar(estancia_s, entrada).
+        """
+        if not self.abiertas:
+            return None
+        if vehiculo_id is None:
+            _, vehiculo = self.abiertas.popitem()
+        else:
+            vehiculo = self.abiertas.pop(vehiculo_id, None)
+            if vehiculo is None:
+                return None
+        estancia_s = (momento - vehiculo["entrada"]).total_seconds()
+        costo = cobrar(estancia_s, vehiculo["entrada"])
+        vehiculo["salida"] = momento
+        vehiculo["costo"] = costo
+        self.cerradas += 1
+        self.estancia_s += estancia_s
+        self.ganancias += costo
+        return vehiculo
+
+    def tarjetas(self, tipo_cambio):
+        """Texto de cada tarjeta de estadística por nombre"""
+        return {
+            "total_vehiculos": str(self.total),
+            "promedio_estancia": f"{self.promedio_min:.1f} min",
+            "ganancias_colones": f"₡{self.ganancias:,}",
+            "ganancias_dolares": f"${self.ganancias / tipo_cambio:.2f}",
+            "vehiculos_actuales": str(self.actuales)
+        }
@@ -0,0 +1,83 @@
+"""Muestreo periódico y filtrado de las fotoceldas (LDR)"""
+from array import array
+
+# Umbral: valores BAJOS = luz (espacio libre), valores ALTOS = oscuro (ocupado)
+UMBRAL = 30000
+HISTERESIS = 2000
+MUESTRAS = 16
+PERIODO_MS = 10
+CONFIRMACIONES = 5
+
+
+class MuestreadorLDR:
+    """Sobremuestrea los ADC desde un machine.Timer y guarda lecturas filtradas
+
+    Cada fotocelda tiene un buffer circular de MUESTRAS lecturas con su suma
+    acumulada, así el promedio móvil cuesta O(1) por muestra. La ocupación
+    cambia solo cuando el promedio cruza el umbral más/menos la histéresis
+    durante CONFIRMACIONES muestras seguidas. Los manejadores leen los valores
+    guardados y nunca tocan el ADC.
+    """
+
+    def __init__(self, adcs, umbral=UMBRAL, histeresis=HISTERESIS,
+                 muestras=MUESTRAS, confirmaciones=CONFIRMACIONES):
+        cantidad = len(adcs)
+        self.umbral = umbral
+        self.histeresis = histeresis
+        self.confirmaciones = confirmaciones
+        self.cambios = 0
+        self._adcs = adcs
+        self._cantidad = cantidad
+        self._tam = muestras
+        self._muestras = array('H', [0] * (cantidad * muestras))
+        self._sumas = array('l', [0] * cantidad)
+        self._pos = 0
+        self._llenas = 0
+        self.ocupado = bytearray(cantidad)
+        self._conteo = bytearray(cantidad)
+
+    def iniciar(self, timer, periodo_ms=PERIODO_MS):
+        """Comienza el muestreo periódico con el timer dado"""
+        timer.init(period=periodo_ms, mode=timer.PERIODIC, callback=self._muestrear)
+
+    def promedio(self, indice):
+        """Promedio móvil de la fotocelda indice"""
+        if not self._llenas:
+            return 0
+        return self._sumas[indice] // self._llenas
+
+    def libre(self, indice):
+        """True si la fotocelda indice detecta el espacio libre"""
+        return not self.ocupado[indice]
+
+    def _muestrear(self, _timer):
+        # Corre desde el timer: sin reservar memoria
+        pos = self._pos
+        for i in range(self._cantidad):
+            valor = self._adcs[i].read_u16()
+            k = i * self._tam + pos
+            self._sumas[i] += valor - self._muestras[k]
+            self._muestras[k] = valor
+        self._pos = (pos + 1) % self._tam
+        if self._llenas < self._tam:
+            self._llenas += 1
+            return
+        for i in range(self._cantidad):
+            self._evaluar(i)
+
+    def _evaluar(self, indice):
+        media = self._sumas[indice] // self._tam
+        actual = self.ocupado[indice]
+        if actual:
+            candidato = 0 if media < self.umbral - self.histeresis else 1
+        else:
+            candidato = 1 if media > self.umbral + self.histeresis else 0
+
+        if candidato == actual:
+            self._conteo[indice] = 0
+            return
+        self._conteo[indice] += 1
+        if self._conteo[indice] >= self.confirmaciones:
+            self.ocupado[indice] = candidato
+            self._conteo[indice] = 0
+            self.cambios += 1
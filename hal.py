@@ -0,0 +1,31 @@
+"""Capa de hardware: machine y network en el Pico, simulador en CPython
+
+El firmware importa desde aquí Pin, PWM, ADC, Timer, WLAN y STA_IF. En
+CPython se usan las clases de hal_simulado.py y el reloj virtual reemplaza
+al del sistema (tiempo.usar_reloj), así main.py corre completo en una PC
+mucho más rápido que en tiempo real.
+"""
+import sys
+import tiempo
+
+SIMULADO = sys.implementation.name != 'micropython'
+
+if SIMULADO:
+    import atexit
+    import os
+    import shutil
+    import tempfile
+    from hal_simulado import Pin, PWM, ADC, Timer, WLAN, STA_IF, reloj
+    tiempo.usar_reloj(reloj)
+    # Archivos del firmware (diario): CESTACIONA_DATOS los conserva entre
+    # corridas; si no está, van a un directorio temporal que se borra al salir
+    RAIZ_DATOS = os.environ.get('CESTACIONA_DATOS')
+    if RAIZ_DATOS:
+        os.makedirs(RAIZ_DATOS, exist_ok=True)
+    else:
+        RAIZ_DATOS = tempfile.mkdtemp(prefix='cestaciona_')
+        atexit.register(shutil.rmtree, RAIZ_DATOS, True)
+else:
+    from machine import Pin, PWM, ADC, Timer
+    from network import WLAN, STA_IF
+    RAIZ_DATOS = ''
@@ -0,0 +1,240 @@
+"""Backend simulado de la capa de hardware (hal.py) para CPython
+
+Pines, ADC, PWM, timers y WLAN viven en memoria y corren sobre un reloj
+virtual. El tiempo solo avanza con reloj.avanzar_ms() o tiempo.dormir_ms(),
+que además disparan en orden los timers vencidos, así una simulación corre
+mucho más rápido que el tiempo real y da siempre el mismo resultado.
+
+Los objetos creados quedan en pines, adcs y pwms por número de pin para que
+una prueba los manipule:
+
+    hal_simulado.presionar(17)            # botón de entrada
+    hal_simulado.adcs[26].valor = 45000   # fotocelda 1 a oscuras
+"""
+_MASCARA = (1 << 30) - 1
+
+# Instante de pared (time.time()) al iniciar la simulación
+INICIO_S = 1700000000
+
+# wlan.status() del Pico W
+STAT_CONECTANDO = 1
+STAT_GOT_IP = 3
+STAT_NO_AP_FOUND = -2
+DEMORA_CONEXION_MS = 1500
+IP_SIMULADA = '192.168.4.2'
+
+# Si es False la red nunca conecta (la simulación corre sin servidor)
+red_disponible = False
+
+pines = {}
+adcs = {}
+pwms = {}
+
+
+class RelojVirtual:
+    """Reloj en microsegundos que avanza solo cuando se le pide"""
+
+    def __init__(self, inicio_s=INICIO_S):
+        self.us = 0
+        self.inicio_s = inicio_s
+        self._timers = []
+
+    def ticks_ms(self):
+        """Milisegundos virtuales (dan la vuelta en 2**30 como en el Pico)"""
+        return (self.us // 1000) & _MASCARA
+
+    def ticks_us(self):
+        """Microsegundos virtuales"""
+        return self.us & _MASCARA
+
+    def segundos(self):
+        """Reloj de pared virtual en segundos"""
+        return self.inicio_s + self.us // 1000000
+
+    def dormir_ms(self, ms):
+        """Avanza el reloj en lugar de dormir"""
+        self.avanzar_us(int(ms * 1000))
+
+    def avanzar_ms(self, ms):
+        """Avanza ms milisegundos disparando los timers vencidos"""
+        self.avanzar_us(int(ms * 1000))
+
+    def avanzar_us(self, us):
+        """Avanza us microsegundos disparando los timers vencidos"""
+        fin = self.us + us
+        while True:
+            proximo = -1
+            for timer in self._timers:
+                if timer.activo and (proximo < 0 or timer.proximo_us < proximo):
+                    proximo = timer.proximo_us
+            if proximo < 0 or proximo > fin:
+                break
+            self.us = proximo
+            for timer in self._timers:
+                if timer.activo and timer.proximo_us == proximo:
+                    timer.disparar()
+        self.us = fin
+
+
+reloj = RelojVirtual()
+
+
+class Pin:
+    """Pin digital en memoria; un cambio de nivel dispara su irq"""
+    IN = 0
+    OUT = 1
+    PULL_UP = 1
+    PULL_DOWN = 2
+    IRQ_FALLING = 4
+    IRQ_RISING = 8
+
+    def __init__(self, numero, modo=IN, pull=None):
+        self.numero = numero
+        self.modo = modo
+        self.nivel = 1 if pull == Pin.PULL_UP else 0
+        self.escrituras = 0
+        self._manejador = None
+        self._disparo = 0
+        pines[numero] = self
+
+    def value(self, valor=None):
+        """Lee el nivel o lo cambia (como salida o simulando una entrada)"""
+        if valor is None:
+            return self.nivel
+        valor = 1 if valor else 0
+        self.escrituras += 1
+        if valor == self.nivel:
+            return
+        self.nivel = valor
+        if self._manejador is not None:
+            if self._disparo & (Pin.IRQ_RISING if valor else Pin.IRQ_FALLING):
+                self._manejador(self)
+
+    def irq(self, handler=None, trigger=IRQ_FALLING | IRQ_RISING):
+        """Registra el manejador de flancos"""
+        self._manejador = handler
+        self._disparo = trigger
+
+
+class ADC:
+    """Entrada analógica con valor fijado por la simulación"""
+
+    def __init__(self, numero, valor=20000):
+        self.numero = numero
+        self.valor = valor
+        adcs[numero] = self
+
+    def read_u16(self):
+        """Valor actual (0-65535)"""
+        return self.valor
+
+
+class PWM:
+    """Salida PWM que recuerda frecuencia y duty"""
+
+    def __init__(self, pin):
+        self.pin = pin
+        self.frecuencia = 0
+        self.duty = 0
+        pwms[pin.numero] = self
+
+    def freq(self, frecuencia=None):
+        """Lee o fija la frecuencia"""
+        if frecuencia is None:
+            return self.frecuencia
+        self.frecuencia = frecuencia
+
+    def duty_u16(self, duty=None):
+        """Lee o fija el duty (0-65535)"""
+        if duty is None:
+            return self.duty
+        self.duty = duty
+
+
+class Timer:
+    """Timer que dispara su callback según el reloj virtual"""
+    ONE_SHOT = 0
+    PERIODIC = 1
+
+    def __init__(self, numero=-1):
+        self.activo = False
+        self.proximo_us = 0
+        self._periodo_us = 0
+        self._modo = Timer.PERIODIC
+        self._callback = None
+        reloj._timers.append(self)
+
+    def init(self, mode=PERIODIC, period=-1, freq=-1, callback=None):
+        """Programa el timer con period (ms) o freq (Hz)"""
+        self._periodo_us = period * 1000 if period > 0 else 1000000 // freq
+        self._modo = mode
+        self._callback = callback
+        self.proximo_us = reloj.us + self._periodo_us
+        self.activo = True
+
+    def deinit(self):
+        """Detiene el timer"""
+        self.activo = False
+
+    def disparar(self):
+        """Ejecuta el callback y programa el siguiente disparo"""
+        if self._modo == Timer.PERIODIC:
+            self.proximo_us += self._periodo_us
+        else:
+            self.activo = False
+        self._callback(self)
+
+
+STA_IF = 0
+
+
+class WLAN:
+    """Interfaz WiFi que conecta tras DEMORA_CONEXION_MS si red_disponible"""
+
+    def __init__(self, interfaz=STA_IF):
+        self._activa = False
+        self._desde = -1
+
+    def active(self, activa=None):
+        """Lee o cambia si la interfaz está activa"""
+        if activa is None:
+            return self._activa
+        self._activa = activa
+
+    def connect(self, ssid, password):
+        """Empieza a conectar"""
+        self._desde = reloj.us
+
+    def disconnect(self):
+        """Corta la conexión"""
+        self._desde = -1
+
+    def status(self):
+        """Estado de la conexión como en el Pico W"""
+        if self._desde < 0:
+            return 0
+        if reloj.us - self._desde < DEMORA_CONEXION_MS * 1000:
+            return STAT_CONECTANDO
+        return STAT_GOT_IP if red_disponible else STAT_NO_AP_FOUND
+
+    def isconnected(self):
+        """True si hay conexión con IP"""
+        return self.status() == STAT_GOT_IP
+
+    def ifconfig(self):
+        """IP, máscara, puerta de enlace y DNS"""
+        return (IP_SIMULADA, '255.255.255.0', '192.168.4.1', '192.168.4.1')
+
+
+def detener_timers():
+    """Detiene todos los timers (p. ej. el muestreo de fotoceldas en simulaciones largas)"""
+    for timer in reloj._timers:
+        timer.deinit()
+
+
+def presionar(numero, duracion_ms=100):
+    """Simula presionar y soltar el botón del pin numero (activo en bajo)"""
+    pin = pines[numero]
+    pin.value(0)
+    reloj.avanzar_ms(duracion_ms)
+    pin.value(1)
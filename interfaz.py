@@ -1,11 +1,22 @@
 import tkinter as tk
-from tkinter import ttk, messagebox
+from tkinter import messagebox
 import socket
-import json
 import threading
 import time
 import requests
-from datetime import datetime, timedelta
+from datetime import datetime
+from protocolo import LectorTramas, codificar_trama, decodificar_trama
+from cliente import ClienteComandos, ErrorComando, Sondeo
+from vista import ColaEstados, Vista
+from estadisticas import Estadisticas
+import tarifa
+
+# Suscripción a cambios de estado (segundos)
+ESPERA_MAX_LATIDO = 30
+REINTENTO_SUSCRIPCION = 5
+
+# Período con que el hilo de Tk muestra los estados recibidos (ms)
+INTERVALO_RENDER_MS = 100
 
 class CEstacionaApp:
     def __init__(self, root):
@@ -18,8 +29,20 @@ class CEstacionaApp:
         self.pico_ip = "172.20.10.9"
         self.pico_port = 8080
         
+        # Comandos por una conexión persistente en segundo plano (ver cliente.py);
+        # los resultados vuelven al hilo de Tk con root.after
+        self.cliente = ClienteComandos(
+            self.pico_ip, self.pico_port,
+            entregar=lambda funcion, *args: self.root.after(0, funcion, *args)
+        )
+        
+        # Estado empujado por el Pico (acción "suscribir")
+        self._suscrito = False
+        self._suscripcion_disponible = True
+        self._estado_suscrito = {}
+        
         # Datos del sistema
-        self.vehiculos = []  # Lista de vehículos: {id, entrada, salida, costo}
+        self.estadisticas = Estadisticas()
         self.tipo_cambio = 530.0
         self.espacios_totales = 3
         self.espacios_disponibles = 3
@@ -35,9 +58,22 @@ class CEstacionaApp:
         self.COLOR_DISPONIBLE = "#06d6a0"
         self.COLOR_OCUPADO = "#ef476f"
         
+        # Los hilos publican estados; el hilo de Tk los muestra (ver vista.py)
+        self.estados = ColaEstados()
+        self.vista = Vista()
+        
         self.crear_interfaz()
+        self.registrar_widgets()
         self.obtener_tipo_cambio()
-        self.actualizar_estado()
+        self.iniciar_suscripcion()
+        
+        # Un solo hilo consulta el estado mientras no hay suscripción (ver cliente.Sondeo)
+        self.sondeo = Sondeo(
+            self.obtener_estado,
+            self.estados.publicar,
+            pausado=lambda: self._suscrito
+        )
+        self.renderizar()
         
     def crear_interfaz(self):
         """Crea la interfaz gráfica completa"""
@@ -300,6 +336,30 @@ class CEstacionaApp:
             )
             btn_off.pack(side="left", padx=5)
         
+        # Control de todos los espacios en un solo lote
+        todos_control = tk.Frame(leds_frame, bg=self.COLOR_PANEL)
+        todos_control.pack(pady=8, padx=15, fill="x")
+        
+        tk.Button(
+            todos_control,
+            text="Liberar todos",
+            font=("Helvetica", 10, "bold"),
+            bg=self.COLOR_EXITO,
+            fg="white",
+            cursor="hand2",
+            command=lambda: self.controlar_todos_leds(True)
+        ).pack(side="left", padx=5, expand=True, fill="x")
+        
+        tk.Button(
+            todos_control,
+            text="Ocupar todos",
+            font=("Helvetica", 10, "bold"),
+            bg=self.COLOR_ERROR,
+            fg="white",
+            cursor="hand2",
+            command=lambda: self.controlar_todos_leds(False)
+        ).pack(side="left", padx=5, expand=True, fill="x")
+        
         # Registro manual
         registro_frame = tk.LabelFrame(
             panel,
@@ -465,136 +525,206 @@ class CEstacionaApp:
         )
         self.label_timestamp.pack(side="right", padx=20)
         
-    def enviar_comando(self, comando):
-        """Envía comando al Raspberry Pi Pico"""
-        try:
-            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            sock.settimeout(3)
-            sock.connect((self.pico_ip, self.pico_port))
-            sock.send(json.dumps(comando).encode())
-            respuesta = sock.recv(1024)
-            sock.close()
-            return respuesta.decode()
-        except Exception as e:
-            print(f"Error de comunicación: {e}")
+        self.label_sondeo = tk.Label(
+            footer,
+            text="📶 Sondeo: esperando",
+            font=("Helvetica", 11),
+            bg=self.COLOR_ACENTO,
+            fg="#95a5a6"
+        )
+        self.label_sondeo.pack(side="right", padx=20)
+        
+    def enviar_comando(self, comando, al_terminar=None):
+        """Encola un comando para el Pico sin bloquear y retorna su Futuro
+        
+        al_terminar(resultado) se llama en el hilo de Tk si el comando tuvo
+        éxito; los errores se muestran en el footer.
+        """
+        futuro = self.cliente.enviar(comando)
+        futuro.al_terminar(lambda f: self._comando_terminado(f, al_terminar))
+        return futuro
+        
+    def _comando_terminado(self, futuro, al_terminar):
+        """Resultado de un comando, ya en el hilo de Tk"""
+        if isinstance(futuro.error, ErrorComando):
+            print(f"Error del Pico: {futuro.error}")
+            return
+        if futuro.error is not None:
+            print(f"Error de comunicación: {futuro.error}")
             self.label_conexion.config(
                 text=f"❌ Error: No se puede conectar a {self.pico_ip}",
                 fg=self.COLOR_ERROR
             )
-            return None
+            return
+        self.label_conexion.config(
+            text=f"🔗 Conectado a: {self.pico_ip}:{self.pico_port}",
+            fg=self.COLOR_EXITO
+        )
+        # Refrescar el estado enseguida; varias órdenes seguidas se combinan
+        self.sondeo.pedir()
+        if al_terminar is not None:
+            al_terminar(futuro.resultado)
             
     def controlar_aguja(self, abrir):
         """Controla la aguja"""
-        comando = {"accion": "aguja", "estado": abrir}
-        if self.enviar_comando(comando):
-            self.aguja_abierta = abrir
-            messagebox.showinfo(
-                "Aguja",
-                f"Aguja {'abierta' if abrir else 'cerrada'} correctamente"
-            )
+        def hecho(resultado):
+            if resultado:
+                self.aguja_abierta = abrir
+                messagebox.showinfo(
+                    "Aguja",
+                    f"Aguja {'abierta' if abrir else 'cerrada'} correctamente"
+                )
+        
+        self.enviar_comando({"accion": "aguja", "estado": abrir}, hecho)
             
     def controlar_led(self, led, encender):
         """Controla un LED"""
+        def hecho(resultado):
+            if resultado:
+                messagebox.showinfo(
+                    "LED",
+                    f"Espacio {led} {'liberado' if encender else 'ocupado'}"
+                )
+        
         comando = {"accion": "led", "espacio": led, "estado": 1 if encender else 0}
-        if self.enviar_comando(comando):
-            messagebox.showinfo(
-                "LED",
-                f"Espacio {led} {'liberado' if encender else 'ocupado'}"
-            )
+        self.enviar_comando(comando, hecho)
+            
+    def enviar_lote(self, comandos, atomico=False, al_terminar=None):
+        """Envía varios comandos en un solo viaje; al_terminar recibe la lista de resultados"""
+        comando = {"accion": "batch", "comandos": comandos, "atomico": atomico}
+        return self.enviar_comando(comando, al_terminar)
+        
+    def controlar_todos_leds(self, encender):
+        """Libera u ocupa todos los espacios con un solo lote atómico"""
+        def hecho(resultado):
+            if resultado:
+                messagebox.showinfo(
+                    "LED",
+                    f"Todos los espacios {'liberados' if encender else 'ocupados'}"
+                )
+        
+        comandos = [
+            {"accion": "led", "espacio": i, "estado": 1 if encender else 0}
+            for i in range(1, self.espacios_totales + 1)
+        ]
+        self.enviar_lote(comandos, atomico=True, al_terminar=hecho)
             
     def registrar_entrada(self):
         """Registra entrada manual"""
-        vehiculo_id = len(self.vehiculos)
-        entrada = {
-            "id": vehiculo_id,
-            "entrada": datetime.now(),
-            "salida": None,
-            "costo": 0
-        }
-        self.vehiculos.append(entrada)
+        entrada = self.estadisticas.entrada(datetime.now())
+        vehiculo_id = entrada["id"]
         
-        comando = {"accion": "registro", "vehiculo": vehiculo_id, "tipo": "entrada"}
-        self.enviar_comando(comando)
+        # El Pico asigna su propio id; se guarda al llegar para registrar la
+        # salida. Si el vehículo ya salió en la consola, la salida se envía ahora
+        def hecho(resultado):
+            if isinstance(resultado, dict):
+                entrada["pico_id"] = resultado.get("vehiculo")
+                if entrada["salida"] is not None:
+                    self.enviar_salida(entrada)
+        
+        self.enviar_comando({"accion": "registro", "tipo": "entrada"}, hecho)
         
         messagebox.showinfo("Entrada", f"Vehículo #{vehiculo_id} registrado")
         self.calcular_estadisticas()
         
     def registrar_salida(self):
         """Registra salida manual"""
-        for vehiculo in reversed(self.vehiculos):
-            if vehiculo["salida"] is None:
-                vehiculo["salida"] = datetime.now()
-                tiempo = (vehiculo["salida"] - vehiculo["entrada"]).total_seconds()
-                periodos = int(tiempo / 10)
-                vehiculo["costo"] = periodos * 1000
-                
-                comando = {"accion": "registro", "vehiculo": vehiculo["id"], "tipo": "salida"}
-                self.enviar_comando(comando)
-                
-                messagebox.showinfo(
-                    "Salida",
-                    f"Vehículo #{vehiculo['id']} salió\nCosto: ₡{vehiculo['costo']:,}"
-                )
-                self.calcular_estadisticas()
-                return
+        vehiculo = self.estadisticas.salida(
+            datetime.now(),
+            lambda tiempo, entrada: tarifa.calcular(tiempo, entrada.timestamp())
+        )
+        if vehiculo is None:
+            messagebox.showwarning("Salida", "No hay vehículos para procesar")
+            return
         
-        messagebox.showwarning("Salida", "No hay vehículos para procesar")
+        # Sin id del Pico todavía, la envía registrar_entrada al recibirlo
+        if vehiculo["pico_id"] is not None:
+            self.enviar_salida(vehiculo)
         
-    def obtener_estado(self):
-        """Obtiene el estado actual del Pico"""
-        comando = {"accion": "estado"}
-        respuesta = self.enviar_comando(comando)
+        messagebox.showinfo(
+            "Salida",
+            f"Vehículo #{vehiculo['id']} salió\nCosto: ₡{vehiculo['costo']:,}"
+        )
+        self.calcular_estadisticas()
         
-        if respuesta:
-            try:
-                return json.loads(respuesta)
-            except:
-                pass
-        return None
+    def enviar_salida(self, vehiculo):
+        """Registra en el Pico la salida de un vehículo con el id que asignó"""
+        comando = {"accion": "registro", "vehiculo": vehiculo["pico_id"], "tipo": "salida"}
+        self.enviar_comando(comando)
+        
+    def obtener_estado(self):
+        """Obtiene el estado actual del Pico (formato binario compacto)
+        
+        Espera la respuesta y lanza la excepción si falla: solo se llama desde
+        el hilo del sondeo, nunca desde Tk. Va directo al cliente y no por
+        enviar_comando, que pediría otra consulta al sondeo tras cada éxito.
+        """
+        respuesta = self.cliente.enviar({"accion": "estado", "formato": "bin"}).esperar()
+        if not isinstance(respuesta, dict):
+            raise ValueError(f"Estado inesperado: {respuesta!r}")
+        return respuesta
+        
+    def registrar_widgets(self):
+        """Widgets que cambian con el estado, por nombre (ver vista.py)"""
+        self.vista.registrar('espacios', self.label_espacios)
+        self.vista.registrar('aguja', self.label_aguja)
+        for i, espacio in enumerate(self.espacios_visual):
+            self.vista.registrar(f'espacio{i}_frame', espacio['frame'])
+            self.vista.registrar(f'espacio{i}_icono', espacio['icono'])
+            self.vista.registrar(f'espacio{i}_estado', espacio['estado'])
+        for nombre in ('total_vehiculos', 'promedio_estancia', 'ganancias_colones',
+                       'ganancias_dolares', 'vehiculos_actuales'):
+            self.vista.registrar(nombre, getattr(self, f"label_{nombre}"))
+        self.vista.registrar('timestamp', self.label_timestamp)
+        self.vista.registrar('sondeo', self.label_sondeo)
+        
+    def renderizar(self):
+        """Muestra los estados publicados desde la última vuelta (temporizador de Tk)"""
+        estado = self.estados.tomar()
+        if estado:
+            cambios = self.actualizar_visualizacion(estado)
+            self.vista.aplicar({'timestamp': {
+                'text': f"🕐 Última actualización: {datetime.now().strftime('%H:%M:%S')}"
+                        f" · {cambios} widgets"
+            }}, contar=False)
+        self.vista.aplicar({'sondeo': self.propiedades_sondeo()}, contar=False)
+        self.root.after(INTERVALO_RENDER_MS, self.renderizar)
         
     def actualizar_visualizacion(self, estado):
-        """Actualiza la visualización con el estado recibido"""
-        if not estado:
-            return
-            
-        # Actualizar espacios disponibles
+        """Muestra el estado reconfigurando solo los widgets que cambiaron
+        
+        Retorna cuántos widgets se reconfiguraron.
+        """
+        # Espacios disponibles
         espacios = estado.get('espacios', 3)
         self.espacios_disponibles = espacios
-        self.label_espacios.config(text=str(espacios))
-        
         if espacios == 0:
-            self.label_espacios.config(fg=self.COLOR_ERROR)
+            color = self.COLOR_ERROR
         elif espacios <= 1:
-            self.label_espacios.config(fg="#f39c12")
+            color = "#f39c12"
         else:
-            self.label_espacios.config(fg=self.COLOR_DISPONIBLE)
+            color = self.COLOR_DISPONIBLE
         
-        # Actualizar aguja
+        # Aguja
         aguja = estado.get('aguja', False)
         self.aguja_abierta = aguja
-        self.label_aguja.config(
-            text="ABIERTA" if aguja else "CERRADA",
-            fg=self.COLOR_EXITO if aguja else self.COLOR_ERROR
-        )
-        
-        # Actualizar visualización de espacios (ahora todos manuales)
-        led1 = estado.get('led1', True)
-        led2 = estado.get('led2', True)
-        led3 = estado.get('led3', True)
         
-        # Espacio 1
-        self.actualizar_espacio_visual(0, led1)
-        
-        # Espacio 2
-        self.actualizar_espacio_visual(1, led2)
+        deseado = {
+            'espacios': {'text': str(espacios), 'fg': color},
+            'aguja': {
+                'text': "ABIERTA" if aguja else "CERRADA",
+                'fg': self.COLOR_EXITO if aguja else self.COLOR_ERROR
+            }
+        }
         
-        # Espacio 3
-        self.actualizar_espacio_visual(2, led3)
+        # Espacios (ahora todos manuales)
+        for i in range(len(self.espacios_visual)):
+            deseado.update(self.propiedades_espacio(i, estado.get(f'led{i + 1}', True)))
         
-    def actualizar_espacio_visual(self, indice, libre):
-        """Actualiza un espacio visual"""
-        espacio = self.espacios_visual[indice]
+        return self.vista.aplicar(deseado)
         
+    def propiedades_espacio(self, indice, libre):
+        """Propiedades de los widgets de un espacio según esté libre u ocupado"""
         if libre:
             color = self.COLOR_DISPONIBLE
             icono = "✓"
@@ -604,35 +734,19 @@ class CEstacionaApp:
             icono = "✗"
             texto = "OCUPADO"
         
-        espacio['frame'].config(bg=color)
-        espacio['icono'].config(bg=color, fg="white", text=icono)
-        espacio['estado'].config(bg=color, fg="white", text=texto)
+        return {
+            f'espacio{indice}_frame': {'bg': color},
+            f'espacio{indice}_icono': {'bg': color, 'fg': "white", 'text': icono},
+            f'espacio{indice}_estado': {'bg': color, 'fg': "white", 'text': texto}
+        }
         
     def calcular_estadisticas(self):
-        """Calcula y actualiza estadísticas"""
-        total = len(self.vehiculos)
-        
-        # Promedio de estancia
-        tiempos = []
-        for v in self.vehiculos:
-            if v["salida"]:
-                tiempo = (v["salida"] - v["entrada"]).total_seconds() / 60
-                tiempos.append(tiempo)
-        
-        promedio = sum(tiempos) / len(tiempos) if tiempos else 0
-        
-        # Ganancias
-        ganancias = sum(v["costo"] for v in self.vehiculos)
-        
-        # Vehículos actuales
-        actuales = sum(1 for v in self.vehiculos if v["salida"] is None)
-        
-        # Actualizar labels
-        self.label_total_vehiculos.config(text=str(total))
-        self.label_promedio_estancia.config(text=f"{promedio:.1f} min")
-        self.label_ganancias_colones.config(text=f"₡{ganancias:,}")
-        self.label_ganancias_dolares.config(text=f"${ganancias/self.tipo_cambio:.2f}")
-        self.label_vehiculos_actuales.config(text=str(actuales))
+        """Muestra en las tarjetas los totales acumulados (ver estadisticas.py)"""
+        tarjetas = self.estadisticas.tarjetas(self.tipo_cambio)
+        self.vista.aplicar(
+            {nombre: {'text': texto} for nombre, texto in tarjetas.items()},
+            contar=False
+        )
         
     def obtener_tipo_cambio(self):
         """Obtiene tipo de cambio de API"""
@@ -649,21 +763,69 @@ class CEstacionaApp:
         except:
             self.tipo_cambio = 530.0
             
-    def actualizar_estado(self):
-        """Actualiza el estado periódicamente"""
-        def tarea():
-            estado = self.obtener_estado()
-            self.actualizar_visualizacion(estado)
-            self.label_timestamp.config(
-                text=f"🕐 Última actualización: {datetime.now().strftime('%H:%M:%S')}"
-            )
+    def iniciar_suscripcion(self):
+        """Inicia el hilo que recibe los cambios de estado empujados por el Pico"""
+        threading.Thread(target=self._hilo_suscripcion, daemon=True).start()
+        
+    def _hilo_suscripcion(self):
+        """Mantiene la suscripción abierta y la reabre si se cae"""
+        while self._suscripcion_disponible:
+            try:
+                self._recibir_cambios()
+            except Exception as e:
+                print(f"Suscripción interrumpida: {e}")
+            self._suscrito = False
+            if self._suscripcion_disponible:
+                time.sleep(REINTENTO_SUSCRIPCION)
+        
+    def _recibir_cambios(self):
+        """Se suscribe y aplica cada cambio recibido hasta que la conexión se cierre"""
+        sock = socket.create_connection((self.pico_ip, self.pico_port), timeout=3)
+        try:
+            # El Pico envía un latido periódico; sin datos se asume conexión caída
+            sock.settimeout(ESPERA_MAX_LATIDO)
+            sock.sendall(codificar_trama({"id": 0, "accion": "suscribir"}))
+            lector = LectorTramas()
+            while True:
+                linea = lector.siguiente()
+                if linea is None:
+                    datos = sock.recv(1024)
+                    if not datos:
+                        raise ConnectionError("Conexión cerrada por el Pico")
+                    lector.agregar(datos)
+                    continue
+                
+                mensaje = decodificar_trama(linea)
+                if 'error' in mensaje:
+                    # Firmware sin suscripción: se mantiene el sondeo periódico
+                    print(f"Suscripción no disponible: {mensaje['error']}")
+                    self._suscripcion_disponible = False
+                    return
+                if 'resultado' in mensaje:
+                    self._estado_suscrito = dict(mensaje['resultado'])
+                    self._suscrito = True
+                elif mensaje.get('evento') == 'delta':
+                    self._estado_suscrito.update(mensaje['datos'])
+                self.estados.publicar(self._estado_suscrito)
+        finally:
+            sock.close()
         
-        threading.Thread(target=tarea, daemon=True).start()
-        self.root.after(2000, self.actualizar_estado)
+    def propiedades_sondeo(self):
+        """Texto del footer con la latencia y la tasa de éxito del sondeo"""
+        sondeo = self.sondeo
+        if self._suscrito:
+            return {'text': "📡 Suscrito: sin sondeo", 'fg': "#95a5a6"}
+        if sondeo.exito is None:
+            return {'text': "📶 Sondeo: esperando", 'fg': "#95a5a6"}
+        rtt = f"{sondeo.rtt_ms:.0f} ms" if sondeo.rtt_ms is not None else "—"
+        return {
+            'text': f"📶 RTT {rtt} · éxito {sondeo.exito:.0%} · cada {sondeo.intervalo_s:g} s",
+            'fg': self.COLOR_EXITO if sondeo.fallos_seguidos == 0 else self.COLOR_ERROR
+        }
 
 def main():
     root = tk.Tk()
-    app = CEstacionaApp(root)
+    CEstacionaApp(root)
     root.mainloop()
 
 if __name__ == "__main__":
@@ -1,69 +1,133 @@
-import machine
-import network
-import socket
-import time
-import json
-from machine import Pin, PWM
+import tiempo
+import hal
+from hal import Pin, PWM, ADC, Timer
+from aguja import ControladorAguja
+from conexiones import ServidorComandos, PUERTO
+from botones import CapturaBotones
+from protocolo import (TAM_ESTADO, TAM_CABECERA, empaquetar_estado,
+                       escribir_cabecera_binaria, nueva_trama_ok, escribir_trama_ok,
+                       CLAVE_ID, CLAVE_ACCION, CLAVE_FORMATO, CLAVE_ESPACIO, CLAVE_ESTADO,
+                       PALABRA_ESTADO, PALABRA_LED, PALABRA_AGUJA, PALABRA_BIN,
+                       NOMBRES_PALABRAS)
+from fotoceldas import MuestreadorLDR
+import salidas
+import bitacora
+import metricas
+from salidas import SalidaDigital, SalidaPWM, SalidaVirtual
+from espacios import TablaEspacios
+from vehiculos import RegistroVehiculos
+from diario import Diario
+import tarifa
+from red import ConexionWifi, CONECTADA
+from nucleos import PuenteNucleos
 
 # Configuración de pines
-# LEDs
-led1 = Pin(20, Pin.OUT)
-led2 = Pin(19, Pin.OUT)
-led3 = Pin(21, Pin.OUT)
+# Las salidas recuerdan el último valor y omiten escrituras repetidas (salidas.py)
+# LEDs: uno por espacio. Los espacios sin pin propio usan una salida en memoria
+NUM_ESPACIOS = 3
+PINES_LED = (20, 19, 21)
+leds = tuple(
+    SalidaDigital(Pin(PINES_LED[i], Pin.OUT)) if i < len(PINES_LED) else SalidaVirtual()
+    for i in range(NUM_ESPACIOS)
+)
 
 # Fotoceldas (LDR)
-ldr1 = machine.ADC(26)
-ldr2 = machine.ADC(27)
+ldr1 = ADC(26)
+ldr2 = ADC(27)
+# Lecturas filtradas en segundo plano (ver fotoceldas.py)
+fotoceldas = MuestreadorLDR((ldr1, ldr2))
 
 # Botones (con PULL_UP porque los botones conectan a GND)
 btn_salida = Pin(16, Pin.IN, Pin.PULL_UP)
 btn_entrada = Pin(17, Pin.IN, Pin.PULL_UP)
 
+# Captura de pulsaciones por interrupción
+BOTON_ENTRADA = 0
+BOTON_SALIDA = 1
+botones = CapturaBotones((btn_entrada, btn_salida))
+
 # Servomotor
-servo = PWM(Pin(2))
+servo = SalidaPWM(PWM(Pin(2)))
 servo.freq(50)
 
 # 7 Segmentos (Cátodo común)
-seg_e = Pin(3, Pin.OUT)
-seg_d = Pin(4, Pin.OUT)
-seg_c = Pin(5, Pin.OUT)
-seg_dp = Pin(6, Pin.OUT)
-seg_g = Pin(13, Pin.OUT)
-seg_f = Pin(12, Pin.OUT)
-seg_a = Pin(11, Pin.OUT)
-seg_b = Pin(10, Pin.OUT)
+seg_e = SalidaDigital(Pin(3, Pin.OUT))
+seg_d = SalidaDigital(Pin(4, Pin.OUT))
+seg_c = SalidaDigital(Pin(5, Pin.OUT))
+seg_dp = SalidaDigital(Pin(6, Pin.OUT))
+seg_g = SalidaDigital(Pin(13, Pin.OUT))
+seg_f = SalidaDigital(Pin(12, Pin.OUT))
+seg_a = SalidaDigital(Pin(11, Pin.OUT))
+seg_b = SalidaDigital(Pin(10, Pin.OUT))
+SEGMENTOS = (seg_a, seg_b, seg_c, seg_d, seg_e, seg_f, seg_g)
 
 # Configuración WiFi
 SSID = "ol"
 PASSWORD = "661064Ra"
+# La conexión y el servidor arrancan en segundo plano (ver red.py)
+wifi = ConexionWifi(SSID, PASSWORD)
+
+# Prueba de componentes al arrancar (bloquea ~6 s). También se ejecuta si el
+# botón de SALIDA está presionado al reiniciar
+PRUEBA_AL_ARRANCAR = False
+
+# Milisegundos desde el inicio de main() hasta cada fase del arranque
+arranque = {}
+inicio_arranque = 0
+
+# Buffer reutilizado para el estado binario
+buffer_estado = bytearray(TAM_ESTADO)
+# Respuestas del camino rápido, reutilizadas en cada petición
+trama_estado = bytearray(TAM_CABECERA + TAM_ESTADO)
+trama_ok = nueva_trama_ok()
+secuencia_estado = 0
+
+# Espera máxima del ciclo principal por actividad de red (ms)
+PERIODO_CICLO_MS = 20
+
+# Servidor de comandos en el segundo núcleo: la red no agrega demoras al
+# control de botones, display y aguja (ver nucleos.py)
+DOBLE_NUCLEO = False
+# Intercambio con el núcleo de red; se crea con la primera conexión WiFi
+puente = None
+# Buffers del núcleo de red para el estado binario
+buffer_estado_red = bytearray(TAM_ESTADO)
+trama_estado_red = bytearray(TAM_CABECERA + TAM_ESTADO)
+
+# Diario en flash de entradas, salidas, pagos y espacios (ver diario.py)
+DIRECTORIO_DIARIO = hal.RAIZ_DATOS + '/diario'
+# Estancia máxima que se puede reconstruir en ticks al arrancar (~6 días)
+MAX_ESTANCIA_RECUPERADA_MS = (1 << 29) - 1
+
+# Reintentos de NTP con la red conectada mientras el reloj no esté en hora
+ESPERA_NTP_INICIAL_MS = 5000
+ESPERA_NTP_MAXIMA_MS = 600000
+espera_ntp_ms = ESPERA_NTP_INICIAL_MS
+proximo_ntp_ms = 0
 
 # Variables globales
-espacios_disponibles = 3
-entrada_timestamp = {}
-espacios_ocupados = [False, False, False]  # Estado manual de cada espacio
+vehiculos = RegistroVehiculos()  # Vehículos dentro del parqueo (FIFO)
+diario = Diario(DIRECTORIO_DIARIO, NUM_ESPACIOS)
+vehiculo_en_pago = -1
 estado_aguja = False
 ultimo_costo = 0
-btn_salida_anterior = 0
-btn_entrada_anterior = 0
 esperando_pago = False
-# Control manual de cada LED
-led1_manual = True
-led2_manual = True  
-led3_manual = True
 
 # Mapeo de números para 7 segmentos (Cátodo común: 1=encendido, 0=apagado)
-NUMEROS = {
-    0: [1,1,1,1,1,1,0],
-    1: [0,1,1,0,0,0,0],
-    2: [1,1,0,1,1,0,1],
-    3: [1,1,1,1,0,0,1],
-    4: [0,1,1,0,0,1,1],
-    5: [1,0,1,1,0,1,1],
-    6: [1,0,1,1,1,1,1],
-    7: [1,1,1,0,0,0,0],
-    8: [1,1,1,1,1,1,1],
-    9: [1,1,1,1,0,1,1]
-}
+# Bit 0 = segmento a ... bit 6 = segmento g
+NUMEROS = (
+    0b0111111,  # 0
+    0b0000110,  # 1
+    0b1011011,  # 2
+    0b1001111,  # 3
+    0b1100110,  # 4
+    0b1101101,  # 5
+    0b1111101,  # 6
+    0b0000111,  # 7
+    0b1111111,  # 8
+    0b1101111   # 9
+)
+numero_mostrado = -1
 
 def set_servo_angle(angle):
     """Mueve el servo al ángulo especificado (0-180)"""
@@ -76,49 +140,45 @@ def set_servo_angle(angle):
 
 def mostrar_numero(num):
     """Muestra un número en el display de 7 segmentos"""
+    global numero_mostrado
+    
     if num < 0 or num > 9:
         num = 0
     
-    segmentos = [seg_a, seg_b, seg_c, seg_d, seg_e, seg_f, seg_g]
-    patron = NUMEROS[num]
+    # Mismo dígito: no hay pines que cambiar
+    if num == numero_mostrado:
+        salidas.contar_omitidas(8)
+        return
     
-    for i, seg in enumerate(segmentos):
-        seg.value(patron[i])
+    patron = NUMEROS[num]
+    for i in range(7):
+        SEGMENTOS[i].value((patron >> i) & 1)
     
     seg_dp.value(0)
+    numero_mostrado = num
 
 def leer_fotoceldas():
-    """Lee el estado de las fotoceldas y actualiza espacios"""
-    # Umbral: valores BAJOS = luz (espacio libre), valores ALTOS = oscuro (ocupado)
-    umbral = 30000
-    
-    val1 = ldr1.read_u16()
-    val2 = ldr2.read_u16()
-    
-    # Si el valor es BAJO (más luz), el espacio está LIBRE
+    """Retorna si cada espacio con fotocelda está libre según la lectura filtrada"""
     # Retornamos el estado REAL de la fotocelda, no lo modificamos aquí
-    espacio1_libre = val1 < umbral
-    espacio2_libre = val2 < umbral
-    
-    print(f"LDR1: {val1}, LDR2: {val2}")
-    
-    return espacio1_libre, espacio2_libre
+    return fotoceldas.libre(0), fotoceldas.libre(1)
+
+def cambiar_led(indice, libre):
+    """Refleja en el LED el cambio de un espacio (LED encendido = libre)"""
+    leds[indice].value(libre)
+
+# Ocupación de los espacios (LED encendido = libre)
+tabla_espacios = TablaEspacios(NUM_ESPACIOS, cambiar_led)
 
 def actualizar_leds():
-    """Actualiza los LEDs según estado manual"""
-    global led1_manual, led2_manual, led3_manual
-    
-    # Todos los LEDs se controlan manualmente
-    led1.value(1 if led1_manual else 0)
-    led2.value(1 if led2_manual else 0)
-    led3.value(1 if led3_manual else 0)
+    """Escribe todos los LEDs según la tabla de espacios"""
+    for i in range(NUM_ESPACIOS):
+        leds[i].value(tabla_espacios.libre[i])
 
 def contar_espacios_disponibles():
-    """Cuenta espacios disponibles basado en estados manuales"""
-    global led1_manual, led2_manual, led3_manual
-    
-    total = (1 if led1_manual else 0) + (1 if led2_manual else 0) + (1 if led3_manual else 0)
-    print(f"Espacios: LED1={led1_manual}, LED2={led2_manual}, LED3={led3_manual}, Total={total}")
+    """Retorna los espacios disponibles (conteo mantenido por la tabla)"""
+    total = tabla_espacios.disponibles
+    if bitacora.nivel <= bitacora.DEBUG:
+        bitacora.debug("Espacios: libres=%d de %d", total, NUM_ESPACIOS)
     return total
 
 def abrir_aguja():
@@ -133,291 +193,579 @@ def cerrar_aguja():
     set_servo_angle(0)
     estado_aguja = False
 
-def conectar_wifi():
-    """Conecta a la red WiFi"""
-    wlan = network.WLAN(network.STA_IF)
-    wlan.active(True)
-    wlan.connect(SSID, PASSWORD)
-    
-    max_wait = 10
-    while max_wait > 0:
-        if wlan.status() < 0 or wlan.status() >= 3:
-            break
-        max_wait -= 1
-        print('Esperando conexión...')
-        time.sleep(1)
-    
-    if wlan.status() != 3:
-        raise RuntimeError('Fallo en conexión WiFi')
-    else:
-        print('Conectado')
-        status = wlan.ifconfig()
-        print('IP:', status[0])
-    
-    return wlan
+# Ciclos de la aguja sin bloquear el ciclo principal
+aguja = ControladorAguja(abrir_aguja, cerrar_aguja)
 
 def procesar_entrada():
     """Procesa el ingreso de un vehículo"""
-    global espacios_disponibles, entrada_timestamp, led1_manual, led2_manual, led3_manual
-    
     espacios = contar_espacios_disponibles()
-    print(f"Procesando entrada - Espacios disponibles: {espacios}")
+    bitacora.info("Procesando entrada - Espacios disponibles: %d", espacios)
     
     if espacios > 0:
-        print("Abriendo aguja...")
-        abrir_aguja()
-        time.sleep(3)
-        print("Cerrando aguja...")
-        cerrar_aguja()
-        
-        timestamp = time.time()
-        vehiculo_id = len(entrada_timestamp)
-        entrada_timestamp[vehiculo_id] = timestamp
-        print(f"Vehículo {vehiculo_id} registrado")
-        
-        # Ocupar un espacio: prioridad LED3 -> LED2 -> LED1
-        if led3_manual:
-            led3_manual = False
-            print("Espacio 3 (LED3) ocupado")
-        elif led2_manual:
-            led2_manual = False
-            print("Espacio 2 (LED2) ocupado")
-        elif led1_manual:
-            led1_manual = False
-            print("Espacio 1 (LED1) ocupado")
+        if vehiculos.lleno():
+            bitacora.aviso("Registro de vehículos lleno")
+            return
+        if not aguja.solicitar_ciclo():
+            bitacora.aviso("Cola de la aguja llena, intente de nuevo")
+            return
+        bitacora.info("Ciclo de aguja en cola (%d pendientes)", aguja.pendientes)
         
-        time.sleep(0.5)
+        # Ocupar un espacio libre (O(1)) y registrar el vehículo en él
+        indice = tabla_espacios.ocupar()
+        vehiculo_id = vehiculos.registrar(indice)
+        diario.anotar_espacio(indice, False)
+        diario.anotar_entrada(vehiculo_id, indice)
+        bitacora.info("Vehículo %d registrado en el espacio %d", vehiculo_id, indice + 1)
     else:
-        print("¡No hay espacios disponibles!")
+        bitacora.aviso("¡No hay espacios disponibles!")
 
-def calcular_costo(tiempo_entrada):
-    """Calcula el costo del parqueo (1000 colones por 10 segundos)"""
-    tiempo_actual = time.time()
-    tiempo_estancia = tiempo_actual - tiempo_entrada
-    
-    periodos = int(tiempo_estancia / 10)
-    costo = periodos * 1000
-    
-    digito = (costo // 1000) % 10
-    
-    return digito
+def calcular_costo(entrada_ms):
+    """Calcula el costo del parqueo en colones con la tarifa vigente (tarifa.py)"""
+    estancia_s = tiempo.ticks_diff(tiempo.ticks_ms(), entrada_ms) // 1000
+    return tarifa.calcular(estancia_s, int(tiempo.segundos()) - estancia_s)
+
+def digito_costo(costo):
+    """Dígito del display para un costo: miles de colones, módulo 10"""
+    return (costo // 1000) % 10
 
 def procesar_salida():
     """Procesa la salida de un vehículo"""
-    global esperando_pago, ultimo_costo, entrada_timestamp, led1_manual, led2_manual, led3_manual
+    global esperando_pago, ultimo_costo, vehiculo_en_pago
     
     if not esperando_pago:
-        if len(entrada_timestamp) > 0:
-            vehiculo_id = list(entrada_timestamp.keys())[0]
-            tiempo_entrada = entrada_timestamp[vehiculo_id]
-            
-            costo = calcular_costo(tiempo_entrada)
+        vehiculo_id = vehiculos.mas_antiguo()
+        if vehiculo_id >= 0:
+            costo = calcular_costo(vehiculos.entrada(vehiculo_id))
             ultimo_costo = costo
-            mostrar_numero(costo)
+            vehiculo_en_pago = vehiculo_id
+            mostrar_numero(digito_costo(costo))
             esperando_pago = True
-            print(f"Mostrando costo: {costo} (presiona de nuevo para salir)")
+            bitacora.info("Mostrando costo: ₡%d (presiona de nuevo para salir)", costo)
         else:
-            print("No hay vehículos para procesar salida")
+            bitacora.aviso("No hay vehículos para procesar salida")
     else:
-        print("Procesando salida...")
-        abrir_aguja()
-        time.sleep(3)
-        cerrar_aguja()
+        if not aguja.solicitar_ciclo():
+            bitacora.aviso("Cola de la aguja llena, intente de nuevo")
+            return
+        bitacora.info("Procesando salida...")
         
-        if len(entrada_timestamp) > 0:
-            vehiculo_id = list(entrada_timestamp.keys())[0]
-            del entrada_timestamp[vehiculo_id]
-            print(f"Vehículo {vehiculo_id} salió del parqueo")
+        # El vehículo que pagó, o el más antiguo si ya fue retirado por comando
+        vehiculo_id = vehiculo_en_pago
+        if not vehiculos.contiene(vehiculo_id):
+            vehiculo_id = vehiculos.mas_antiguo()
+        if vehiculo_id >= 0:
+            indice = vehiculos.espacio(vehiculo_id)
+            vehiculos.retirar(vehiculo_id)
+            diario.anotar_pago(vehiculo_id, ultimo_costo)
+            diario.anotar_salida(vehiculo_id, indice)
+            bitacora.info("Vehículo %d salió del parqueo", vehiculo_id)
             
-            # Liberar un espacio: prioridad LED1 -> LED2 -> LED3
-            if not led1_manual:
-                led1_manual = True
-                print("Espacio 1 (LED1) liberado")
-            elif not led2_manual:
-                led2_manual = True
-                print("Espacio 2 (LED2) liberado")
-            elif not led3_manual:
-                led3_manual = True
-                print("Espacio 3 (LED3) liberado")
+            # Liberar su espacio (O(1))
+            if indice < 0:
+                indice = tabla_espacios.liberar_alguno()
+                liberado = indice >= 0
+            else:
+                liberado = tabla_espacios.fijar(indice, True)
+            if liberado:
+                diario.anotar_espacio(indice, True)
+                bitacora.info("Espacio %d liberado", indice + 1)
+        
+        vehiculo_en_pago = -1
         
         esperando_pago = False
-        time.sleep(0.5)
 
-def manejar_comandos(conn):
-    """Maneja comandos recibidos desde la aplicación remota"""
-    global espacios_disponibles, led1_manual, led2_manual, led3_manual
+def fijar_espacio(indice, libre):
+    """Marca un espacio como libre u ocupado y lo anota en el diario si cambió
     
-    try:
-        data = conn.recv(1024)
-        if data:
-            comando = json.loads(data.decode())
-            
-            if comando['accion'] == 'estado':
-                espacios = contar_espacios_disponibles()
-                estado = {
-                    'espacios': espacios,
-                    'aguja': estado_aguja,
-                    'vehiculos': len(entrada_timestamp),
-                    'ldr1': ldr1.read_u16(),
-                    'ldr2': ldr2.read_u16(),
-                    'led1': led1_manual,
-                    'led2': led2_manual,
-                    'led3': led3_manual
-                }
-                conn.send(json.dumps(estado).encode())
-            
-            elif comando['accion'] == 'led':
-                espacio = comando['espacio']
-                estado = comando['estado']
-                if espacio == 1:
-                    led1_manual = bool(estado)
-                    led1.value(estado)
-                elif espacio == 2:
-                    led2_manual = bool(estado)
-                    led2.value(estado)
-                elif espacio == 3:
-                    led3_manual = bool(estado)
-                    led3.value(estado)
-                conn.send(b'OK')
-            
-            elif comando['accion'] == 'aguja':
-                if comando['estado']:
-                    abrir_aguja()
-                else:
-                    cerrar_aguja()
-                conn.send(b'OK')
-            
-            elif comando['accion'] == 'registro':
-                vehiculo_id = comando['vehiculo']
-                if comando['tipo'] == 'entrada':
-                    entrada_timestamp[vehiculo_id] = time.time()
-                elif comando['tipo'] == 'salida' and vehiculo_id in entrada_timestamp:
-                    del entrada_timestamp[vehiculo_id]
-                conn.send(b'OK')
+    Un LED que ya estaba así no escribe en flash.
+    """
+    if tabla_espacios.fijar(indice, libre):
+        diario.anotar_espacio(indice, libre)
+
+def mover_aguja(abrir):
+    """Abre o cierra la aguja en modo manual"""
+    if abrir:
+        aguja.abrir_manual()
+    else:
+        aguja.cerrar_manual()
+
+def manejar_rapido(peticion):
+    """Atiende sin crear objetos las peticiones más frecuentes
+    
+    peticion es un protocolo.PeticionRapida ya analizado. Retorna la trama de
+    respuesta (un buffer reutilizable) o None si la petición debe seguir el
+    camino normal: otra acción o parámetros faltantes o inválidos.
+    """
+    inicio = tiempo.ticks_us()
+    id_peticion = peticion.entero(CLAVE_ID)
+    accion = peticion.palabra(CLAVE_ACCION)
+    if id_peticion < 0:
+        return None
+    
+    if accion == PALABRA_ESTADO:
+        if peticion.palabra(CLAVE_FORMATO) != PALABRA_BIN or peticion.presente(CLAVE_ESPACIO):
+            return None
+        estado_binario(trama_estado, TAM_CABECERA)
+        escribir_cabecera_binaria(trama_estado, id_peticion, TAM_ESTADO)
+        respuesta = trama_estado
+    elif accion == PALABRA_LED:
+        espacio = peticion.entero(CLAVE_ESPACIO)
+        libre = peticion.entero(CLAVE_ESTADO)
+        if not 1 <= espacio <= NUM_ESPACIOS or libre < 0:
+            return None
+        fijar_espacio(espacio - 1, libre)
+        respuesta = escribir_trama_ok(trama_ok, id_peticion)
+    elif accion == PALABRA_AGUJA:
+        abrir = peticion.entero(CLAVE_ESTADO)
+        if abrir < 0:
+            return None
+        mover_aguja(abrir)
+        respuesta = escribir_trama_ok(trama_ok, id_peticion)
+    else:
+        return None
     
-    except Exception as e:
-        print(f"Error: {e}")
+    metricas.medir_accion(NOMBRES_PALABRAS[accion], inicio)
+    return respuesta
+
+def manejar_comandos(comando):
+    """Ejecuta un comando recibido desde la aplicación remota y retorna la respuesta"""
+    if comando['accion'] == 'estado':
+        if comando.get('formato') == 'bin':
+            # El registro binario es del parqueo entero (igual que en manejar_rapido,
+            # que deja estas peticiones al camino normal)
+            if 'espacio' in comando:
+                raise ValueError("El formato binario no admite espacio")
+            return estado_binario()
+        if 'espacio' in comando:
+            espacio = comando['espacio']
+            if not 1 <= espacio <= NUM_ESPACIOS:
+                raise ValueError(f"Espacio inexistente: {espacio}")
+            return {'espacio': espacio, 'libre': tabla_espacios.es_libre(espacio - 1)}
+        espacios = contar_espacios_disponibles()
+        estado = {
+            'espacios': espacios,
+            'aguja': estado_aguja,
+            'fase_aguja': aguja.fase,
+            'cola_aguja': aguja.pendientes,
+            'botones_descartados': botones.descartados,
+            'escrituras': salidas.escrituras,
+            'escrituras_omitidas': salidas.omitidas,
+            'vehiculos': vehiculos.ocupacion,
+            'capacidad_registro': vehiculos.capacidad,
+            'siguiente_vehiculo': vehiculos.siguiente_id,
+            'recaudado': diario.estado['recaudado'],
+            'diario_pendientes': diario.pendientes,
+            'diario_errores': diario.errores,
+            'wifi': wifi.fase,
+            'reconexiones_wifi': wifi.reconexiones,
+            'doble_nucleo': puente is not None,
+            'arranque': arranque,
+            'ldr1': fotoceldas.promedio(0),
+            'ldr2': fotoceldas.promedio(1),
+            'ldr1_libre': fotoceldas.libre(0),
+            'ldr2_libre': fotoceldas.libre(1),
+            'total': NUM_ESPACIOS
+        }
+        agregar_leds(estado)
+        return estado
+    
+    elif comando['accion'] == 'led':
+        fijar_espacio(comando['espacio'] - 1, bool(comando['estado']))
+        return 'OK'
+    
+    elif comando['accion'] == 'aguja':
+        mover_aguja(comando['estado'])
+        return 'OK'
+    
+    elif comando['accion'] == 'registro':
+        # El Pico asigna los ids; en una salida se indica el id recibido al entrar
+        if comando['tipo'] == 'entrada':
+            vehiculo_id = vehiculos.registrar()
+            if vehiculo_id < 0:
+                raise ValueError("Registro de vehículos lleno")
+            diario.anotar_entrada(vehiculo_id, -1)
+            return {'vehiculo': vehiculo_id}
+        elif comando['tipo'] == 'salida':
+            indice = vehiculos.espacio(comando['vehiculo'])
+            vehiculos.retirar(comando['vehiculo'])
+            diario.anotar_salida(comando['vehiculo'], indice)
+            return 'OK'
+        raise ValueError(f"Tipo de registro desconocido: {comando['tipo']}")
+    
+    elif comando['accion'] == 'logs':
+        nivel = comando.get('nivel', 'DEBUG')
+        for valor, nombre in bitacora.NOMBRES.items():
+            if nombre == nivel:
+                return bitacora.registros(comando.get('desde', 0), valor)
+        raise ValueError(f"Nivel desconocido: {nivel}")
+    
+    elif comando['accion'] == 'metricas':
+        resumen = metricas.resumen()
+        if comando.get('reiniciar'):
+            metricas.reiniciar()
+        return resumen
+    
+    elif comando['accion'] == 'batch':
+        return ejecutar_lote(comando['comandos'], comando.get('atomico', False))
+    
+    raise ValueError(f"Acción desconocida: {comando['accion']}")
+
+# Acciones de manejar_comandos; cada una tiene su histograma en las métricas
+ACCIONES = ('estado', 'led', 'aguja', 'registro', 'logs', 'metricas', 'batch')
+metricas.acciones(ACCIONES)
+
+# Acciones permitidas dentro de un lote
+ACCIONES_LOTE = ('estado', 'led', 'aguja', 'registro')
+
+def ejecutar_lote(comandos, atomico=False):
+    """Ejecuta varios comandos en una sola pasada y retorna sus resultados en orden
+    
+    Con atomico=True los cambios de LEDs y registros se deshacen si algún
+    comando falla, y los movimientos de aguja se aplican solo al final. Por
+    eso las agujas se validan antes de empezar: al aplicarlas el lote ya
+    está confirmado.
+    """
+    for sub in comandos:
+        if not isinstance(sub, dict) or sub.get('accion') not in ACCIONES_LOTE:
+            accion = sub.get('accion') if isinstance(sub, dict) else sub
+            raise ValueError(f"Acción no permitida en lote: {accion}")
+        # Los resultados del lote van en JSON: el registro binario no cabe
+        if sub.get('formato') == 'bin':
+            raise ValueError("Formato binario no permitido en lote")
+        if sub['accion'] == 'aguja' and not isinstance(sub.get('estado'), (bool, int)):
+            raise ValueError("Aguja sin estado en lote")
+    
+    if atomico:
+        respaldo = (bytes(tabla_espacios.libre), vehiculos.copia())
+        diario.iniciar_transaccion()
+    
+    resultados = []
+    diferidos = []
+    for i, sub in enumerate(comandos):
+        if atomico and sub['accion'] == 'aguja':
+            diferidos.append(i)
+            resultados.append(None)
+            continue
+        try:
+            resultados.append({'resultado': manejar_comandos(sub)})
+        except Exception as e:
+            if not atomico:
+                resultados.append({'error': str(e)})
+                continue
+            libres, registros = respaldo
+            tabla_espacios.restaurar(libres)
+            vehiculos.restaurar(registros)
+            diario.cancelar()
+            raise ValueError(f"Lote cancelado en el comando {i}: {e}")
+    
+    if atomico:
+        diario.confirmar()
+    
+    for i in diferidos:
+        resultados[i] = {'resultado': manejar_comandos(comandos[i])}
+    
+    return resultados
+
+def estado_binario(buffer=buffer_estado, desplazamiento=0):
+    """Empaqueta el estado en el registro binario de protocolo.py sin crear dicts"""
+    global secuencia_estado
+    secuencia_estado = (secuencia_estado + 1) & 0xFFFF
+    return empaquetar_estado(
+        buffer, estado_aguja, tabla_espacios.es_libre(0),
+        tabla_espacios.es_libre(1), tabla_espacios.es_libre(2),
+        contar_espacios_disponibles(), vehiculos.ocupacion,
+        fotoceldas.promedio(0), fotoceldas.promedio(1), secuencia_estado,
+        desplazamiento
+    )
+
+def agregar_leds(estado):
+    """Agrega al dict una clave ledN por espacio (True = libre)"""
+    for i in range(NUM_ESPACIOS):
+        estado[f'led{i + 1}'] = tabla_espacios.libre[i] == 1
+
+def estado_compacto():
+    """Estado resumido que se empuja a los clientes suscritos"""
+    estado = {
+        'espacios': contar_espacios_disponibles(),
+        'aguja': estado_aguja,
+        'fase_aguja': aguja.fase,
+        'vehiculos': vehiculos.ocupacion
+    }
+    agregar_leds(estado)
+    return estado
+
+def restaurar_desde_diario():
+    """Reconstruye espacios, vehículos y último cobro desde el diario en flash"""
+    global ultimo_costo
+    estado = diario.recuperar()
+    
+    # Los instantes del diario son segundos de pared; se pasan a ticks relativos
+    # a ahora. Sin el reloj en hora la estancia cuenta desde ahora hasta que
+    # sincronizar_reloj() la corrija
+    ahora_s = int(tiempo.segundos())
+    ahora_ms = tiempo.ticks_ms()
+    registros = []
+    for vehiculo_id, (instante, indice) in estado['vehiculos'].items():
+        registros.append((vehiculo_id, entrada_recuperada(instante, ahora_s, ahora_ms), indice))
+    
+    # Un diario de un registro más grande: se conservan los más antiguos
+    if len(registros) > vehiculos.capacidad:
+        registros.sort()
+        for vehiculo_id, _, indice in registros[vehiculos.capacidad:]:
+            diario.anotar_salida(vehiculo_id, indice)
+        bitacora.aviso("Diario con %d vehículos para un registro de %d: se descartan %d",
+                       len(registros), vehiculos.capacidad,
+                       len(registros) - vehiculos.capacidad)
+        registros = registros[:vehiculos.capacidad]
+    vehiculos.cargar(registros, estado['siguiente_id'])
+    tabla_espacios.restaurar(estado['libres'])
+    ultimo_costo = estado['ultimo_costo']
+    bitacora.info("Diario recuperado: %d vehículos, %d espacios libres",
+                  vehiculos.ocupacion, tabla_espacios.disponibles)
+
+def entrada_recuperada(instante, ahora_s, ahora_ms):
+    """Ticks de ingreso para un instante de pared del diario (ahora si no se puede saber)"""
+    if not (tiempo.en_hora(instante) and tiempo.en_hora(ahora_s)):
+        return ahora_ms
+    estancia_ms = min(max(0, ahora_s - instante) * 1000, MAX_ESTANCIA_RECUPERADA_MS)
+    return tiempo.ticks_add(ahora_ms, -estancia_ms)
+
+def sincronizar_reloj():
+    """Pone en hora el reloj por NTP y corrige las estancias tomadas sin hora
+    
+    Los vehículos recuperados con un instante en hora recalculan su ingreso;
+    los que entraron con el reloj sin hora se anotan de nuevo en el diario
+    con su instante real, para que sobrevivan al próximo corte. Si NTP falla
+    se reintenta con espera exponencial (ver paso()).
+    """
+    global espera_ntp_ms, proximo_ntp_ms
+    if not tiempo.sincronizar():
+        proximo_ntp_ms = tiempo.ticks_add(tiempo.ticks_ms(), espera_ntp_ms)
+        bitacora.aviso("No se pudo poner en hora el reloj (NTP), reintento en %d ms",
+                       espera_ntp_ms)
+        espera_ntp_ms = min(espera_ntp_ms * 2, ESPERA_NTP_MAXIMA_MS)
+        return
+    espera_ntp_ms = ESPERA_NTP_INICIAL_MS
+    ahora_s = int(tiempo.segundos())
+    ahora_ms = tiempo.ticks_ms()
+    corregidos = 0
+    for vehiculo_id, (instante, indice) in list(diario.estado['vehiculos'].items()):
+        if not vehiculos.contiene(vehiculo_id):
+            continue
+        if tiempo.en_hora(instante):
+            vehiculos.fijar_entrada(vehiculo_id, entrada_recuperada(instante, ahora_s, ahora_ms))
+        else:
+            estancia_s = tiempo.ticks_diff(ahora_ms, vehiculos.entrada(vehiculo_id)) // 1000
+            diario.anotar_entrada(vehiculo_id, indice, ahora_s - estancia_s)
+        corregidos += 1
+    bitacora.info("Reloj en hora; %d estancias corregidas", corregidos)
+
+def atender_comando(comando):
+    """Ejecuta un comando remoto midiendo su tiempo por acción"""
+    inicio = tiempo.ticks_us()
+    try:
+        return manejar_comandos(comando)
+    finally:
+        metricas.medir_accion(comando.get('accion') if isinstance(comando, dict) else None, inicio)
 
 def servidor():
     """Inicia el servidor socket"""
-    addr = socket.getaddrinfo('0.0.0.0', 8080)[0][-1]
-    s = socket.socket()
-    s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-    s.bind(addr)
-    s.listen(1)
-    s.setblocking(False)
-    
-    print('Servidor escuchando en puerto 8080')
-    
-    return s
+    return ServidorComandos(atender_comando, instantanea=estado_compacto,
+                            rapido=manejar_rapido).iniciar()
+
+def manejar_red(comando):
+    """Núcleo de red: el estado binario sale de la instantánea, el resto lo ejecuta el control"""
+    if (comando.get('accion') == 'estado' and comando.get('formato') == 'bin'
+            and 'espacio' not in comando):
+        return puente.copiar_estado(buffer_estado_red)
+    return puente.encolar(comando)
+
+def rapido_red(peticion):
+    """Núcleo de red: camino rápido del estado binario sin pasar por el control"""
+    id_peticion = peticion.entero(CLAVE_ID)
+    if (id_peticion < 0 or peticion.palabra(CLAVE_ACCION) != PALABRA_ESTADO
+            or peticion.palabra(CLAVE_FORMATO) != PALABRA_BIN
+            or peticion.presente(CLAVE_ESPACIO)):
+        return None
+    puente.copiar_estado(trama_estado_red, TAM_CABECERA)
+    escribir_cabecera_binaria(trama_estado_red, id_peticion, TAM_ESTADO)
+    return trama_estado_red
+
+def nucleo_red(puerto=PUERTO):
+    """Ciclo del segundo núcleo: atiende la red sin tocar el hardware"""
+    servidor_red = ServidorComandos(manejar_red, puerto=puerto,
+                                    instantanea=lambda: puente.compacto,
+                                    rapido=rapido_red).iniciar()
+    puente.escuchando = True
+    while True:
+        respuesta = puente.recibir()
+        while respuesta is not None:
+            servidor_red.completar(*respuesta)
+            respuesta = puente.recibir()
+        puente.quiere_compacto = servidor_red.suscriptores > 0
+        servidor_red.publicar()
+        # Con comandos en curso se revisa seguido si el control ya respondió
+        servidor_red.atender(1 if puente.en_curso else PERIODO_CICLO_MS)
+
+def iniciar_nucleo_red(puerto=PUERTO):
+    """Crea el puente con el estado actual y lanza el servidor en el segundo núcleo"""
+    global puente
+    puente = PuenteNucleos()
+    puente.escribir_estado(estado_binario)
+    puente.compacto = estado_compacto()
+    puente.lanzar(nucleo_red, puerto)
+
+def marcar_arranque(fase):
+    """Guarda cuántos ms tomó llegar a una fase del arranque"""
+    arranque[fase] = tiempo.ticks_diff(tiempo.ticks_ms(), inicio_arranque)
 
 def test_componentes():
     """Prueba todos los componentes al inicio"""
-    print("\n=== PRUEBA DE COMPONENTES ===")
+    bitacora.info("=== PRUEBA DE COMPONENTES ===")
     
     # Probar 7 segmentos (mostrar 0-9)
-    print("Probando 7 segmentos...")
+    bitacora.info("Probando 7 segmentos...")
     for i in range(10):
         mostrar_numero(i)
-        print(f"  Mostrando: {i}")
-        time.sleep(0.3)
+        bitacora.debug("  Mostrando: %d", i)
+        tiempo.dormir_ms(300)
     
     # Probar servo
-    print("Probando servomotor...")
-    print("  Posición 0 grados")
+    bitacora.info("Probando servomotor...")
+    bitacora.debug("  Posición 0 grados")
     set_servo_angle(0)
-    time.sleep(1)
-    print("  Posición 90 grados")
+    tiempo.dormir_ms(1000)
+    bitacora.debug("  Posición 90 grados")
     set_servo_angle(90)
-    time.sleep(1)
-    print("  Posición 0 grados")
+    tiempo.dormir_ms(1000)
+    bitacora.debug("  Posición 0 grados")
     set_servo_angle(0)
-    time.sleep(1)
+    tiempo.dormir_ms(1000)
     
     # Probar LEDs
-    print("Probando LEDs...")
-    print("  Encendiendo todos...")
-    led1.value(1)
-    led2.value(1)
-    led3.value(1)
-    time.sleep(1)
-    print("  Apagando todos...")
-    led1.value(0)
-    led2.value(0)
-    led3.value(0)
-    time.sleep(0.5)
-    
-    print("=== PRUEBA COMPLETA ===\n")
+    bitacora.info("Probando LEDs...")
+    bitacora.debug("  Encendiendo todos...")
+    for led in leds:
+        led.value(1)
+    tiempo.dormir_ms(1000)
+    bitacora.debug("  Apagando todos...")
+    for led in leds:
+        led.value(0)
+    tiempo.dormir_ms(500)
+    
+    bitacora.info("=== PRUEBA COMPLETA ===")
 
-def main():
-    """Función principal"""
-    global btn_salida_anterior, btn_entrada_anterior
+def arrancar():
+    """Inicializa el hardware y recupera el estado; deja el sistema listo"""
+    global inicio_arranque
+    inicio_arranque = tiempo.ticks_ms()
+    # ms desde el reinicio hasta main() (importaciones y configuración)
+    arranque['inicio'] = inicio_arranque
     
-    # Probar componentes al inicio
-    test_componentes()
+    # Probar componentes solo si se pide
+    if PRUEBA_AL_ARRANCAR or btn_salida.value() == 0:
+        test_componentes()
+        marcar_arranque('prueba')
+    
+    # Muestrear fotoceldas en segundo plano
+    fotoceldas.iniciar(Timer())
     
     # Inicializar
     cerrar_aguja()
-    time.sleep(0.5)
     
-    # Inicializar todos los LEDs encendidos (3 espacios disponibles)
-    led1.value(1)
-    led2.value(1)
-    led3.value(1)
-    led1_manual = True
-    led2_manual = True
-    led3_manual = True
+    # Recuperar el estado guardado y encender los LEDs según la tabla
+    restaurar_desde_diario()
+    marcar_arranque('diario')
+    actualizar_leds()
     
-    # Mostrar 3 espacios disponibles
-    mostrar_numero(3)
+    # Mostrar espacios disponibles
+    mostrar_numero(min(contar_espacios_disponibles(), 9))
     
-    # Conectar WiFi
-    print("Conectando a WiFi...")
-    wlan = conectar_wifi()
-    s = servidor()
+    # Ignorar pulsaciones ocurridas durante el arranque
+    botones.vaciar()
     
-    print("Sistema iniciado - Presiona los botones para probar")
+    marcar_arranque('listo')
+    bitacora.info("Sistema listo en %d ms - la red se conecta en segundo plano",
+                  arranque['listo'])
+
+# Servidor de comandos; se crea con la primera conexión WiFi
+servidor_comandos = None
+
+def paso():
+    """Una vuelta del ciclo principal"""
+    global servidor_comandos
+    
+    # Período del ciclo y memoria libre (ver metricas.py)
+    metricas.marcar_ciclo()
+    
+    # Procesar todas las pulsaciones capturadas por interrupción
+    boton = botones.siguiente()
+    while boton >= 0:
+        if boton == BOTON_ENTRADA:
+            bitacora.info("¡Botón ENTRADA presionado!")
+            procesar_entrada()
+        else:
+            bitacora.info("¡Botón SALIDA presionado!")
+            procesar_salida()
+        boton = botones.siguiente()
     
-    # Inicializar estado de botones
-    btn_entrada_anterior = btn_entrada.value()
-    btn_salida_anterior = btn_salida.value()
+    # Avanzar el ciclo de la aguja
+    aguja.actualizar()
     
+    # Escribir en flash el lote del diario si lleva tiempo pendiente
+    diario.actualizar()
+    
+    # Actualizar display si no está esperando pago (9 = nueve o más)
+    if not esperando_pago:
+        espacios = contar_espacios_disponibles()
+        mostrar_numero(min(espacios, 9))
+    
+    # Conectar o reconectar la red sin bloquear
+    if wifi.actualizar():
+        # El RTC pierde la hora en cada corte: ponerlo en hora con la red
+        if not tiempo.reloj_valido():
+            sincronizar_reloj()
+        if servidor_comandos is None and puente is None:
+            marcar_arranque('wifi')
+            if DOBLE_NUCLEO:
+                iniciar_nucleo_red()
+            else:
+                servidor_comandos = servidor()
+            marcar_arranque('servidor')
+    elif (wifi.fase == CONECTADA and not tiempo.reloj_valido()
+          and tiempo.ticks_diff(tiempo.ticks_ms(), proximo_ntp_ms) >= 0):
+        sincronizar_reloj()
+    
+    if puente is not None:
+        # Doble núcleo: comandos en cola (como máximo MAX_POR_CICLO) y
+        # estado para la red; el período no depende de la actividad de red
+        puente.atender(atender_comando)
+        puente.escribir_estado(estado_binario)
+        if puente.quiere_compacto:
+            puente.compacto = estado_compacto()
+        tiempo.dormir_ms(PERIODO_CICLO_MS)
+        return
+    
+    # Sin servidor, o con el reloj virtual del simulador, la espera del
+    # ciclo la da el reloj; si no, la espera por actividad de red
+    espera = PERIODO_CICLO_MS
+    if servidor_comandos is None or tiempo.virtual:
+        tiempo.dormir_ms(PERIODO_CICLO_MS)
+        espera = 0
+    if servidor_comandos is None:
+        return
+    
+    # Empujar cambios de estado a los suscriptores
+    servidor_comandos.publicar()
+    
+    # Atender a todos los clientes listos
+    servidor_comandos.atender(espera)
+
+def main():
+    """Función principal"""
+    arrancar()
     while True:
-        # Leer botones con debounce (invertido porque usamos PULL_UP)
-        btn_entrada_actual = btn_entrada.value()
-        btn_salida_actual = btn_salida.value()
-        
-        # Botón presionado = 0 (porque está conectado a GND con PULL_UP)
-        if not btn_entrada_actual and btn_entrada_anterior:
-            print("¡Botón ENTRADA presionado!")
-            procesar_entrada()
-        
-        if not btn_salida_actual and btn_salida_anterior:
-            print("¡Botón SALIDA presionado!")
-            procesar_salida()
-        
-        btn_entrada_anterior = btn_entrada_actual
-        btn_salida_anterior = btn_salida_actual
-        
-        # Actualizar display si no está esperando pago
-        if not esperando_pago:
-            espacios = contar_espacios_disponibles()
-            mostrar_numero(espacios)
-        
-        # Actualizar LEDs según fotoceldas
-        actualizar_leds()
-        
-        # Manejar conexiones entrantes
-        try:
-            conn, addr = s.accept()
-            print('Conexión desde:', addr)
-            conn.setblocking(False)
-            manejar_comandos(conn)
-            conn.close()
-        except OSError:
-            pass
-        
-        time.sleep(0.1)
+        paso()
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -0,0 +1,184 @@
+"""Métricas de rendimiento del firmware con histogramas de cubetas fijas
+
+Los tiempos se miden con tiempo.ticks_us(). Cada histograma tiene cubetas
+preasignadas, así registrar un valor no crea objetos. La acción "metricas"
+devuelve resumen() y puede reiniciar todo con reiniciar():
+
+    inicio = tiempo.ticks_us()
+    ...
+    metricas.medir_accion('estado', inicio)
+"""
+from array import array
+import gc
+import tiempo
+
+# Límite superior de cada cubeta; la última cubeta cuenta los valores mayores
+LIMITES_US = (100, 250, 500, 1000, 2500, 5000, 10000, 25000, 50000, 100000)
+LIMITES_BYTES = (16, 32, 64, 128, 256, 512, 1024, 2048)
+
+# Histograma común de las acciones que no se registraron con acciones()
+OTRAS = 'otras'
+# Ciclos entre lecturas de memoria libre (gc.mem_free() recorre el heap)
+CICLOS_MEMORIA = 50
+
+_mem_free = getattr(gc, 'mem_free', None)
+
+
+class Histograma:
+    """Conteo de valores en cubetas fijas más mínimo, máximo y promedio"""
+
+    def __init__(self, limites=LIMITES_US):
+        self.limites = limites
+        self.cubetas = array('L', [0] * (len(limites) + 1))
+        self.reiniciar()
+
+    def reiniciar(self):
+        """Pone el histograma en cero"""
+        for i in range(len(self.cubetas)):
+            self.cubetas[i] = 0
+        self.cantidad = 0
+        self.total = 0
+        self.minimo = 0
+        self.maximo = 0
+
+    def agregar(self, valor):
+        """Cuenta un valor"""
+        i = 0
+        limites = self.limites
+        while i < len(limites) and valor > limites[i]:
+            i += 1
+        self.cubetas[i] += 1
+        if not self.cantidad or valor < self.minimo:
+            self.minimo = valor
+        if valor > self.maximo:
+            self.maximo = valor
+        self.cantidad += 1
+        self.total += valor
+
+    def percentil(self, p):
+        """Límite de la cubeta donde cae el percentil p (0-100)"""
+        if not self.cantidad:
+            return 0
+        objetivo = (self.cantidad * p + 99) // 100
+        acumulado = 0
+        for i in range(len(self.limites)):
+            acumulado += self.cubetas[i]
+            if acumulado >= objetivo:
+                return min(self.limites[i], self.maximo)
+        return self.maximo
+
+    def resumen(self, cubetas=True):
+        """Dict con conteo, extremos, promedio y percentiles"""
+        datos = {
+            'n': self.cantidad,
+            'min': self.minimo,
+            'max': self.maximo,
+            'prom': self.total // self.cantidad if self.cantidad else 0,
+            'p50': self.percentil(50),
+            'p95': self.percentil(95),
+            'p99': self.percentil(99)
+        }
+        if cubetas:
+            datos['cubetas'] = list(self.cubetas)
+        return datos
+
+
+# Período del ciclo principal, latencia de respuesta y bytes por lectura/envío
+ciclo = Histograma()
+latencia = Histograma()
+bytes_recibidos = Histograma(LIMITES_BYTES)
+bytes_enviados = Histograma(LIMITES_BYTES)
+_acciones = {}
+_otras = Histograma()
+
+errores_parseo = 0
+memoria_minima = -1
+_ultimo_ciclo = -1
+_ciclos = 0
+
+
+def marcar_ciclo():
+    """Se llama al inicio de cada vuelta del ciclo principal"""
+    global _ultimo_ciclo, _ciclos
+    ahora = tiempo.ticks_us()
+    if _ultimo_ciclo >= 0:
+        ciclo.agregar(tiempo.ticks_diff(ahora, _ultimo_ciclo))
+    _ultimo_ciclo = ahora
+    _ciclos += 1
+    if _ciclos >= CICLOS_MEMORIA:
+        _ciclos = 0
+        medir_memoria()
+
+
+def medir_memoria():
+    """Actualiza la mínima memoria libre observada (solo MicroPython)"""
+    global memoria_minima
+    if _mem_free is None:
+        return
+    libre = _mem_free()
+    if memoria_minima < 0 or libre < memoria_minima:
+        memoria_minima = libre
+
+
+def acciones(nombres):
+    """Prepara un histograma por acción conocida
+
+    Las acciones que manda un cliente y no están aquí se cuentan juntas en
+    OTRAS, así nombres inventados no ocupan memoria ni desplazan a las reales.
+    """
+    for nombre in nombres:
+        if nombre not in _acciones:
+            _acciones[nombre] = Histograma()
+
+
+def medir_accion(accion, inicio_us):
+    """Registra cuánto tardó en atenderse una acción desde inicio_us"""
+    histograma = _acciones.get(accion, _otras) if isinstance(accion, str) else _otras
+    histograma.agregar(tiempo.ticks_diff(tiempo.ticks_us(), inicio_us))
+
+
+def contar_error_parseo():
+    """Cuenta una petición que no se pudo interpretar"""
+    global errores_parseo
+    errores_parseo += 1
+
+
+def resumen():
+    """Todas las métricas en un dict apto para JSON"""
+    medir_memoria()
+    return {
+        'limites_us': LIMITES_US,
+        'limites_bytes': LIMITES_BYTES,
+        'ciclo_us': ciclo.resumen(),
+        'latencia_us': latencia.resumen(),
+        'acciones_us': _resumen_acciones(),
+        'bytes_recibidos': bytes_recibidos.resumen(),
+        'bytes_enviados': bytes_enviados.resumen(),
+        'errores_parseo': errores_parseo,
+        'memoria_minima': memoria_minima,
+        'memoria_libre': _mem_free() if _mem_free is not None else -1
+    }
+
+
+def _resumen_acciones():
+    # Solo las acciones que ya se midieron
+    datos = {a: h.resumen(False) for a, h in _acciones.items() if h.cantidad}
+    if _otras.cantidad:
+        datos[OTRAS] = _otras.resumen(False)
+    return datos
+
+
+def reiniciar():
+    """Pone todas las métricas en cero"""
+    global errores_parseo, memoria_minima, _ultimo_ciclo, _ciclos
+    ciclo.reiniciar()
+    latencia.reiniciar()
+    bytes_recibidos.reiniciar()
+    bytes_enviados.reiniciar()
+    for histograma in _acciones.values():
+        histograma.reiniciar()
+    _otras.reiniciar()
+    errores_parseo = 0
+    memoria_minima = -1
+    _ultimo_ciclo = -1
+    _ciclos = 0
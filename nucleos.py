@@ -0,0 +1,151 @@
+"""Intercambio entre el ciclo de control (núcleo 0) y el servidor de red (núcleo 1)
+
+Con main.DOBLE_NUCLEO el servidor de comandos corre en el segundo núcleo
+del RP2040 (_thread) y nunca toca el hardware ni el estado del control.
+Los comandos pasan por colas de tamaño fijo protegidas con un lock: el
+núcleo 1 encola la petición y sigue atendiendo la red (el servidor la deja
+como conexiones.Diferida), y el núcleo 0 ejecuta como máximo MAX_POR_CICLO
+comandos por vuelta y encola las respuestas. El estado binario se copia en
+cada vuelta a una instantánea que el núcleo 1 lee sin esperar al control.
+Así un cliente lento o un JSON grande solo demoran la red.
+
+    puente = PuenteNucleos()
+    puente.lanzar(bucle_red)              # núcleo 1: encolar() y recibir()
+    puente.atender(manejar_comandos)      # núcleo 0, en cada vuelta
+"""
+import _thread
+import struct
+from conexiones import Diferida
+from protocolo import TAM_ESTADO
+
+TAM_COLA = 8
+MAX_POR_CICLO = 4
+
+# Posición del número de secuencia en el registro de estado (últimos 2 bytes)
+_POS_SECUENCIA = TAM_ESTADO - 2
+
+
+class ColaFija:
+    """Cola circular de capacidad fija que se puede usar desde ambos núcleos"""
+
+    def __init__(self, tam=TAM_COLA):
+        self._elementos = [None] * tam
+        self._tam = tam
+        self._lectura = 0
+        self._cantidad = 0
+        self._lock = _thread.allocate_lock()
+
+    def __len__(self):
+        return self._cantidad
+
+    def poner(self, elemento):
+        """Agrega al final; retorna False si la cola está llena"""
+        self._lock.acquire()
+        try:
+            if self._cantidad >= self._tam:
+                return False
+            self._elementos[(self._lectura + self._cantidad) % self._tam] = elemento
+            self._cantidad += 1
+            return True
+        finally:
+            self._lock.release()
+
+    def sacar(self):
+        """Retira el primer elemento o retorna None si está vacía"""
+        self._lock.acquire()
+        try:
+            if not self._cantidad:
+                return None
+            elemento = self._elementos[self._lectura]
+            self._elementos[self._lectura] = None
+            self._lectura = (self._lectura + 1) % self._tam
+            self._cantidad -= 1
+            return elemento
+        finally:
+            self._lock.release()
+
+
+class PuenteNucleos:
+    """Colas de comandos y respuestas más la instantánea del estado
+
+    encolar(), recibir(), copiar_estado() y lanzar() se usan desde el núcleo
+    de red; atender() y escribir_estado() desde el ciclo de control. Como
+    mucho hay tam_cola comandos en curso, así la cola de respuestas nunca se
+    llena. compacto es el estado resumido para los suscriptores: el control
+    lo renueva solo si quiere_compacto (hay suscriptores).
+    """
+
+    def __init__(self, tam_cola=TAM_COLA):
+        self.peticiones = ColaFija(tam_cola)
+        self.respuestas = ColaFija(tam_cola)
+        self.tam_cola = tam_cola
+        self.en_curso = 0
+        self.estado = bytearray(TAM_ESTADO)
+        self.compacto = None
+        self.quiere_compacto = False
+        self.escuchando = False
+        self.atendidos = 0
+        self.rechazados = 0
+        self._lock_estado = _thread.allocate_lock()
+        self._numero = 0
+        self._secuencia = 0
+
+    def lanzar(self, funcion, *args):
+        """Ejecuta funcion(*args) en el segundo núcleo"""
+        _thread.start_new_thread(funcion, args)
+
+    # Núcleo de red
+
+    def encolar(self, comando):
+        """Pasa el comando al control; retorna la Diferida de su respuesta"""
+        if self.en_curso >= self.tam_cola:
+            self.rechazados += 1
+            raise ValueError('Control ocupado, intente de nuevo')
+        self._numero += 1
+        self.peticiones.poner((self._numero, comando))
+        self.en_curso += 1
+        return Diferida(self._numero)
+
+    def recibir(self):
+        """Siguiente (numero, resultado, excepción) ya ejecutado, o None"""
+        respuesta = self.respuestas.sacar()
+        if respuesta is not None:
+            self.en_curso -= 1
+        return respuesta
+
+    def copiar_estado(self, destino, desplazamiento=0):
+        """Copia la instantánea en destino con un número de secuencia por respuesta"""
+        self._lock_estado.acquire()
+        destino[desplazamiento:desplazamiento + TAM_ESTADO] = self.estado
+        self._lock_estado.release()
+        self._secuencia = (self._secuencia + 1) & 0xFFFF
+        struct.pack_into('>H', destino, desplazamiento + _POS_SECUENCIA, self._secuencia)
+        return destino
+
+    # Ciclo de control
+
+    def atender(self, manejador, maximo=MAX_POR_CICLO):
+        """Ejecuta hasta maximo comandos en cola con manejador(comando)"""
+        for _ in range(maximo):
+            peticion = self.peticiones.sacar()
+            if peticion is None:
+                return
+            numero, comando = peticion
+            try:
+                resultado = manejador(comando)
+                if isinstance(resultado, bytearray):
+                    # Los buffers del control se reutilizan: el núcleo de red recibe una copia
+                    resultado = bytes(resultado)
+                respuesta = (numero, resultado, None)
+            except Exception as e:
+                respuesta = (numero, None, e)
+            self.atendidos += 1
+            self.respuestas.poner(respuesta)
+
+    def escribir_estado(self, empaquetar):
+        """Renueva la instantánea con empaquetar(buffer)"""
+        self._lock_estado.acquire()
+        try:
+            empaquetar(self.estado)
+        finally:
+            self._lock_estado.release()
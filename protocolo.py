@@ -0,0 +1,385 @@
+"""Tramas del protocolo de comandos compartidas por el Pico y la interfaz
+
+Cada trama es un objeto JSON terminado en salto de línea. Las peticiones
+llevan un campo "id" que el Pico devuelve en la respuesta:
+
+    -> {"id": 7, "accion": "estado"}\\n
+    <- {"id": 7, "resultado": {...}}\\n
+    <- {"id": 8, "error": "..."}\\n
+
+Una conexión con tramas se mantiene abierta para muchas peticiones. Los
+clientes antiguos que envían un solo JSON sin "id" ni salto de línea siguen
+recibiendo la respuesta sin envoltura y la conexión se cierra.
+
+La respuesta a {"accion": "estado", "formato": "bin"} es un registro binario
+de TAM_ESTADO bytes (FORMATO_ESTADO). En una conexión con tramas viaja como
+trama binaria: MARCA_BINARIA, id (uint32), largo (uint8) y los datos. Solo
+las respuestas pueden ser binarias: las peticiones siempre son JSON.
+
+El Pico recibe en un BufferTramas preasignado y reconoce las peticiones
+más frecuentes con PeticionRapida sin decodificar el JSON; sus respuestas
+se escriben en buffers reutilizables (escribir_cabecera_binaria,
+escribir_trama_ok). Así atender esas peticiones no crea objetos.
+"""
+import json
+import struct
+from array import array
+
+FIN_TRAMA = b'\n'
+TAM_MAX_TRAMA = 1024
+
+# Trama binaria: marca, id de la petición y largo del contenido
+MARCA_BINARIA = 0
+FORMATO_CABECERA = '>BIB'
+TAM_CABECERA = struct.calcsize(FORMATO_CABECERA)
+
+# Registro binario de estado: versión, banderas, espacios, vehículos,
+# ldr1, ldr2 y número de secuencia
+VERSION_ESTADO = 1
+FORMATO_ESTADO = '>BBBHHHH'
+TAM_ESTADO = struct.calcsize(FORMATO_ESTADO)
+BIT_AGUJA = 0x01
+BIT_LED1 = 0x02
+BIT_LED2 = 0x04
+BIT_LED3 = 0x08
+
+# Camino rápido: claves y palabras que se reconocen sin decodificar el JSON
+CLAVES_RAPIDAS = (b'id', b'accion', b'formato', b'espacio', b'estado')
+CLAVE_ID = 0
+CLAVE_ACCION = 1
+CLAVE_FORMATO = 2
+CLAVE_ESPACIO = 3
+CLAVE_ESTADO = 4
+PALABRAS_RAPIDAS = (b'estado', b'led', b'aguja', b'bin')
+NOMBRES_PALABRAS = ('estado', 'led', 'aguja', 'bin')
+PALABRA_ESTADO = 0
+PALABRA_LED = 1
+PALABRA_AGUJA = 2
+PALABRA_BIN = 3
+MAX_DIGITOS = 9
+
+# Respuesta "OK" de largo fijo: el id va alineado a la derecha con espacios
+_PLANTILLA_OK = b'{"id": ' + b' ' * MAX_DIGITOS + b', "resultado": "OK"}\n'
+_POS_ID_OK = 7
+
+
+def codificar_trama(obj):
+    """Serializa un objeto como trama terminada en salto de línea"""
+    return json.dumps(obj).encode() + FIN_TRAMA
+
+
+def codificar_trama_binaria(id_peticion, datos):
+    """Envuelve una respuesta binaria con su id para una conexión con tramas"""
+    return struct.pack(FORMATO_CABECERA, MARCA_BINARIA, id_peticion, len(datos)) + bytes(datos)
+
+
+def escribir_cabecera_binaria(buffer, id_peticion, largo):
+    """Escribe al inicio de buffer la cabecera de una trama binaria"""
+    struct.pack_into(FORMATO_CABECERA, buffer, 0, MARCA_BINARIA, id_peticion, largo)
+
+
+def nueva_trama_ok():
+    """Buffer reutilizable para respuestas {"id": N, "resultado": "OK"}"""
+    return bytearray(_PLANTILLA_OK)
+
+
+def escribir_trama_ok(buffer, id_peticion):
+    """Escribe el id (hasta MAX_DIGITOS cifras) en un buffer de nueva_trama_ok()"""
+    valor = id_peticion
+    pos = _POS_ID_OK + MAX_DIGITOS - 1
+    while pos >= _POS_ID_OK:
+        if valor or pos == _POS_ID_OK + MAX_DIGITOS - 1:
+            buffer[pos] = 0x30 + valor % 10
+            valor //= 10
+        else:
+            buffer[pos] = 0x20
+        pos -= 1
+    return buffer
+
+
+def decodificar_trama(trama):
+    """Convierte una trama (sin el salto de línea) en objeto
+
+    Las tramas binarias de estado se devuelven como {"id", "resultado"} con
+    el estado ya decodificado, igual que una respuesta JSON.
+    """
+    if trama[0] == MARCA_BINARIA:
+        _, id_peticion, largo = struct.unpack_from(FORMATO_CABECERA, trama, 0)
+        datos = trama[TAM_CABECERA:TAM_CABECERA + largo]
+        return {'id': id_peticion, 'resultado': desempaquetar_estado(datos)}
+    return json.loads(trama.decode())
+
+
+def decodificar_peticion(trama):
+    """Convierte una petición (sin el salto de línea) en objeto
+
+    Las peticiones siempre son JSON; una trama que empieza con MARCA_BINARIA
+    es un error de parseo, nunca un registro de estado.
+    """
+    if trama and trama[0] == MARCA_BINARIA:
+        raise ValueError('Trama binaria en una petición')
+    return json.loads(trama.decode())
+
+
+def empaquetar_estado(buffer, aguja, led1, led2, led3, espacios, vehiculos,
+                      ldr1, ldr2, secuencia, desplazamiento=0):
+    """Escribe el registro binario de estado en buffer (TAM_ESTADO bytes desde desplazamiento)"""
+    banderas = ((BIT_AGUJA if aguja else 0) | (BIT_LED1 if led1 else 0)
+                | (BIT_LED2 if led2 else 0) | (BIT_LED3 if led3 else 0))
+    struct.pack_into(FORMATO_ESTADO, buffer, desplazamiento, VERSION_ESTADO, banderas,
+                     espacios, vehiculos, ldr1, ldr2, secuencia & 0xFFFF)
+    return buffer
+
+
+def desempaquetar_estado(datos):
+    """Convierte el registro binario de estado en el mismo dict que la respuesta JSON"""
+    version, banderas, espacios, vehiculos, ldr1, ldr2, secuencia = \
+        struct.unpack_from(FORMATO_ESTADO, datos, 0)
+    if version != VERSION_ESTADO:
+        raise ValueError(f'Versión de estado desconocida: {version}')
+    return {
+        'espacios': espacios,
+        'aguja': bool(banderas & BIT_AGUJA),
+        'vehiculos': vehiculos,
+        'ldr1': ldr1,
+        'ldr2': ldr2,
+        'led1': bool(banderas & BIT_LED1),
+        'led2': bool(banderas & BIT_LED2),
+        'led3': bool(banderas & BIT_LED3),
+        'secuencia': secuencia
+    }
+
+
+class LectorTramas:
+    """Acumula bytes recibidos y separa las tramas completas"""
+
+    def __init__(self, tam_max=TAM_MAX_TRAMA):
+        self.tam_max = tam_max
+        self.buffer = b''
+
+    def agregar(self, datos):
+        """Agrega bytes recibidos al buffer"""
+        self.buffer += datos
+
+    def completa(self):
+        """True si el buffer contiene al menos una trama terminada"""
+        return self.buffer.find(FIN_TRAMA) >= 0
+
+    def siguiente(self):
+        """Retorna la siguiente trama completa (bytes) o None si falta información"""
+        if self.buffer and self.buffer[0] == MARCA_BINARIA:
+            if len(self.buffer) < TAM_CABECERA:
+                return None
+            fin = TAM_CABECERA + self.buffer[TAM_CABECERA - 1]
+            if len(self.buffer) < fin:
+                return None
+            trama = self.buffer[:fin]
+            self.buffer = self.buffer[fin:]
+            return trama
+        fin = self.buffer.find(FIN_TRAMA)
+        if fin < 0:
+            if len(self.buffer) > self.tam_max:
+                raise ValueError('Trama demasiado grande')
+            return None
+        linea = self.buffer[:fin]
+        self.buffer = self.buffer[fin + 1:]
+        return linea
+
+
+def _saltar_espacios(datos, i, fin):
+    while i < fin and datos[i] in b' \t\r':
+        i += 1
+    return i
+
+
+def _fin_cadena(datos, i, fin):
+    # Posición de la comilla que cierra la cadena que empieza en i, o -1
+    while i < fin:
+        c = datos[i]
+        if c == 0x22:
+            return i
+        if c == 0x5C:
+            return -1
+        i += 1
+    return -1
+
+
+def _igual(datos, inicio, fin, palabra):
+    # True si datos[inicio:fin] es exactamente palabra
+    largo = fin - inicio
+    if len(palabra) != largo:
+        return False
+    i = 0
+    while i < largo and datos[inicio + i] == palabra[i]:
+        i += 1
+    return i == largo
+
+
+def _buscar_palabra(tabla, datos, inicio, fin):
+    # Índice en tabla de los bytes datos[inicio:fin], o -1
+    for indice in range(len(tabla)):
+        if _igual(datos, inicio, fin, tabla[indice]):
+            return indice
+    return -1
+
+
+AUSENTE = 0
+ENTERO = 1
+PALABRA = 2
+
+
+class PeticionRapida:
+    """Lee sin crear objetos un JSON plano con CLAVES_RAPIDAS
+
+    Los valores pueden ser enteros, true/false o una de PALABRAS_RAPIDAS.
+    analizar() retorna False ante cualquier otra cosa (claves desconocidas,
+    objetos anidados, escapes...), y la petición sigue el camino normal.
+    """
+
+    def __init__(self):
+        self.valores = array('l', [0] * len(CLAVES_RAPIDAS))
+        self.tipos = bytearray(len(CLAVES_RAPIDAS))
+
+    def entero(self, clave, defecto=-1):
+        """Valor entero de la clave, o defecto"""
+        return self.valores[clave] if self.tipos[clave] == ENTERO else defecto
+
+    def palabra(self, clave):
+        """Índice en PALABRAS_RAPIDAS del valor de la clave, o -1"""
+        return self.valores[clave] if self.tipos[clave] == PALABRA else -1
+
+    def presente(self, clave):
+        """True si la petición trae la clave"""
+        return self.tipos[clave] != AUSENTE
+
+    def analizar(self, datos, inicio, fin):
+        """Interpreta datos[inicio:fin]; True si se entendió completa"""
+        for clave in range(len(self.tipos)):
+            self.tipos[clave] = AUSENTE
+        i = _saltar_espacios(datos, inicio, fin)
+        if i >= fin or datos[i] != 0x7B:
+            return False
+        i = _saltar_espacios(datos, i + 1, fin)
+        while i < fin and datos[i] == 0x22:
+            cierre = _fin_cadena(datos, i + 1, fin)
+            if cierre < 0:
+                return False
+            clave = _buscar_palabra(CLAVES_RAPIDAS, datos, i + 1, cierre)
+            if clave < 0:
+                return False
+            i = _saltar_espacios(datos, cierre + 1, fin)
+            if i >= fin or datos[i] != 0x3A:
+                return False
+            i = self._valor(clave, datos, _saltar_espacios(datos, i + 1, fin), fin)
+            if i < 0:
+                return False
+            i = _saltar_espacios(datos, i, fin)
+            if i < fin and datos[i] == 0x2C:
+                i = _saltar_espacios(datos, i + 1, fin)
+                continue
+            if i < fin and datos[i] == 0x7D:
+                return _saltar_espacios(datos, i + 1, fin) == fin
+            return False
+        return False
+
+    def _valor(self, clave, datos, i, fin):
+        # Lee el valor que empieza en i; retorna la posición siguiente o -1
+        if i >= fin:
+            return -1
+        c = datos[i]
+        if c == 0x22:
+            cierre = _fin_cadena(datos, i + 1, fin)
+            palabra = _buscar_palabra(PALABRAS_RAPIDAS, datos, i + 1, cierre) if cierre >= 0 else -1
+            if palabra < 0:
+                return -1
+            self.valores[clave] = palabra
+            self.tipos[clave] = PALABRA
+            return cierre + 1
+        if c == 0x74 and _igual(datos, i, min(i + 4, fin), b'true'):
+            self.valores[clave] = 1
+            self.tipos[clave] = ENTERO
+            return i + 4
+        if c == 0x66 and _igual(datos, i, min(i + 5, fin), b'false'):
+            self.valores[clave] = 0
+            self.tipos[clave] = ENTERO
+            return i + 5
+        signo = 1
+        if c == 0x2D:
+            signo = -1
+            i += 1
+        inicio = i
+        valor = 0
+        while i < fin and 0x30 <= datos[i] <= 0x39:
+            valor = valor * 10 + datos[i] - 0x30
+            i += 1
+        if i == inicio or i - inicio > MAX_DIGITOS:
+            return -1
+        self.valores[clave] = signo * valor
+        self.tipos[clave] = ENTERO
+        return i
+
+
+class BufferTramas:
+    """Buffer de recepción preasignado que separa tramas sin copiar bytes
+
+    El socket escribe directo en libre() y avanzar(n) cuenta los bytes
+    recibidos. buscar() ubica la siguiente trama, que queda en
+    datos[inicio:fin] hasta llamar a consumir(). Cuando todo se consumió,
+    el buffer vuelve a empezar desde 0 sin mover datos. Es para peticiones:
+    las tramas se separan solo por FIN_TRAMA, nunca como binarias.
+    """
+
+    def __init__(self, tam=TAM_MAX_TRAMA):
+        self.datos = bytearray(tam)
+        self._vista = memoryview(self.datos)
+        self.inicio = 0
+        self.largo = 0
+        self._siguiente = 0
+
+    def pendientes(self):
+        """Bytes recibidos que aún no se consumen"""
+        return self.largo - self.inicio
+
+    def libre(self):
+        """Espacio donde recibir, o None si el buffer está lleno"""
+        if self.inicio == self.largo:
+            self.inicio = self.largo = 0
+        elif self.largo == len(self.datos) and self.inicio:
+            # Mover la trama incompleta al principio (caso poco frecuente)
+            pendientes = self.largo - self.inicio
+            for i in range(pendientes):
+                self.datos[i] = self.datos[self.inicio + i]
+            self.inicio = 0
+            self.largo = pendientes
+        if self.largo == len(self.datos):
+            return None
+        if self.largo == 0:
+            return self.datos
+        return self._vista[self.largo:]
+
+    def avanzar(self, cantidad):
+        """Cuenta cantidad bytes recibidos en libre()"""
+        self.largo += cantidad
+
+    def buscar(self):
+        """Fin de la siguiente trama completa (sin el salto de línea), o -1"""
+        fin = self.datos.find(FIN_TRAMA, self.inicio, self.largo)
+        if fin >= 0:
+            self._siguiente = fin + 1
+        return fin
+
+    def consumir(self):
+        """Descarta la trama encontrada por buscar()"""
+        self.inicio = self._siguiente
+
+    def vacio(self, fin):
+        """True si datos[inicio:fin] solo tiene espacios"""
+        return _saltar_espacios(self.datos, self.inicio, fin) == fin
+
+    def contenido(self):
+        """Copia de los bytes pendientes"""
+        return bytes(self._vista[self.inicio:self.largo])
+
+    def vaciar(self):
+        """Descarta todo lo recibido"""
+        self.inicio = self.largo = 0
@@ -0,0 +1,93 @@
+"""Conexión WiFi en segundo plano con reintentos y espera exponencial
+
+actualizar() se llama en cada vuelta del ciclo principal y nunca bloquea:
+lanza la conexión, revisa su estado y, si falla o se cae, espera un tiempo
+que se duplica en cada intento fallido (hasta ESPERA_MAXIMA_MS) antes de
+reintentar.
+"""
+import tiempo
+from hal import WLAN, STA_IF
+import bitacora
+
+# Fases de la conexión
+DESCONECTADA = 'desconectada'
+CONECTANDO = 'conectando'
+CONECTADA = 'conectada'
+ESPERANDO = 'esperando'
+
+TIMEOUT_CONEXION_MS = 10000
+ESPERA_INICIAL_MS = 1000
+ESPERA_MAXIMA_MS = 60000
+
+# wlan.status() del Pico W: 3 = conectado con IP, negativo = error
+ESTADO_CONECTADO = 3
+
+
+class ConexionWifi:
+    """Máquina de estados de la conexión a la red WiFi"""
+
+    def __init__(self, ssid, password, timeout_ms=TIMEOUT_CONEXION_MS,
+                 espera_inicial_ms=ESPERA_INICIAL_MS, espera_maxima_ms=ESPERA_MAXIMA_MS):
+        self.ssid = ssid
+        self.password = password
+        self.timeout_ms = timeout_ms
+        self.espera_inicial_ms = espera_inicial_ms
+        self.espera_maxima_ms = espera_maxima_ms
+        self.fase = DESCONECTADA
+        self.ip = None
+        self.intentos = 0
+        self.reconexiones = 0
+        self._wlan = None
+        self._desde = 0
+        self._espera = espera_inicial_ms
+
+    @property
+    def conectada(self):
+        """True si hay conexión con IP"""
+        return self.fase == CONECTADA
+
+    def actualizar(self, ahora=None):
+        """Avanza la conexión; retorna True en la vuelta en que queda conectada"""
+        if ahora is None:
+            ahora = tiempo.ticks_ms()
+
+        if self.fase == DESCONECTADA:
+            self._conectar(ahora)
+
+        elif self.fase == CONECTANDO:
+            estado = self._wlan.status()
+            if estado == ESTADO_CONECTADO:
+                self.fase = CONECTADA
+                self.ip = self._wlan.ifconfig()[0]
+                self._espera = self.espera_inicial_ms
+                bitacora.info('Conectado, IP: %s', self.ip)
+                return True
+            if estado < 0 or tiempo.ticks_diff(ahora, self._desde) >= self.timeout_ms:
+                bitacora.aviso('Fallo en conexión WiFi (estado %d), reintento en %d ms',
+                               estado, self._espera)
+                self._wlan.disconnect()
+                self.fase = ESPERANDO
+                self._desde = ahora
+
+        elif self.fase == ESPERANDO:
+            if tiempo.ticks_diff(ahora, self._desde) >= self._espera:
+                self._espera = min(self._espera * 2, self.espera_maxima_ms)
+                self._conectar(ahora)
+
+        elif self._wlan.status() != ESTADO_CONECTADO:
+            bitacora.aviso('Conexión WiFi perdida, reconectando')
+            self.reconexiones += 1
+            self.ip = None
+            self._conectar(ahora)
+
+        return False
+
+    def _conectar(self, ahora):
+        if self._wlan is None:
+            self._wlan = WLAN(STA_IF)
+            self._wlan.active(True)
+        self._wlan.connect(self.ssid, self.password)
+        self.intentos += 1
+        self.fase = CONECTANDO
+        self._desde = ahora
+        bitacora.info('Conectando a WiFi (intento %d)...', self.intentos)
@@ -0,0 +1,77 @@
+"""Salidas que recuerdan el último valor escrito y omiten escrituras repetidas"""
+
+# Contadores globales de escrituras realizadas y omitidas
+escrituras = 0
+omitidas = 0
+
+
+def contar_omitidas(cantidad):
+    """Suma escrituras omitidas por capas superiores (p. ej. un dígito repetido)"""
+    global omitidas
+    omitidas += cantidad
+
+
+def reiniciar_contadores():
+    """Pone en cero los contadores de escrituras"""
+    global escrituras, omitidas
+    escrituras = 0
+    omitidas = 0
+
+
+class SalidaDigital:
+    """Envuelve un Pin de salida con la misma interfaz value()"""
+
+    def __init__(self, pin):
+        self._pin = pin
+        self._valor = -1
+
+    def value(self, valor=None):
+        """Lee el último valor escrito o escribe uno nuevo si cambió"""
+        global escrituras, omitidas
+        if valor is None:
+            return self._valor
+        valor = 1 if valor else 0
+        if valor == self._valor:
+            omitidas += 1
+            return
+        self._pin.value(valor)
+        self._valor = valor
+        escrituras += 1
+
+
+class SalidaVirtual(SalidaDigital):
+    """Salida en memoria para espacios sin pin propio (p. ej. más allá de los LEDs)"""
+
+    def __init__(self):
+        super().__init__(None)
+
+    def value(self, valor=None):
+        """Lee o guarda el valor sin tocar hardware"""
+        if valor is None:
+            return self._valor
+        self._valor = 1 if valor else 0
+
+
+class SalidaPWM:
+    """Envuelve un PWM y solo actualiza el duty cuando cambia"""
+
+    def __init__(self, pwm):
+        self._pwm = pwm
+        self._duty = -1
+
+    def freq(self, frecuencia):
+        """Configura la frecuencia del PWM"""
+        self._pwm.freq(frecuencia)
+        self._duty = -1
+
+    def duty_u16(self, duty=None):
+        """Lee el último duty escrito o escribe uno nuevo si cambió"""
+        global escrituras, omitidas
+        if duty is None:
+            return self._duty
+        if duty == self._duty:
+            omitidas += 1
+            return
+        self._pwm.duty_u16(duty)
+        self._duty = duty
+        escrituras += 1
@@ -0,0 +1,342 @@
+"""Simulación de eventos discretos del tráfico del parqueo
+
+Corre el firmware (main.py) en CPython sobre hal_simulado y el reloj
+virtual. Los vehículos llegan según un proceso de Poisson (tasa fija o un
+perfil de 24 tasas por hora), hacen fila ante la aguja y presionan ENTRADA
+o SALIDA como un conductor: procesar_entrada asigna el espacio o los
+rechaza si está lleno, y la salida se cobra entre las dos pulsaciones con
+el costo de calcular_costo. Mientras la aguja está quieta el reloj salta al
+siguiente evento, así que días de tráfico se simulan en segundos:
+
+    python simulacion.py --dias 7 --llegadas 4 --estancia exp:60
+    python simulacion.py --llegadas 0,0,0,0,0,1,3,6,5,3,2,2,4,3,2,2,3,5,4,2,1,1,0,0
+    python simulacion.py --estancia emp:estancias.txt --tarifa 500 --periodo 900 --json
+
+Las estancias se dan en minutos: exp:MEDIA, fija:M, unif:MIN:MAX o
+emp:ARCHIVO (una estancia por línea, se muestrea con reemplazo). El
+firmware cobra siempre al vehículo más antiguo; "recaudado" es lo que
+anotó el diario y "recaudado_estancias" lo que se cobraría con la estancia
+real de cada vehículo que salió.
+"""
+import argparse
+from collections import deque
+import heapq
+import json
+import random
+import sys
+import time
+
+import bitacora
+import hal_simulado
+import tarifa
+import tiempo
+import main as firmware
+from aguja import REPOSO
+
+# Eventos
+LLEGADA = 0
+FIN_ESTANCIA = 1
+PAGO = 2
+
+SEGUNDOS_DIA = 86400
+
+
+def leer_llegadas(texto):
+    """Tasa de llegadas por hora: un número o 24 valores separados por comas"""
+    tasas = [float(t) for t in texto.split(',')]
+    if len(tasas) == 1:
+        tasas = tasas * 24
+    if len(tasas) != 24 or min(tasas) < 0:
+        raise ValueError('Se esperaban una tasa o 24 tasas por hora no negativas')
+    return tasas
+
+
+def leer_estancia(texto, azar):
+    """Función sin argumentos que retorna una estancia en segundos"""
+    tipo, _, parametros = texto.partition(':')
+    if tipo == 'exp':
+        media = float(parametros) * 60
+        return lambda: azar.expovariate(1 / media)
+    if tipo == 'fija':
+        fija = float(parametros) * 60
+        return lambda: fija
+    if tipo == 'unif':
+        minimo, maximo = (float(p) * 60 for p in parametros.split(':'))
+        return lambda: azar.uniform(minimo, maximo)
+    if tipo == 'emp':
+        with open(parametros) as f:
+            muestras = [float(linea) * 60 for linea in f if linea.strip()]
+        if not muestras:
+            raise ValueError(f"Sin estancias en {parametros}")
+        return lambda: azar.choice(muestras)
+    raise ValueError(f"Distribución de estancia desconocida: {texto}")
+
+
+def percentil(valores, p):
+    """Percentil p (0-100) por rango más cercano"""
+    if not valores:
+        return 0
+    ordenados = sorted(valores)
+    return ordenados[max(0, (len(ordenados) * p + 99) // 100 - 1)]
+
+
+class Fila:
+    """Vehículos esperando la aguja, con largo promedio ponderado por tiempo"""
+
+    def __init__(self):
+        self.vehiculos = deque()
+        self.maximo = 0
+        self.area = 0
+        self.esperas = []
+
+    def agregar(self, instante_ms, vehiculo):
+        self.vehiculos.append((instante_ms, vehiculo))
+        self.maximo = max(self.maximo, len(self.vehiculos))
+
+    def sacar(self, ahora_ms):
+        instante_ms, vehiculo = self.vehiculos.popleft()
+        self.esperas.append((ahora_ms - instante_ms) / 1000)
+        return vehiculo
+
+    def resumen(self, duracion_ms):
+        return {
+            'promedio': round(self.area / duracion_ms, 3),
+            'max': self.maximo,
+            'espera_prom_s': round(sum(self.esperas) / len(self.esperas), 1) if self.esperas else 0,
+            'espera_p95_s': round(percentil(self.esperas, 95), 1)
+        }
+
+
+class Simulacion:
+    """Genera llegadas y salidas y las ejecuta sobre el firmware simulado"""
+
+    def __init__(self, tasas, estancia, pago_s=30, fila_max=10, semilla=1):
+        self.azar = random.Random(semilla)
+        self.tasas = tasas
+        self.tasa_max = max(tasas)
+        self.estancia = leer_estancia(estancia, self.azar)
+        self.pago_ms = int(pago_s * 1000)
+        self.fila_max = fila_max
+        self.entrada = Fila()
+        self.salida = Fila()
+        self.llegadas = 0
+        self.admitidos = 0
+        self.rechazados_lleno = 0
+        self.rechazados_fila = 0
+        self.salidas = 0
+        self.recaudado_estancias = 0
+        self.aguja_ms = 0
+        self.puerta_ms = 0
+        self.ocupacion_area = 0
+        self._eventos = []
+        self._secuencia = 0
+        self._entradas_s = {}
+
+    def ahora_ms(self):
+        return hal_simulado.reloj.us // 1000
+
+    def programar(self, instante_ms, tipo, vehiculo=-1):
+        self._secuencia += 1
+        heapq.heappush(self._eventos, (instante_ms, self._secuencia, tipo, vehiculo))
+
+    def programar_llegada(self, desde_ms):
+        """Siguiente llegada de Poisson no homogéneo (por adelgazamiento)"""
+        if not self.tasa_max:
+            return
+        instante_s = desde_ms / 1000
+        while True:
+            instante_s += self.azar.expovariate(self.tasa_max / 3600)
+            hora = int(hal_simulado.reloj.inicio_s + instante_s) // 3600 % 24
+            if self.azar.random() * self.tasa_max < self.tasas[hora]:
+                break
+        self.programar(int(instante_s * 1000), LLEGADA, self.llegadas)
+
+    def puerta_libre(self):
+        """True si nadie está pagando ni pasando por la aguja"""
+        return (not firmware.esperando_pago and firmware.aguja.fase == REPOSO
+                and not firmware.aguja.pendientes)
+
+    def presionar(self, boton):
+        hal_simulado.presionar(boton.numero)
+        firmware.paso()
+
+    def atender_evento(self, tipo, vehiculo, ahora):
+        if tipo == LLEGADA:
+            self.llegadas += 1
+            if len(self.entrada.vehiculos) >= self.fila_max:
+                self.rechazados_fila += 1
+            else:
+                self.entrada.agregar(ahora, vehiculo)
+            self.programar_llegada(ahora)
+        elif tipo == FIN_ESTANCIA:
+            self.salida.agregar(ahora, vehiculo)
+        else:
+            # Segunda pulsación: pagó y sale
+            self.presionar(firmware.btn_salida)
+            entrada_s = self._entradas_s.pop(vehiculo)
+            salida_s = int(tiempo.segundos())
+            self.recaudado_estancias += tarifa.calcular(salida_s - entrada_s, entrada_s)
+            self.salidas += 1
+
+    def atender_fila(self, ahora):
+        """Pasa a la aguja al que más tiempo lleva en fila; True si atendió a alguien"""
+        entrada = self.entrada.vehiculos
+        salida = self.salida.vehiculos
+        if not entrada and not salida:
+            return False
+        if salida and (not entrada or salida[0][0] <= entrada[0][0]):
+            vehiculo = self.salida.sacar(ahora)
+            # Primera pulsación: el display muestra el costo mientras paga
+            self.presionar(firmware.btn_salida)
+            self.programar(self.ahora_ms() + self.pago_ms, PAGO, vehiculo)
+            return True
+
+        vehiculo = self.entrada.sacar(ahora)
+        ocupacion = firmware.vehiculos.ocupacion
+        self.presionar(firmware.btn_entrada)
+        if firmware.vehiculos.ocupacion > ocupacion:
+            self.admitidos += 1
+            self._entradas_s[vehiculo] = int(tiempo.segundos())
+            self.programar(self.ahora_ms() + int(self.estancia() * 1000), FIN_ESTANCIA, vehiculo)
+        else:
+            self.rechazados_lleno += 1
+        return True
+
+    def correr(self, duracion_s):
+        """Simula duracion_s segundos virtuales"""
+        inicio = self.ahora_ms()
+        fin = inicio + int(duracion_s * 1000)
+        recaudado_inicial = firmware.diario.estado['recaudado']
+        self.programar_llegada(inicio)
+
+        anterior = inicio
+        largos = (0, 0, 0)
+        ocupada = aguja_activa = False
+        while True:
+            ahora = self.ahora_ms()
+            # Estadísticas del intervalo con el estado al final de la vuelta anterior
+            transcurrido = ahora - anterior
+            anterior = ahora
+            self.entrada.area += largos[0] * transcurrido
+            self.salida.area += largos[1] * transcurrido
+            self.ocupacion_area += largos[2] * transcurrido
+            if ocupada:
+                self.puerta_ms += transcurrido
+            if aguja_activa:
+                self.aguja_ms += transcurrido
+            if ahora >= fin:
+                break
+
+            while self._eventos and self._eventos[0][0] <= ahora:
+                instante, _, tipo, vehiculo = heapq.heappop(self._eventos)
+                self.atender_evento(tipo, vehiculo, instante)
+            if self.puerta_libre():
+                self.atender_fila(ahora)
+
+            largos = (len(self.entrada.vehiculos), len(self.salida.vehiculos),
+                      firmware.vehiculos.ocupacion)
+            ocupada = not self.puerta_libre()
+            aguja_activa = firmware.aguja.fase != REPOSO or firmware.aguja.pendientes > 0
+            if aguja_activa:
+                firmware.paso()
+            elif not ocupada and (self.entrada.vehiculos or self.salida.vehiculos):
+                continue
+            else:
+                # Nada se mueve hasta el próximo evento: saltar el reloj
+                proximo = self._eventos[0][0] if self._eventos else fin
+                hal_simulado.reloj.avanzar_ms(max(0, min(proximo, fin) - ahora))
+                firmware.paso()
+
+        duracion_ms = self.ahora_ms() - inicio
+        llegadas = self.llegadas
+        rechazados = self.rechazados_lleno + self.rechazados_fila
+        dias = duracion_ms / 1000 / SEGUNDOS_DIA
+        recaudado = firmware.diario.estado['recaudado'] - recaudado_inicial
+        return {
+            'dias': round(dias, 3),
+            'espacios': firmware.NUM_ESPACIOS,
+            'llegadas': llegadas,
+            'admitidos': self.admitidos,
+            'rechazados_lleno': self.rechazados_lleno,
+            'rechazados_fila': self.rechazados_fila,
+            'tasa_rechazo': round(rechazados / llegadas, 4) if llegadas else 0,
+            'salidas': self.salidas,
+            'adentro_al_final': firmware.vehiculos.ocupacion,
+            'ocupacion_promedio': round(self.ocupacion_area / duracion_ms / firmware.NUM_ESPACIOS, 4),
+            'fila_entrada': self.entrada.resumen(duracion_ms),
+            'fila_salida': self.salida.resumen(duracion_ms),
+            'uso_aguja': round(self.aguja_ms / duracion_ms, 4),
+            'uso_puerta': round(self.puerta_ms / duracion_ms, 4),
+            'recaudado': recaudado,
+            'recaudado_estancias': self.recaudado_estancias,
+            'recaudado_por_dia': round(recaudado / dias) if dias else 0
+        }
+
+
+def mostrar(resultado):
+    """Imprime el resultado de forma legible"""
+    r = resultado
+    print(f"{r['dias']} días, {r['espacios']} espacios")
+    print(f"Llegadas: {r['llegadas']}, admitidos: {r['admitidos']}, "
+          f"rechazados: {r['rechazados_lleno']} (lleno) + {r['rechazados_fila']} (fila) "
+          f"= {r['tasa_rechazo']:.1%}")
+    print(f"Ocupación promedio: {r['ocupacion_promedio']:.1%}, "
+          f"uso de la aguja: {r['uso_aguja']:.1%}, de la puerta: {r['uso_puerta']:.1%}")
+    for nombre in ('fila_entrada', 'fila_salida'):
+        fila = r[nombre]
+        print(f"{nombre}: promedio {fila['promedio']}, máx {fila['max']}, "
+              f"espera prom {fila['espera_prom_s']} s, p95 {fila['espera_p95_s']} s")
+    print(f"Recaudado: ₡{r['recaudado']:,} (₡{r['recaudado_por_dia']:,}/día), "
+          f"por estancias reales: ₡{r['recaudado_estancias']:,}")
+    print(f"Simulado en {r['tiempo_real_s']} s ({r['aceleracion']:,}x tiempo real)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Simulación del tráfico del parqueo')
+    parser.add_argument('--dias', type=float, default=1)
+    parser.add_argument('--llegadas', default='4', help='vehículos por hora, o 24 tasas')
+    parser.add_argument('--estancia', default='exp:60', help='minutos: exp, fija, unif o emp')
+    parser.add_argument('--pago', type=float, default=30, help='segundos entre las pulsaciones')
+    parser.add_argument('--fila-max', type=int, default=10,
+                        help='vehículos en fila antes de que los nuevos se vayan')
+    parser.add_argument('--semilla', type=int, default=1)
+    parser.add_argument('--tarifa', type=int, help='colones por período')
+    parser.add_argument('--periodo', type=int, help='segundos por período')
+    parser.add_argument('--gracia', type=int, help='segundos sin cobro')
+    parser.add_argument('--tope', type=int, help='tope diario en colones')
+    parser.add_argument('--json', action='store_true')
+    opciones = parser.parse_args()
+
+    # Las opciones de tarifa que no se den conservan el valor vigente
+    vigente = tarifa.vigente
+    cambios = (opciones.tarifa, opciones.periodo, opciones.gracia, opciones.tope)
+    valores = (vigente.tarifa, vigente.periodo_s, vigente.gracia_s, vigente.tope_diario)
+    if any(c is not None for c in cambios):
+        tarifa.vigente = tarifa.Tarifa(*[v if c is None else c for c, v in zip(cambios, valores)],
+                                       franjas=vigente.franjas, zona_s=vigente.zona_s)
+
+    bitacora.nivel = bitacora.ERROR
+    bitacora.nivel_consola = bitacora.ERROR
+    # Empezar a medianoche para que el perfil por hora coincida con el reloj
+    hal_simulado.reloj.inicio_s -= hal_simulado.reloj.inicio_s % SEGUNDOS_DIA
+    firmware.arrancar()
+    # El muestreo de fotoceldas (100 Hz) no interviene y haría lento cada salto
+    hal_simulado.detener_timers()
+
+    simulacion = Simulacion(leer_llegadas(opciones.llegadas), opciones.estancia,
+                            opciones.pago, opciones.fila_max, opciones.semilla)
+    inicio = time.perf_counter()
+    resultado = simulacion.correr(opciones.dias * SEGUNDOS_DIA)
+    real = time.perf_counter() - inicio
+    resultado['tiempo_real_s'] = round(real, 2)
+    resultado['aceleracion'] = round(opciones.dias * SEGUNDOS_DIA / real)
+
+    if opciones.json:
+        json.dump(resultado, sys.stdout, indent=2, ensure_ascii=False)
+        print()
+    else:
+        mostrar(resultado)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,159 @@
+"""Motor de tarifas compartido por el Pico (MicroPython) y la interfaz (CPython)
+
+Se cobran solo los períodos completos de la estancia. Cada período se cobra
+a la tarifa de la franja horaria en la que empieza; las franjas se compilan
+en dos tablas de 24 entradas (tarifa por hora y acumulado por hora), así el
+costo de cualquier estancia se calcula en O(1) sin recorrer sus períodos:
+
+    tarifa = Tarifa(tarifa=1000, periodo_s=10, gracia_s=5,
+                    tope_diario=50000, franjas=((7, 18, 1500),))
+    tarifa.costo(35)                 # 35 s desde medianoche -> 3000
+    tarifa.costo_lote(estancias, entradas)   # muchas sesiones a la vez
+
+Con numpy instalado costo_lote evalúa todas las sesiones con operaciones
+vectoriales; sin numpy usa el mismo cálculo sesión por sesión.
+"""
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+SEGUNDOS_HORA = 3600
+SEGUNDOS_DIA = 86400
+
+# Tarifa por defecto: 1000 colones por cada 10 segundos
+TARIFA = 1000
+PERIODO_S = 10
+
+
+class Tarifa:
+    """Reglas de cobro compiladas en tablas por hora del día
+
+    tarifa: colones por período fuera de las franjas.
+    periodo_s: duración de un período; con franjas debe dividir una hora.
+    gracia_s: estancias más cortas no pagan.
+    tope_diario: máximo a cobrar por cada bloque de 24 h desde la entrada
+        (0 = sin tope).
+    franjas: tuplas (hora_inicio, hora_fin, tarifa); la franja cubre
+        [hora_inicio, hora_fin) y puede cruzar la medianoche.
+    zona_s: desfase de la hora local respecto a los instantes de entrada.
+    """
+
+    def __init__(self, tarifa=TARIFA, periodo_s=PERIODO_S, gracia_s=0,
+                 tope_diario=0, franjas=(), zona_s=0):
+        if periodo_s <= 0:
+            raise ValueError(f"Período inválido: {periodo_s}")
+        if franjas and SEGUNDOS_HORA % periodo_s:
+            raise ValueError(f"Con franjas el período debe dividir una hora: {periodo_s}")
+        self.tarifa = tarifa
+        self.periodo_s = periodo_s
+        self.gracia_s = gracia_s
+        self.tope_diario = tope_diario
+        self.franjas = tuple(franjas)
+        self.zona_s = zona_s
+
+        # Tarifa de cada hora y costo acumulado de un día hasta cada hora
+        self.por_hora = [tarifa] * 24
+        for inicio, fin, valor in self.franjas:
+            hora = inicio % 24
+            while True:
+                self.por_hora[hora] = valor
+                hora = (hora + 1) % 24
+                if hora == fin % 24:
+                    break
+        self.acumulado = [0] * 25
+        periodos_hora = SEGUNDOS_HORA // periodo_s if self.franjas else 0
+        for hora in range(24):
+            self.acumulado[hora + 1] = self.acumulado[hora] + self.por_hora[hora] * periodos_hora
+        self._uniforme = not self.franjas
+
+    def _acumulado(self, t, fase):
+        # Costo de los inicios de período (t ≡ fase mód periodo) en [0, t)
+        dias, segundo = divmod(t, SEGUNDOS_DIA)
+        hora, resto = divmod(segundo, SEGUNDOS_HORA)
+        inicios = (resto - fase + self.periodo_s - 1) // self.periodo_s
+        if inicios < 0:
+            inicios = 0
+        return dias * self.acumulado[24] + self.acumulado[hora] + self.por_hora[hora] * inicios
+
+    def _tramo(self, desde, periodos):
+        # Costo de periodos consecutivos que empiezan en el instante local desde
+        if self._uniforme:
+            return periodos * self.tarifa
+        fase = desde % self.periodo_s
+        return (self._acumulado(desde + periodos * self.periodo_s, fase)
+                - self._acumulado(desde, fase))
+
+    def costo(self, estancia_s, entrada_s=0):
+        """Costo en colones de una estancia de estancia_s segundos
+
+        entrada_s es el instante de ingreso (p. ej. time.time()); solo importa
+        si hay franjas horarias.
+        """
+        if estancia_s < self.gracia_s or estancia_s < self.periodo_s:
+            return 0
+        periodos = int(estancia_s) // self.periodo_s
+        desde = int(entrada_s) + self.zona_s
+        if not self.tope_diario:
+            return self._tramo(desde, periodos)
+
+        # Cada bloque de 24 h completo cuesta lo mismo: un día de tarifas
+        por_dia = SEGUNDOS_DIA // self.periodo_s
+        dias, resto = divmod(periodos, por_dia)
+        dia = self._tramo(desde, por_dia) if dias else 0
+        ultimo = self._tramo(desde + dias * SEGUNDOS_DIA, resto)
+        return dias * min(dia, self.tope_diario) + min(ultimo, self.tope_diario)
+
+    def costo_lote(self, estancias, entradas=None):
+        """Costos de muchas sesiones (listas o arreglos de segundos)
+
+        Con numpy retorna un arreglo int64; sin numpy, una lista.
+        """
+        if np is None:
+            if entradas is None:
+                return [self.costo(e) for e in estancias]
+            return [self.costo(e, t) for e, t in zip(estancias, entradas)]
+
+        estancias = np.asarray(estancias, dtype=np.int64)
+        if entradas is None:
+            desde = np.zeros_like(estancias)
+        else:
+            desde = np.asarray(entradas, dtype=np.int64) + self.zona_s
+        periodos = estancias // self.periodo_s
+        gratis = (estancias < self.gracia_s) | (periodos == 0)
+
+        if not self.tope_diario:
+            costos = self._tramo_lote(desde, periodos)
+        else:
+            por_dia = SEGUNDOS_DIA // self.periodo_s
+            dias, resto = np.divmod(periodos, por_dia)
+            dia = np.minimum(self._tramo_lote(desde, np.full_like(periodos, por_dia)),
+                             self.tope_diario)
+            ultimo = np.minimum(self._tramo_lote(desde + dias * SEGUNDOS_DIA, resto),
+                                self.tope_diario)
+            costos = dias * dia + ultimo
+        return np.where(gratis, 0, costos)
+
+    def _tramo_lote(self, desde, periodos):
+        if self._uniforme:
+            return periodos * self.tarifa
+        fase = desde % self.periodo_s
+        return (self._acumulado_lote(desde + periodos * self.periodo_s, fase)
+                - self._acumulado_lote(desde, fase))
+
+    def _acumulado_lote(self, t, fase):
+        acumulado = np.asarray(self.acumulado, dtype=np.int64)
+        por_hora = np.asarray(self.por_hora, dtype=np.int64)
+        dias, segundo = np.divmod(t, SEGUNDOS_DIA)
+        hora, resto = np.divmod(segundo, SEGUNDOS_HORA)
+        inicios = np.maximum((resto - fase + self.periodo_s - 1) // self.periodo_s, 0)
+        return dias * acumulado[24] + acumulado[hora] + por_hora[hora] * inicios
+
+
+# Tarifa vigente del parqueo
+vigente = Tarifa()
+
+
+def calcular(estancia_s, entrada_s=0):
+    """Costo en colones con la tarifa vigente"""
+    return vigente.costo(estancia_s, entrada_s)
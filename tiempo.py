@@ -0,0 +1,87 @@
+"""Utilidades de tiempo en ticks (ms y µs) compatibles con MicroPython y CPython
+
+Los módulos llaman a tiempo.ticks_ms(), tiempo.segundos() o
+tiempo.dormir_ms() a través del módulo, así usar_reloj() puede cambiar el
+reloj del sistema por uno virtual (ver hal_simulado.py).
+"""
+import time
+
+try:
+    ticks_ms = time.ticks_ms
+    ticks_us = time.ticks_us
+    ticks_diff = time.ticks_diff
+    ticks_add = time.ticks_add
+except AttributeError:
+    # CPython: se emulan los ticks del Pico (dan la vuelta en 2**30)
+    _PERIODO = 1 << 30
+    _MASCARA = _PERIODO - 1
+    _MITAD = _PERIODO // 2
+
+    def ticks_ms():
+        """Milisegundos de un contador monótono que da la vuelta"""
+        return int(time.monotonic() * 1000) & _MASCARA
+
+    def ticks_us():
+        """Microsegundos de un contador monótono que da la vuelta"""
+        return int(time.monotonic() * 1000000) & _MASCARA
+
+    def ticks_diff(fin, inicio):
+        """Diferencia con signo entre dos valores de ticks"""
+        return ((fin - inicio + _MITAD) & _MASCARA) - _MITAD
+
+    def ticks_add(ticks, delta):
+        """Suma un desplazamiento a un valor de ticks"""
+        return (ticks + delta) & _MASCARA
+
+
+# Reloj de pared en segundos y espera bloqueante
+segundos = time.time
+try:
+    dormir_ms = time.sleep_ms
+except AttributeError:
+    def dormir_ms(ms):
+        """Duerme ms milisegundos"""
+        time.sleep(ms / 1000)
+
+# True si el reloj es virtual (simulación)
+virtual = False
+
+# El RTC del Pico no tiene batería: tras un corte arranca en una fecha fija
+# (2021) hasta ponerlo en hora por NTP. Antes de ANIO_MINIMO no está en hora
+ANIO_MINIMO = 2024
+
+
+def en_hora(segundos_pared):
+    """True si un instante del reloj de pared se tomó con el reloj en hora"""
+    return time.gmtime(int(segundos_pared))[0] >= ANIO_MINIMO
+
+
+def reloj_valido():
+    """True si el reloj de pared está en hora"""
+    return en_hora(segundos())
+
+
+def sincronizar():
+    """Pone en hora el reloj de pared por NTP (bloquea hasta ~1 s)
+
+    Retorna True si el reloj quedó en hora. En CPython y en la simulación el
+    reloj ya lo está.
+    """
+    if virtual or reloj_valido():
+        return reloj_valido()
+    try:
+        import ntptime
+        ntptime.settime()
+    except Exception:
+        return False
+    return reloj_valido()
+
+
+def usar_reloj(reloj):
+    """Reemplaza el reloj del sistema por reloj (ticks_ms, ticks_us, segundos, dormir_ms)"""
+    global ticks_ms, ticks_us, segundos, dormir_ms, virtual
+    ticks_ms = reloj.ticks_ms
+    ticks_us = reloj.ticks_us
+    segundos = reloj.segundos
+    dormir_ms = reloj.dormir_ms
+    virtual = True
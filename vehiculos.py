@@ -0,0 +1,168 @@
+"""Registro de vehículos en arreglos preasignados con ids monótonos"""
+from array import array
+import tiempo
+
+CAPACIDAD = 32
+VACIO = -1
+
+
+class RegistroVehiculos:
+    """Vehículos dentro del parqueo en casillas de capacidad fija
+
+    Los ids crecen siempre (nunca se reutilizan). Cada casilla guarda el id
+    de su vehículo; el vehículo con id n va a la casilla n % capacidad o, si
+    la ocupa alguien que lleva mucho adentro, a la siguiente libre. Buscar
+    por id empieza en n % capacidad, así que casi siempre es O(1) y nunca
+    pasa de capacidad comparaciones. Solo se rechaza un registro cuando las
+    capacidad casillas están ocupadas.
+
+    Las casillas ocupadas forman además una lista doblemente enlazada en
+    orden de ingreso, así el más antiguo está siempre al frente (O(1)) y
+    retirar cualquier vehículo solo lo desengancha (O(1)).
+    """
+
+    def __init__(self, capacidad=CAPACIDAD):
+        self.capacidad = capacidad
+        self.ocupacion = 0
+        self._ids = array('l', [VACIO] * capacidad)
+        self._entradas = array('l', [0] * capacidad)
+        self._espacios = array('h', [VACIO] * capacidad)
+        # Lista en orden de ingreso: casilla anterior y siguiente de cada una
+        self._anterior = array('h', [VACIO] * capacidad)
+        self._posterior = array('h', [VACIO] * capacidad)
+        self._primera = VACIO
+        self._ultima = VACIO
+        self._siguiente_id = 0
+
+    @property
+    def siguiente_id(self):
+        """Id que recibirá el próximo vehículo"""
+        return self._siguiente_id
+
+    def lleno(self):
+        """True si no se puede registrar otro vehículo"""
+        return self.ocupacion >= self.capacidad
+
+    def registrar(self, espacio=VACIO, entrada=None):
+        """Registra un vehículo y retorna su id, o -1 si el registro está lleno
+
+        entrada es el instante de ingreso en tiempo.ticks_ms() (por defecto, ahora).
+        """
+        if self.lleno():
+            return VACIO
+        vehiculo_id = self._siguiente_id
+        self._ocupar(vehiculo_id, tiempo.ticks_ms() if entrada is None else entrada, espacio)
+        self._siguiente_id += 1
+        return vehiculo_id
+
+    def contiene(self, vehiculo_id):
+        """True si el vehículo está dentro del parqueo"""
+        return 0 <= vehiculo_id < self._siguiente_id and self._casilla(vehiculo_id) >= 0
+
+    def entrada(self, vehiculo_id):
+        """Instante de ingreso (ticks_ms) del vehículo"""
+        return self._entradas[self._validar(vehiculo_id)]
+
+    def fijar_entrada(self, vehiculo_id, entrada):
+        """Corrige el instante de ingreso (ticks_ms) del vehículo"""
+        self._entradas[self._validar(vehiculo_id)] = entrada
+
+    def espacio(self, vehiculo_id):
+        """Espacio asignado al vehículo, o -1 si no tiene"""
+        return self._espacios[self._validar(vehiculo_id)]
+
+    def retirar(self, vehiculo_id):
+        """Quita el vehículo del registro"""
+        casilla = self._validar(vehiculo_id)
+        anterior = self._anterior[casilla]
+        posterior = self._posterior[casilla]
+        if anterior == VACIO:
+            self._primera = posterior
+        else:
+            self._posterior[anterior] = posterior
+        if posterior == VACIO:
+            self._ultima = anterior
+        else:
+            self._anterior[posterior] = anterior
+        self._ids[casilla] = VACIO
+        self.ocupacion -= 1
+
+    def mas_antiguo(self):
+        """Id del vehículo que lleva más tiempo adentro, o -1 si no hay"""
+        if self._primera == VACIO:
+            return VACIO
+        return self._ids[self._primera]
+
+    def copia(self):
+        """Copia del contenido para poder deshacer cambios con restaurar()"""
+        return (array('l', self._ids), array('l', self._entradas),
+                array('h', self._espacios), array('h', self._anterior),
+                array('h', self._posterior), self._primera, self._ultima,
+                self._siguiente_id, self.ocupacion)
+
+    def restaurar(self, copia):
+        """Vuelve al contenido guardado con copia()"""
+        (ids, entradas, espacios, anterior, posterior, primera, ultima,
+         siguiente, ocupacion) = copia
+        for i in range(self.capacidad):
+            self._ids[i] = ids[i]
+            self._entradas[i] = entradas[i]
+            self._espacios[i] = espacios[i]
+            self._anterior[i] = anterior[i]
+            self._posterior[i] = posterior[i]
+        self._primera = primera
+        self._ultima = ultima
+        self._siguiente_id = siguiente
+        self.ocupacion = ocupacion
+
+    def cargar(self, vehiculos, siguiente_id):
+        """Reemplaza el contenido con vehiculos, una lista de (id, entrada, espacio)
+
+        Se usa al recuperar el estado guardado en flash; los ids deben ser
+        menores que siguiente_id y caber en el registro.
+        """
+        if len(vehiculos) > self.capacidad:
+            raise ValueError(f"Demasiados vehículos: {len(vehiculos)}")
+        for i in range(self.capacidad):
+            self._ids[i] = VACIO
+        self._primera = self._ultima = VACIO
+        self._siguiente_id = siguiente_id
+        self.ocupacion = 0
+        # En orden de ingreso (los ids son monótonos) para armar la lista
+        for vehiculo_id, entrada, espacio in sorted(vehiculos):
+            if not 0 <= vehiculo_id < siguiente_id:
+                raise ValueError(f"Vehículo fuera de rango: {vehiculo_id}")
+            self._ocupar(vehiculo_id, entrada, espacio)
+
+    def _ocupar(self, vehiculo_id, entrada, espacio):
+        # Casilla preferida n % capacidad o la siguiente libre (hay al menos una)
+        casilla = vehiculo_id % self.capacidad
+        while self._ids[casilla] != VACIO:
+            casilla = (casilla + 1) % self.capacidad
+        self._ids[casilla] = vehiculo_id
+        self._entradas[casilla] = entrada
+        self._espacios[casilla] = espacio
+        # Al final de la lista: es el ingreso más reciente
+        self._anterior[casilla] = self._ultima
+        self._posterior[casilla] = VACIO
+        if self._ultima == VACIO:
+            self._primera = casilla
+        else:
+            self._posterior[self._ultima] = casilla
+        self._ultima = casilla
+        self.ocupacion += 1
+
+    def _casilla(self, vehiculo_id):
+        # Casilla del vehículo buscando desde la preferida, o -1
+        casilla = vehiculo_id % self.capacidad
+        for _ in range(self.capacidad):
+            if self._ids[casilla] == vehiculo_id:
+                return casilla
+            casilla = (casilla + 1) % self.capacidad
+        return VACIO
+
+    def _validar(self, vehiculo_id):
+        casilla = self._casilla(vehiculo_id) if 0 <= vehiculo_id < self._siguiente_id else VACIO
+        if casilla < 0:
+            raise ValueError(f"Vehículo desconocido: {vehiculo_id}")
+        return casilla
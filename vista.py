@@ -0,0 +1,86 @@
+"""Actualización de la interfaz desde el hilo de Tk, solo con lo que cambió
+
+Los hilos de trabajo (sondeo, suscripción) no tocan widgets: publican cada
+estado en una ColaEstados. Un temporizador de Tk toma lo pendiente
+combinado en un solo estado, arma las propiedades que deberían tener los
+widgets y Vista.aplicar() llama config() solo en los que difieren de lo
+último mostrado:
+
+    estados.publicar(estado)              # desde cualquier hilo
+    estado = estados.tomar()              # en root.after, hilo de Tk
+    vista.aplicar({'aguja': {'text': 'ABIERTA', 'fg': verde}})
+"""
+import queue
+
+
+class ColaEstados:
+    """Estados publicados desde cualquier hilo y tomados de a todos por Tk"""
+
+    def __init__(self):
+        self._cola = queue.SimpleQueue()
+        self.publicados = 0
+        self.combinados = 0
+
+    def publicar(self, estado):
+        """Encola una copia del estado (se puede llamar desde cualquier hilo)"""
+        self._cola.put(dict(estado))
+        self.publicados += 1
+
+    def tomar(self):
+        """Todos los estados pendientes combinados en uno (el último gana) o None"""
+        combinado = None
+        while True:
+            try:
+                estado = self._cola.get_nowait()
+            except queue.Empty:
+                return combinado
+            if combinado is None:
+                combinado = estado
+            else:
+                combinado.update(estado)
+                self.combinados += 1
+
+
+class Vista:
+    """Widgets por nombre y las propiedades que tienen aplicadas
+
+    aplicar() recibe {nombre: {propiedad: valor}} y reconfigura cada widget
+    una sola vez con las propiedades que cambiaron. Lleva la cuenta de
+    cuadros y de widgets reconfigurados (total y en el último cuadro).
+    """
+
+    def __init__(self):
+        self._widgets = {}
+        self._aplicado = {}
+        self.cuadros = 0
+        self.actualizaciones = 0
+        self.ultimo_cuadro = 0
+
+    def registrar(self, nombre, widget):
+        """Agrega un widget que se actualizará por nombre"""
+        self._widgets[nombre] = widget
+        self._aplicado[nombre] = {}
+
+    def aplicar(self, deseado, contar=True):
+        """Reconfigura solo lo que cambió; retorna cuántos widgets tocó"""
+        cambios = 0
+        for nombre, propiedades in deseado.items():
+            widget = self._widgets[nombre]
+            aplicado = self._aplicado[nombre]
+            distintas = {}
+            for propiedad, valor in propiedades.items():
+                if propiedad not in aplicado:
+                    # Primera vez: se compara con lo que el widget ya tiene
+                    aplicado[propiedad] = str(widget.cget(propiedad))
+                if aplicado[propiedad] != str(valor):
+                    distintas[propiedad] = valor
+            if distintas:
+                widget.config(**distintas)
+                for propiedad, valor in distintas.items():
+                    aplicado[propiedad] = str(valor)
+                cambios += 1
+        if contar:
+            self.cuadros += 1
+            self.actualizaciones += cambios
+            self.ultimo_cuadro = cambios
+        return cambios